@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks dos caminhos quentes de MACs e listas de clientes.
+
+Mede, com entradas sintéticas de 100 a 100 mil MACs/clientes:
+
+    format_mac_address      normalização de MACs em formatos variados
+    normalizar_macs         a mesma normalização em lote (mac_utils), com
+                            os inteiros de 48 bits e a máscara de erros
+    mac_index_montagem      construção de um MacIndex (MAC -> inteiro)
+    mac_index_consulta      1000 consultas de MACs (string) em um MacIndex
+    snapshot_indexacao      indexação do stat/sta em um ClientSnapshot
+    snapshot_consulta       1000 buscas de cliente por MAC no snapshot
+                            (o caminho de UnifiController.get_client_info)
+    whitelist_diff          conta de conjuntos do WhitelistMutator.apply sobre
+                            a whitelist atual (normalização, união/diferença
+                            e verificação da lista gravada)
+
+Para cada benchmark e tamanho é registrado o melhor tempo entre as
+repetições (timeit), que é o menos sensível a ruído da máquina.
+
+Os números de referência ficam em scripts/benchmark_baseline.json. Eles só
+são comparáveis na mesma máquina: ao trocar de máquina, grave um novo
+baseline antes de comparar. Exemplos:
+
+    python scripts/benchmark_hot_paths.py
+    python scripts/benchmark_hot_paths.py --gravar-baseline
+    python scripts/benchmark_hot_paths.py --comparar --limite 0.25
+    python scripts/benchmark_hot_paths.py --apenas format_mac_address --tamanhos 1000,100000
+
+Com --comparar o script termina com código 1 se algum benchmark ficar mais
+de --limite (fração) mais lento que o baseline. Casos acima do limite são
+medidos de novo (--confirmacoes) antes de serem acusados, para filtrar ruído.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PADRAO = os.path.join(PROJECT_ROOT, 'scripts', 'benchmark_baseline.json')
+TAMANHOS_PADRAO = (100, 1000, 10000, 100000)
+CONSULTAS = 1000
+
+BENCHMARKS = {}
+
+
+def benchmark(nome):
+    """
+    Registra um benchmark. A função recebe (n, rng) e retorna (callable, itens):
+    o callable é o trecho medido e `itens` a quantidade de operações que ele
+    executa, usada para o tempo por item.
+    """
+    def decorator(preparar):
+        BENCHMARKS[nome] = preparar
+        return preparar
+    return decorator
+
+
+# === Dados sintéticos ===
+
+def gerar_macs(n, rng):
+    """n MACs distintos como inteiros de 48 bits."""
+    return rng.sample(range(1 << 48), n)
+
+
+def formatar(valor, estilo):
+    hexa = f'{valor:012x}'
+    pares = [hexa[i:i+2] for i in range(0, 12, 2)]
+    if estilo == 0:
+        return ':'.join(pares).upper()
+    if estilo == 1:
+        return ':'.join(pares)
+    if estilo == 2:
+        return '-'.join(pares).upper()
+    return hexa
+
+
+def macs_variados(n, rng):
+    """MACs nos formatos que chegam ao portal: XX:XX, xx:xx, XX-XX e sem separadores."""
+    return [formatar(valor, rng.randrange(4)) for valor in gerar_macs(n, rng)]
+
+
+def gerar_clientes(n, rng):
+    """Lista no formato do stat/sta do controlador, com MACs em minúsculas."""
+    aps = [formatar(valor, 1) for valor in gerar_macs(max(1, n // 50), rng)]
+    return [
+        {
+            'mac': formatar(valor, 1),
+            'ip': f'10.{(indice >> 16) & 255}.{(indice >> 8) & 255}.{indice & 255}',
+            'ap_mac': aps[indice % len(aps)],
+            'hostname': f'cliente-{indice}',
+            'essid': 'CMSP-Visitantes',
+            'is_guest': True,
+            'authorized': bool(indice % 2),
+            'last_seen': 1700000000 + indice,
+        }
+        for indice, valor in enumerate(gerar_macs(n, rng))
+    ]
+
+
+# === Benchmarks ===
+
+@benchmark('format_mac_address')
+def _bench_format_mac_address(n, rng):
+    from unifi_auth_app.models import format_mac_address
+    macs = macs_variados(n, rng)
+
+    def executar():
+        for mac in macs:
+            format_mac_address(mac)
+    return executar, n
+
+
+@benchmark('normalizar_macs')
+def _bench_normalizar_macs(n, rng):
+    from unifi_auth_app.mac_utils import normalizar_macs
+    macs = macs_variados(n, rng)
+    return (lambda: normalizar_macs(macs)), n
+
+
+@benchmark('mac_index_montagem')
+def _bench_mac_index_montagem(n, rng):
+    from unifi_auth_app.mac_index import MacIndex
+    macs = macs_variados(n, rng)
+    return (lambda: MacIndex(macs)), n
+
+
+@benchmark('mac_index_consulta')
+def _bench_mac_index_consulta(n, rng):
+    from unifi_auth_app.mac_index import MacIndex
+    macs = macs_variados(n, rng)
+    indice = MacIndex(macs)
+    # Metade dos MACs consultados está no índice
+    consultas = rng.sample(macs, min(n, CONSULTAS // 2)) + macs_variados(CONSULTAS // 2, rng)
+
+    def executar():
+        for mac in consultas:
+            mac in indice
+    return executar, len(consultas)
+
+
+@benchmark('snapshot_indexacao')
+def _bench_snapshot_indexacao(n, rng):
+    from unifi_auth_app.client_snapshot import ClientSnapshot
+    clientes = gerar_clientes(n, rng)
+    return (lambda: ClientSnapshot(clientes, 0.0)), n
+
+
+@benchmark('snapshot_consulta')
+def _bench_snapshot_consulta(n, rng):
+    from unifi_auth_app.client_snapshot import ClientSnapshot
+    from unifi_auth_app.mac_utils import normalizar_mac
+    clientes = gerar_clientes(n, rng)
+    snapshot = ClientSnapshot(clientes, 0.0)
+    # MACs como chegam do portal: maiúsculos com dois-pontos
+    consultas = [rng.choice(clientes)['mac'].upper() for _ in range(CONSULTAS)]
+
+    def executar():
+        for mac in consultas:
+            snapshot.by_mac.get(normalizar_mac(mac))
+    return executar, len(consultas)
+
+
+@benchmark('whitelist_diff')
+def _bench_whitelist_diff(n, rng):
+    from unifi_auth_app.whitelist_mutation import _normalizar
+    atual = [formatar(valor, rng.choice((0, 1))) for valor in gerar_macs(n, rng)]
+    lote = max(1, n // 100)
+    adicionar = macs_variados(lote, rng) + rng.sample(atual, lote)
+    remover = rng.sample(atual, lote)
+
+    def executar():
+        # Mesmas operações de WhitelistMutator.apply, sem as chamadas ao controlador
+        to_remove = _normalizar(remover)
+        to_add = _normalizar(adicionar) - to_remove
+        current = _normalizar(atual)
+        whitelist = (current | to_add) - to_remove
+        if whitelist != current:
+            gravada = _normalizar(whitelist)
+            to_add - gravada
+            to_remove & gravada
+    return executar, n
+
+
+# === Execução e comparação ===
+
+def medir(executar, repeticoes):
+    """Melhor tempo (segundos) de uma chamada de `executar` entre as repetições."""
+    timer = timeit.Timer(executar)
+    numero, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeticoes, number=numero)) / numero
+
+
+def medir_caso(nome, n, repeticoes, semente):
+    executar, itens = BENCHMARKS[nome](n, random.Random(semente))
+    segundos = medir(executar, repeticoes)
+    print(f"{nome:<22} n={n:<7} {segundos * 1000:>10.3f} ms  {segundos / itens * 1e9:>9.1f} ns/item",
+          flush=True)
+    return {'segundos': segundos, 'ns_por_item': round(segundos / itens * 1e9, 1)}
+
+
+def executar_benchmarks(nomes, tamanhos, repeticoes, semente):
+    return {
+        nome: {str(n): medir_caso(nome, n, repeticoes, semente) for n in tamanhos}
+        for nome in nomes
+    }
+
+
+def confirmar_regressoes(resultados, baseline, limite, repeticoes, semente, tentativas):
+    """
+    Mede de novo os casos acima do limite e fica com o melhor tempo, para que
+    uma interrupção momentânea da máquina não seja acusada como regressão.
+    """
+    for _ in range(tentativas):
+        suspeitos = [(nome, n) for nome, n, _, _, razao in comparar(resultados, baseline, limite)[0]
+                     if razao > 1 + limite]
+        if not suspeitos:
+            return
+        print(f"\nConfirmando {len(suspeitos)} possível(is) regressão(ões)...")
+        for nome, n in suspeitos:
+            nova = medir_caso(nome, int(n), repeticoes, semente)
+            if nova['segundos'] < resultados[nome][n]['segundos']:
+                resultados[nome][n] = nova
+
+
+def comparar(resultados, baseline, limite):
+    """Lista de (nome, n, baseline, atual, razão) e quantas regressões passaram do limite."""
+    linhas = []
+    regressoes = 0
+    for nome, por_tamanho in resultados.items():
+        for n, atual in por_tamanho.items():
+            referencia = baseline.get('resultados', {}).get(nome, {}).get(n)
+            if not referencia:
+                continue
+            razao = atual['segundos'] / referencia['segundos']
+            if razao > 1 + limite:
+                regressoes += 1
+            linhas.append((nome, n, referencia['segundos'], atual['segundos'], razao))
+    return linhas, regressoes
+
+
+def imprimir_comparacao(linhas, limite):
+    print(f"\n{'benchmark':<22} {'n':>7} {'baseline':>12} {'atual':>12} {'variação':>9}")
+    for nome, n, referencia, atual, razao in linhas:
+        marca = '  REGRESSÃO' if razao > 1 + limite else ''
+        print(f"{nome:<22} {n:>7} {referencia * 1000:>10.3f}ms {atual * 1000:>10.3f}ms {(razao - 1) * 100:>+8.1f}%{marca}")
+
+
+def parse_tamanhos(valor):
+    try:
+        tamanhos = [int(parte) for parte in valor.split(',') if parte.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Tamanhos inválidos: {valor}")
+    if not tamanhos or any(n <= 0 for n in tamanhos):
+        raise argparse.ArgumentTypeError(f"Tamanhos inválidos: {valor}")
+    return tamanhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks dos caminhos quentes de MACs e clientes')
+    parser.add_argument('--apenas', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks a executar (padrão: todos)')
+    parser.add_argument('--tamanhos', type=parse_tamanhos, default=list(TAMANHOS_PADRAO),
+                        help='Tamanhos das entradas, separados por vírgula (padrão: 100,1000,10000,100000)')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Repetições por medida; vale a melhor (padrão: 5)')
+    parser.add_argument('--semente', type=int, default=42, help='Semente dos dados sintéticos')
+    parser.add_argument('--saida', help='Arquivo JSON com os resultados')
+    parser.add_argument('--gravar-baseline', nargs='?', const=BASELINE_PADRAO, metavar='ARQUIVO',
+                        help='Grava os resultados como baseline (padrão: scripts/benchmark_baseline.json)')
+    parser.add_argument('--comparar', nargs='?', const=BASELINE_PADRAO, metavar='ARQUIVO',
+                        help='Compara com o baseline e sai com código 1 se houver regressão')
+    parser.add_argument('--limite', type=float, default=0.25,
+                        help='Fração de piora tolerada antes de acusar regressão (padrão: 0.25)')
+    parser.add_argument('--confirmacoes', type=int, default=2,
+                        help='Novas medidas de cada caso acima do limite antes de acusar regressão (padrão: 2)')
+    args = parser.parse_args()
+
+    if 'PYTHONHASHSEED' not in os.environ:
+        # O hash de strings muda a cada processo e, com ele, a disposição dos
+        # dicts e sets medidos; um hash fixo torna as execuções comparáveis
+        os.environ['PYTHONHASHSEED'] = '0'
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    sys.path.insert(0, PROJECT_ROOT)
+    # Configurações de teste de carga: SQLite e caminhos locais, sem depender de /opt
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unifi_auth_project.settings_loadtest')
+    import django
+    django.setup()
+
+    baseline = None
+    if args.comparar:
+        # Lido antes de executar: --gravar-baseline pode sobrescrever o mesmo arquivo
+        with open(args.comparar) as arquivo:
+            baseline = json.load(arquivo)
+
+    nomes = args.apenas or list(BENCHMARKS)
+    resultados = executar_benchmarks(nomes, args.tamanhos, args.repeticoes, args.semente)
+    if baseline is not None:
+        confirmar_regressoes(resultados, baseline, args.limite, args.repeticoes, args.semente, args.confirmacoes)
+    relatorio = {
+        'gerado_em': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'semente': args.semente,
+        'resultados': resultados,
+    }
+
+    for destino in (args.saida, args.gravar_baseline):
+        if destino:
+            with open(destino, 'w') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+                arquivo.write('\n')
+            print(f"\nResultados gravados em {destino}")
+
+    if baseline is not None:
+        if baseline.get('plataforma') != relatorio['plataforma']:
+            print(f"\nAviso: baseline gerado em outra plataforma ({baseline.get('plataforma')})")
+        linhas, regressoes = comparar(resultados, baseline, args.limite)
+        imprimir_comparacao(linhas, args.limite)
+        if regressoes:
+            print(f"\n{regressoes} regressão(ões) acima de {args.limite:.0%}")
+            sys.exit(1)
+        print(f"\nNenhuma regressão acima de {args.limite:.0%}")
+
+
+if __name__ == '__main__':
+    main()
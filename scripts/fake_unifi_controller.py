@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Simulador local do UniFi Controller para testes de carga e benchmarks.
+
+Implementa, em memória, os endpoints usados pelo portal:
+
+    POST /api/login, GET|POST /api/logout
+    GET  /api/s/<site>/stat/sta
+    GET  /api/s/<site>/stat/guest
+    GET  /api/s/<site>/rest/wlanconf
+    PUT  /api/s/<site>/rest/wlanconf/<id>
+    POST /api/s/<site>/cmd/stamgr[/<cmd>] (authorize-guest, unauthorize-guest, kick-sta)
+
+Além de contadores por endpoint em GET /__stats (zerados por POST /__reset).
+
+Os clientes (estações) são gerados de forma determinística a partir de
+--semente; latência e erros 5xx são injetados por requisição. Sessões
+expiram após --sessao-ttl segundos, devolvendo 401 api.err.LoginRequired
+como o controlador real.
+
+O portal monta a URL do controlador sempre com https, então o servidor usa
+TLS com um certificado autoassinado gerado pelo openssl (ou --cert/--key).
+Para apontar o portal para o simulador:
+
+    UNIFI_CONTROLLER_IP=127.0.0.1 UNIFI_CONTROLLER_PORT=8443 python manage.py runserver
+
+Exemplo:
+
+    python scripts/fake_unifi_controller.py --clientes 5000 --latencia 40 --jitter 20 --taxa-erro 0.01
+"""
+import argparse
+import json
+import os
+import random
+import re
+import secrets
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Caminhos /api/s/<site>/<recurso>[/<id>]
+SITE_PATH = re.compile(r'^/api/s/(?P<site>[^/]+)/(?P<recurso>stat/sta|stat/guest|rest/wlanconf|cmd/stamgr)(?:/(?P<id>[^/]+))?/?$')
+
+
+def _mac(rnd, prefixo=''):
+    partes = prefixo.split(':') if prefixo else []
+    partes += [f"{rnd.randrange(256):02x}" for _ in range(6 - len(partes))]
+    return ':'.join(partes)
+
+
+class EstadoControlador:
+    """Clientes, SSIDs, sessões e contadores do simulador (protegidos por um lock)."""
+
+    def __init__(self, clientes, aps, ssids, semente, usuario, senha, sessao_ttl):
+        rnd = random.Random(semente)
+        self.lock = threading.Lock()
+        self.usuario = usuario
+        self.senha = senha
+        self.sessao_ttl = sessao_ttl
+        self.sessoes = {}
+        self.contadores = Counter()
+
+        self.aps = [_mac(rnd, '24:5a:4c') for _ in range(max(aps, 1))]
+        self.wlans = [
+            {
+                '_id': f"{indice:024x}",
+                'name': nome,
+                'enabled': True,
+                'security': 'open',
+                'mac_filter_enabled': True,
+                'mac_filter_policy': 'allow',
+                'mac_filter_list': [],
+            }
+            for indice, nome in enumerate(ssids, start=1)
+        ]
+
+        agora = int(time.time())
+        self.clientes = {}
+        for indice in range(clientes):
+            mac = _mac(rnd)
+            rede, host = divmod(indice, 254)
+            self.clientes[mac] = {
+                'mac': mac,
+                'ip': f"10.{(rede >> 8) & 255}.{rede & 255}.{host + 1}",
+                'ap_mac': rnd.choice(self.aps),
+                'essid': rnd.choice(ssids),
+                'hostname': f"host-{indice}",
+                'is_guest': rnd.random() < 0.5,
+                'authorized': False,
+                'last_seen': agora,
+                'site_id': 'default',
+            }
+        self.convidados = {}
+
+    def login(self, usuario, senha):
+        if self.usuario and (usuario != self.usuario or senha != self.senha):
+            return None
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessoes[token] = time.time() + self.sessao_ttl
+        return token
+
+    def sessao_valida(self, token):
+        with self.lock:
+            expira = self.sessoes.get(token)
+            if expira is None:
+                return False
+            if expira < time.time():
+                del self.sessoes[token]
+                return False
+            return True
+
+    def logout(self, token):
+        with self.lock:
+            self.sessoes.pop(token, None)
+
+    def contar(self, chave, status):
+        with self.lock:
+            self.contadores[f"{chave} {status}"] += 1
+
+    def estatisticas(self):
+        with self.lock:
+            return {
+                'requests': dict(sorted(self.contadores.items())),
+                'total': sum(self.contadores.values()),
+                'sessions': len(self.sessoes),
+                'clients': len(self.clientes),
+                'guests_authorized': len(self.convidados),
+                'whitelist_sizes': {w['name']: len(w['mac_filter_list']) for w in self.wlans},
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeUniFi/1.0'
+
+    # Preenchidos por main()
+    estado: EstadoControlador = None
+    latencia = 0.0
+    jitter = 0.0
+    taxa_erro = 0.0
+    verbose = False
+
+    def log_message(self, formato, *args):
+        if self.verbose:
+            super().log_message(formato, *args)
+
+    # --- respostas ---
+
+    def _responder(self, status, corpo, chave, cabecalhos=None):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+        self.estado.contar(chave, status)
+
+    def _ok(self, dados, chave, cabecalhos=None):
+        self._responder(200, {'meta': {'rc': 'ok'}, 'data': dados}, chave, cabecalhos)
+
+    def _erro(self, status, msg, chave):
+        self._responder(status, {'meta': {'rc': 'error', 'msg': msg}, 'data': []}, chave)
+
+    def _corpo(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if not tamanho:
+            return {}
+        try:
+            return json.loads(self.rfile.read(tamanho) or b'{}')
+        except ValueError:
+            return None
+
+    def _token(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookie['unifises'].value if 'unifises' in cookie else None
+
+    # --- despacho ---
+
+    def do_GET(self):
+        self._despachar('GET')
+
+    def do_POST(self):
+        self._despachar('POST')
+
+    def do_PUT(self):
+        self._despachar('PUT')
+
+    def _despachar(self, metodo):
+        caminho = urlsplit(self.path).path
+        corpo = self._corpo() if metodo in ('POST', 'PUT') else {}
+
+        if caminho == '/__stats':
+            return self._ok(self.estado.estatisticas(), f"{metodo} /__stats")
+        if caminho == '/__reset' and metodo == 'POST':
+            with self.estado.lock:
+                self.estado.contadores.clear()
+            return self._ok([], f"{metodo} /__reset")
+
+        match = SITE_PATH.match(caminho)
+        chave = f"{metodo} {match['recurso'] if match else caminho}"
+
+        if self.latencia or self.jitter:
+            time.sleep(max(0.0, random.gauss(self.latencia, self.jitter)) / 1000)
+        if self.taxa_erro and random.random() < self.taxa_erro:
+            return self._erro(500, 'api.err.Injected', chave)
+        if corpo is None:
+            return self._erro(400, 'api.err.InvalidPayload', chave)
+
+        if caminho == '/api/login' and metodo == 'POST':
+            token = self.estado.login(corpo.get('username'), corpo.get('password'))
+            if token is None:
+                return self._erro(400, 'api.err.Invalid', chave)
+            return self._ok([], chave, {'Set-Cookie': f"unifises={token}; Path=/; Secure; HttpOnly"})
+        if caminho == '/api/logout':
+            token = self._token()
+            if token:
+                self.estado.logout(token)
+            return self._ok([], chave)
+
+        if not match:
+            return self._erro(404, 'api.err.NotFound', chave)
+        if not self.estado.sessao_valida(self._token()):
+            return self._erro(401, 'api.err.LoginRequired', chave)
+
+        recurso = match['recurso']
+        if recurso == 'stat/sta' and metodo == 'GET':
+            with self.estado.lock:
+                dados = list(self.estado.clientes.values())
+            return self._ok(dados, chave)
+        if recurso == 'stat/guest' and metodo == 'GET':
+            with self.estado.lock:
+                dados = list(self.estado.convidados.values())
+            return self._ok(dados, chave)
+        if recurso == 'rest/wlanconf':
+            return self._wlanconf(metodo, match['id'], corpo, chave)
+        if recurso == 'cmd/stamgr' and metodo == 'POST':
+            return self._stamgr(corpo, chave, match['id'])
+        return self._erro(405, 'api.err.MethodNotAllowed', chave)
+
+    def _wlanconf(self, metodo, wlan_id, corpo, chave):
+        if metodo == 'GET':
+            with self.estado.lock:
+                dados = [dict(w, mac_filter_list=list(w['mac_filter_list'])) for w in self.estado.wlans
+                         if wlan_id is None or w['_id'] == wlan_id]
+            return self._ok(dados, chave)
+        if metodo != 'PUT' or wlan_id is None:
+            return self._erro(405, 'api.err.MethodNotAllowed', chave)
+        with self.estado.lock:
+            wlan = next((w for w in self.estado.wlans if w['_id'] == wlan_id), None)
+            if wlan is not None:
+                for campo, valor in corpo.items():
+                    if campo != '_id':
+                        wlan[campo] = valor
+                dados = [dict(wlan, mac_filter_list=list(wlan['mac_filter_list']))]
+        if wlan is None:
+            return self._erro(400, 'api.err.IdInvalid', chave)
+        return self._ok(dados, chave)
+
+    def _stamgr(self, corpo, chave, comando=None):
+        # O comando vem no corpo ou na URL (cmd/stamgr/authorize-guest, usado pelo portal)
+        cmd = corpo.get('cmd') or comando
+        mac = (corpo.get('mac') or '').lower()
+        if cmd not in ('authorize-guest', 'unauthorize-guest', 'kick-sta') or not mac:
+            return self._erro(400, 'api.err.InvalidPayload', chave)
+        with self.estado.lock:
+            cliente = self.estado.clientes.get(mac)
+            if cmd == 'authorize-guest':
+                minutos = int(corpo.get('minutes') or 480)
+                agora = int(time.time())
+                self.estado.convidados[mac] = {
+                    'mac': mac,
+                    'ap_mac': corpo.get('ap_mac') or (cliente or {}).get('ap_mac'),
+                    'start': agora,
+                    'end': agora + minutos * 60,
+                    'authorized_by': 'api',
+                    'expired': False,
+                }
+                if cliente:
+                    cliente['authorized'] = True
+            elif cmd == 'unauthorize-guest':
+                self.estado.convidados.pop(mac, None)
+                if cliente:
+                    cliente['authorized'] = False
+        return self._ok([], f"{chave} {cmd}")
+
+
+class Servidor(ThreadingHTTPServer):
+    """ThreadingHTTPServer que faz o handshake TLS na thread de cada conexão."""
+    daemon_threads = True
+    contexto_tls = None
+
+    def finish_request(self, request, client_address):
+        if self.contexto_tls is not None:
+            request = self.contexto_tls.wrap_socket(request, server_side=True)
+        super().finish_request(request, client_address)
+
+
+def certificado_autoassinado():
+    """Gera certificado e chave autoassinados com o openssl em um diretório temporário."""
+    diretorio = tempfile.mkdtemp(prefix='fake_unifi_')
+    cert = os.path.join(diretorio, 'cert.pem')
+    chave = os.path.join(diretorio, 'key.pem')
+    try:
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2',
+             '-subj', '/CN=localhost', '-keyout', chave, '-out', cert],
+            check=True, capture_output=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        sys.exit(f"Não foi possível gerar o certificado com o openssl ({e}); informe --cert e --key ou use --sem-tls")
+    return cert, chave
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador local do UniFi Controller')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--clientes', type=int, default=2000, help='Quantidade de estações em stat/sta (padrão: 2000)')
+    parser.add_argument('--aps', type=int, default=20, help='Quantidade de access points (padrão: 20)')
+    parser.add_argument('--ssid', action='append', dest='ssids', help="SSID em rest/wlanconf; pode ser repetido (padrão: 'Câmara')")
+    parser.add_argument('--latencia', type=float, default=0.0, help='Latência média injetada por requisição, em ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Desvio padrão da latência injetada, em ms')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração das requisições respondidas com 500 (0 a 1)')
+    parser.add_argument('--sessao-ttl', type=float, default=3600.0, help='Segundos até a sessão expirar e exigir novo login')
+    parser.add_argument('--usuario', default='', help='Usuário aceito no login (padrão: qualquer um)')
+    parser.add_argument('--senha', default='')
+    parser.add_argument('--semente', type=int, default=42, help='Semente para gerar os clientes')
+    parser.add_argument('--cert', help='Certificado TLS (PEM)')
+    parser.add_argument('--key', help='Chave do certificado TLS (PEM)')
+    parser.add_argument('--sem-tls', action='store_true', help='Serve HTTP simples')
+    parser.add_argument('--verbose', action='store_true', help='Registra cada requisição')
+    args = parser.parse_args()
+
+    Handler.estado = EstadoControlador(
+        clientes=args.clientes,
+        aps=args.aps,
+        ssids=args.ssids or ['Câmara'],
+        semente=args.semente,
+        usuario=args.usuario,
+        senha=args.senha,
+        sessao_ttl=args.sessao_ttl,
+    )
+    Handler.latencia = args.latencia
+    Handler.jitter = args.jitter
+    Handler.taxa_erro = args.taxa_erro
+    Handler.verbose = args.verbose
+
+    servidor = Servidor((args.host, args.port), Handler)
+    esquema = 'http'
+    if not args.sem_tls:
+        cert, chave = (args.cert, args.key) if args.cert else certificado_autoassinado()
+        servidor.contexto_tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        servidor.contexto_tls.load_cert_chain(cert, chave)
+        esquema = 'https'
+
+    print(f"UniFi simulado em {esquema}://{args.host}:{args.port} "
+          f"({args.clientes} clientes, latência {args.latencia}±{args.jitter} ms, erros {args.taxa_erro:.1%})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(json.dumps(Handler.estado.estatisticas(), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Teste de carga das APIs do portal cativo.
+
+Gera requisições concorrentes para /api/check-auth/, /api/authorize-visitor/
+e /api/authorize-guest/ em uma mistura de cenários:
+
+    probe       check-auth de um IP ainda não autorizado (tempestade de sondagens
+                dos sistemas operacionais ao conectar no Wi-Fi)
+    onboarding  authorize-visitor de um novo visitante (MAC obtido pelo IP)
+    repeat      check-auth de um IP já autorizado (visitante que volta)
+    guest       authorize-guest com IP e MAC informados
+
+Os IPs e MACs vêm do stat/sta do controlador simulado, de modo que a busca
+IP→MAC do portal encontra o cliente. Ao final mostra e grava em JSON, por
+cenário e no total: requisições por segundo, latência p50/p95/p99, taxa de
+erro e chamadas ao controlador por requisição (contadores /__stats do
+simulador).
+
+Com --subir o script sobe tudo localmente: o controlador simulado, o banco
+SQLite migrado (unifi_auth_project.settings_loadtest) e o gunicorn com workers
+uvicorn, como em produção. Exemplos:
+
+    python scripts/loadtest_portal.py --subir --cenario misto --duracao 60 --concorrencia 100 --saida misto.json
+    python scripts/loadtest_portal.py --url http://127.0.0.1:8000 --controlador https://127.0.0.1:8443 --mix probe=80,repeat=20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CENARIOS = {
+    'tempestade': {'probe': 90, 'repeat': 10},
+    'onboarding': {'onboarding': 70, 'probe': 30},
+    'retorno': {'repeat': 80, 'probe': 10, 'onboarding': 10},
+    'misto': {'probe': 60, 'repeat': 25, 'onboarding': 10, 'guest': 5},
+}
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por posição mais próxima (valores já ordenados)."""
+    if not valores_ordenados:
+        return None
+    indice = max(0, min(len(valores_ordenados) - 1, round(p / 100 * len(valores_ordenados) + 0.5) - 1))
+    return valores_ordenados[indice]
+
+
+def resumir(amostras, duracao):
+    """Estatísticas de uma lista de (latência em s, status ou None em caso de exceção)."""
+    latencias = sorted(latencia * 1000 for latencia, _ in amostras)
+    status = Counter(str(codigo) if codigo is not None else 'exception' for _, codigo in amostras)
+    erros = sum(n for codigo, n in status.items() if codigo == 'exception' or int(codigo) >= 500)
+    total = len(amostras)
+    return {
+        'requisicoes': total,
+        'rps': round(total / duracao, 2) if duracao else 0.0,
+        'erros': erros,
+        'taxa_erro': round(erros / total, 4) if total else 0.0,
+        'status': dict(sorted(status.items())),
+        'latencia_ms': {
+            'media': round(sum(latencias) / total, 2) if total else None,
+            'p50': _arredondar(percentil(latencias, 50)),
+            'p95': _arredondar(percentil(latencias, 95)),
+            'p99': _arredondar(percentil(latencias, 99)),
+            'max': _arredondar(latencias[-1] if latencias else None),
+        },
+    }
+
+
+def _arredondar(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+class GeradorDeCarga:
+    """Trabalhadores assíncronos que sorteiam cenários conforme a mistura."""
+
+    def __init__(self, url, mix, clientes, concorrencia, duracao, requisicoes, rps, timeout):
+        self.url = url.rstrip('/')
+        self.cenarios = list(mix)
+        self.pesos = [mix[nome] for nome in self.cenarios]
+        self.clientes = clientes
+        self.concorrencia = concorrencia
+        self.duracao = duracao
+        self.requisicoes = requisicoes
+        self.intervalo = 1.0 / rps if rps else 0.0
+        self.timeout = timeout
+
+        self.amostras = defaultdict(list)
+        self.autorizados = []
+        self._disponiveis = list(clientes)
+        random.shuffle(self._disponiveis)
+        self._enviadas = 0
+        self._proximo_envio = 0.0
+        self._fim = 0.0
+
+    def _novo_cliente(self):
+        """Cliente ainda não autorizado (reaproveita os já usados quando acabam)."""
+        if self._disponiveis:
+            return self._disponiveis.pop()
+        return random.choice(self.clientes)
+
+    def _montar(self, cenario):
+        """Retorna (método, caminho, IP de origem, corpo JSON) para o cenário."""
+        if cenario == 'repeat' and self.autorizados:
+            ip, _ = random.choice(self.autorizados)
+            return 'GET', '/api/check-auth/', ip, None
+        if cenario in ('probe', 'repeat'):
+            ip, _ = random.choice(self.clientes)
+            return 'GET', '/api/check-auth/', ip, None
+
+        ip, mac = self._novo_cliente()
+        sufixo = mac.replace(':', '')
+        if cenario == 'onboarding':
+            return 'POST', '/api/authorize-visitor/', ip, {
+                'nome': f'Visitante {sufixo}',
+                'email': f'{sufixo}@loadtest.local',
+                'telefone': '94999990000',
+                'client_ip': ip,
+            }
+        return 'POST', '/api/authorize-guest/', ip, {
+            'name': f'Convidado {sufixo}',
+            'email': f'{sufixo}@loadtest.local',
+            'phone': '94999990000',
+            'client_ip': ip,
+            'client_mac': mac,
+        }
+
+    def _pode_enviar(self):
+        if self.requisicoes:
+            return self._enviadas < self.requisicoes
+        return time.monotonic() < self._fim
+
+    async def _aguardar_vez(self):
+        """Espaça os envios quando --rps é informado."""
+        if not self.intervalo:
+            return
+        agora = time.monotonic()
+        vez = max(agora, self._proximo_envio)
+        self._proximo_envio = vez + self.intervalo
+        if vez > agora:
+            await asyncio.sleep(vez - agora)
+
+    async def _trabalhador(self, client):
+        while self._pode_enviar():
+            self._enviadas += 1
+            await self._aguardar_vez()
+            cenario = random.choices(self.cenarios, self.pesos)[0]
+            metodo, caminho, ip, corpo = self._montar(cenario)
+            inicio = time.perf_counter()
+            try:
+                response = await client.request(
+                    metodo, f"{self.url}{caminho}", json=corpo,
+                    headers={'X-Forwarded-For': ip},
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            self.amostras[cenario].append((time.perf_counter() - inicio, status))
+            if cenario in ('onboarding', 'guest') and status == 200:
+                self.autorizados.append((ip, None))
+
+    async def executar(self):
+        limites = httpx.Limits(max_connections=self.concorrencia, max_keepalive_connections=self.concorrencia)
+        async with httpx.AsyncClient(limits=limites, timeout=self.timeout) as client:
+            inicio = time.monotonic()
+            self._fim = inicio + self.duracao
+            await asyncio.gather(*(self._trabalhador(client) for _ in range(self.concorrencia)))
+            return time.monotonic() - inicio
+
+
+def estatisticas_controlador(url):
+    """Contadores do controlador simulado, ou None se indisponível."""
+    if not url:
+        return None
+    try:
+        response = httpx.get(f"{url.rstrip('/')}/__stats", verify=False, timeout=5)
+        return response.json()['data']['requests']
+    except (httpx.HTTPError, ValueError, KeyError):
+        return None
+
+
+def clientes_do_controlador(url, usuario, senha, site):
+    """(IP, MAC) das estações do controlador simulado."""
+    with httpx.Client(base_url=url.rstrip('/'), verify=False, timeout=30) as client:
+        client.post('/api/login', json={'username': usuario, 'password': senha}).raise_for_status()
+        response = client.get(f'/api/s/{site}/stat/sta')
+        response.raise_for_status()
+        return [(c['ip'], c['mac'].upper()) for c in response.json()['data'] if c.get('ip') and c.get('mac')]
+
+
+def clientes_aleatorios(quantidade):
+    """IPs e MACs inventados, quando não há controlador simulado para consultar."""
+    rnd = random.Random(42)
+    return [
+        (f"10.{(i // 254) >> 8 & 255}.{(i // 254) & 255}.{i % 254 + 1}",
+         ':'.join(f"{rnd.randrange(256):02X}" for _ in range(6)))
+        for i in range(quantidade)
+    ]
+
+
+def diferenca_controlador(antes, depois):
+    if antes is None or depois is None:
+        return None
+    por_endpoint = {
+        chave: depois.get(chave, 0) - antes.get(chave, 0)
+        for chave in depois
+        if '/__' not in chave and depois.get(chave, 0) - antes.get(chave, 0)
+    }
+    return dict(sorted(por_endpoint.items()))
+
+
+def aguardar(url, timeout=60, verify=True):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            httpx.get(url, verify=verify, timeout=2)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    sys.exit(f"Serviço não respondeu em {timeout}s: {url}")
+
+
+def subir_ambiente(args):
+    """Sobe o controlador simulado, migra o SQLite e inicia o gunicorn. Retorna os processos."""
+    loadtest_dir = tempfile.mkdtemp(prefix='unifi_auth_loadtest_')
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='unifi_auth_project.settings_loadtest',
+        LOADTEST_DIR=loadtest_dir,
+        UNIFI_CONTROLLER_IP='127.0.0.1',
+        UNIFI_CONTROLLER_PORT=str(args.porta_controlador),
+        PYTHONPATH=PROJECT_ROOT,
+    )
+    # verify=False das sessões do portal deixaria de valer com um CA bundle no ambiente
+    env.pop('REQUESTS_CA_BUNDLE', None)
+    env.pop('CURL_CA_BUNDLE', None)
+
+    processos = []
+    controlador = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, 'scripts', 'fake_unifi_controller.py'),
+         '--port', str(args.porta_controlador), '--clientes', str(args.clientes),
+         '--latencia', str(args.latencia_controlador), '--jitter', str(args.latencia_controlador / 2),
+         '--taxa-erro', str(args.taxa_erro_controlador),
+         '--ssid', os.getenv('UNIFI_SSID', 'Câmara')],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    processos.append(controlador)
+
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--no-input', '-v', '0'],
+                   cwd=PROJECT_ROOT, env=env, check=True)
+
+    if shutil.which('gunicorn'):
+        comando = ['gunicorn', '--workers', str(args.workers), '--bind', f'127.0.0.1:{args.porta}',
+                   '--worker-class', 'uvicorn.workers.UvicornWorker', 'unifi_auth_project.asgi:application']
+    else:
+        comando = [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--port', str(args.porta),
+                   '--log-level', 'warning', 'unifi_auth_project.asgi:application']
+    processos.append(subprocess.Popen(comando, cwd=PROJECT_ROOT, env=env))
+
+    aguardar(f"https://127.0.0.1:{args.porta_controlador}/__stats", verify=False)
+    aguardar(f"http://127.0.0.1:{args.porta}/api/check-auth/")
+    print(f"Ambiente de teste em {loadtest_dir}")
+    return processos
+
+
+def encerrar(processos):
+    for processo in reversed(processos):
+        processo.send_signal(signal.SIGTERM)
+    for processo in processos:
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+
+def parse_mix(valor):
+    mix = {}
+    for parte in valor.split(','):
+        nome, _, peso = parte.partition('=')
+        nome = nome.strip()
+        if nome not in ('probe', 'onboarding', 'repeat', 'guest'):
+            raise argparse.ArgumentTypeError(f"Cenário desconhecido: {nome}")
+        mix[nome] = float(peso or 1)
+    return mix
+
+
+def imprimir(relatorio):
+    print(f"\n{'cenário':<12} {'req':>7} {'rps':>8} {'erro%':>6} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    linhas = list(relatorio['cenarios'].items()) + [('TOTAL', relatorio['total'])]
+    for nome, dados in linhas:
+        lat = dados['latencia_ms']
+        print(f"{nome:<12} {dados['requisicoes']:>7} {dados['rps']:>8.1f} {dados['taxa_erro'] * 100:>6.2f} "
+              f"{lat['p50'] or 0:>8.1f} {lat['p95'] or 0:>8.1f} {lat['p99'] or 0:>8.1f}")
+    controlador = relatorio.get('controlador')
+    if controlador:
+        print(f"\nChamadas ao controlador: {controlador['chamadas']} "
+              f"({controlador['por_requisicao']:.2f} por requisição)")
+        for chave, quantidade in controlador['por_endpoint'].items():
+            print(f"  {chave:<45} {quantidade}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga das APIs do portal cativo')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL do portal (padrão: http://127.0.0.1:8000)')
+    parser.add_argument('--controlador', help='URL do controlador simulado, para IPs/MACs e contagem de chamadas')
+    parser.add_argument('--cenario', choices=sorted(CENARIOS), default='misto', help='Mistura predefinida (padrão: misto)')
+    parser.add_argument('--mix', type=parse_mix, help='Mistura própria, ex: probe=70,repeat=20,onboarding=10')
+    parser.add_argument('--concorrencia', type=int, default=50, help='Requisições simultâneas (padrão: 50)')
+    parser.add_argument('--duracao', type=float, default=30.0, help='Duração em segundos (padrão: 30)')
+    parser.add_argument('--requisicoes', type=int, default=0, help='Total de requisições (substitui --duracao)')
+    parser.add_argument('--rps', type=float, default=0.0, help='Limita a taxa de envio (padrão: sem limite)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Timeout por requisição em segundos')
+    parser.add_argument('--saida', help='Arquivo JSON com o relatório')
+    parser.add_argument('--usuario', default='loadtest', help='Usuário do controlador simulado')
+    parser.add_argument('--senha', default='loadtest')
+    parser.add_argument('--site', default='default')
+
+    ambiente = parser.add_argument_group('ambiente local (--subir)')
+    ambiente.add_argument('--subir', action='store_true', help='Sobe controlador simulado, SQLite e gunicorn locais')
+    ambiente.add_argument('--porta', type=int, default=8000)
+    ambiente.add_argument('--porta-controlador', type=int, default=8443)
+    ambiente.add_argument('--workers', type=int, default=3, help='Workers do gunicorn (padrão: 3)')
+    ambiente.add_argument('--clientes', type=int, default=5000, help='Estações no controlador simulado (padrão: 5000)')
+    ambiente.add_argument('--latencia-controlador', type=float, default=30.0, help='Latência média do controlador simulado em ms')
+    ambiente.add_argument('--taxa-erro-controlador', type=float, default=0.0, help='Fração de respostas 500 do controlador simulado')
+    args = parser.parse_args()
+
+    processos = []
+    if args.subir:
+        args.url = f"http://127.0.0.1:{args.porta}"
+        args.controlador = f"https://127.0.0.1:{args.porta_controlador}"
+        processos = subir_ambiente(args)
+
+    try:
+        clientes = (clientes_do_controlador(args.controlador, args.usuario, args.senha, args.site)
+                    if args.controlador else clientes_aleatorios(5000))
+        mix = args.mix or CENARIOS[args.cenario]
+        gerador = GeradorDeCarga(args.url, mix, clientes, args.concorrencia, args.duracao,
+                                 args.requisicoes, args.rps, args.timeout)
+
+        antes = estatisticas_controlador(args.controlador)
+        inicio = datetime.now(timezone.utc)
+        duracao = asyncio.run(gerador.executar())
+        depois = estatisticas_controlador(args.controlador)
+    finally:
+        encerrar(processos)
+
+    todas = [amostra for amostras in gerador.amostras.values() for amostra in amostras]
+    relatorio = {
+        'inicio': inicio.isoformat(),
+        'duracao_s': round(duracao, 3),
+        'config': {
+            'url': args.url,
+            'mix': mix,
+            'concorrencia': args.concorrencia,
+            'rps_alvo': args.rps or None,
+            'clientes': len(clientes),
+            'subir': args.subir,
+            'workers': args.workers if args.subir else None,
+            'latencia_controlador_ms': args.latencia_controlador if args.subir else None,
+        },
+        'total': resumir(todas, duracao),
+        'cenarios': {nome: resumir(amostras, duracao) for nome, amostras in sorted(gerador.amostras.items())},
+    }
+    por_endpoint = diferenca_controlador(antes, depois)
+    if por_endpoint is not None:
+        chamadas = sum(por_endpoint.values())
+        relatorio['controlador'] = {
+            'chamadas': chamadas,
+            'por_requisicao': round(chamadas / len(todas), 4) if todas else 0.0,
+            'por_endpoint': por_endpoint,
+        }
+
+    imprimir(relatorio)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        print(f"\nRelatório gravado em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,120 @@
 #!/opt/auth_project/venv/bin/python3
+import http.client
+import json
 import os
+import socket
 import sys
-import django
+from urllib.parse import urlencode
+
+# Socket do serviço residente de autorização (manage.py radius_auth_server --socket ...)
+RADIUS_AUTH_SOCKET = os.getenv('RADIUS_AUTH_SOCKET', '/run/unifi_auth/radius.sock')
+# Snapshot dos MACs autorizados (manage.py export_mac_snapshot --loop)
+MAC_SNAPSHOT_PATH = os.getenv('MAC_SNAPSHOT_PATH', '/dev/shm/unifi_auth_macs.snap')
+# Snapshot gravado há mais tempo que isso (segundos) é ignorado: o exportador parou
+MAC_SNAPSHOT_MAX_AGE = float(os.getenv('MAC_SNAPSHOT_MAX_AGE', '180'))
 
-# Configura o Django (ajuste o nome do seu projeto aqui)
 sys.path.append('/opt/auth_project')
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unifi_auth_project.settings')
-django.setup()
 
-from unifi_auth_app.models import UniFiUser
 
-def main(mac):
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """Conexão HTTP sobre socket Unix"""
+
+    def __init__(self, path, timeout=2):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def consultar_snapshot(mac):
+    """
+    Consulta o snapshot de MACs autorizados via mmap, sem banco e sem Django.
+    Retorna (autorizado, mensagem) se o MAC estiver no snapshot (ou for
+    inválido), ou None para seguir para o serviço e o banco: snapshot
+    indisponível, mais antigo que MAC_SNAPSHOT_MAX_AGE ou MAC ausente (pode ter
+    sido autorizado depois da última exportação).
+    """
+    try:
+        from unifi_auth_app.mac_snapshot import MacSnapshotReader
+        snapshot = MacSnapshotReader(MAC_SNAPSHOT_PATH)
+    except (ImportError, OSError, ValueError):
+        return None
+
+    if snapshot.idade() > MAC_SNAPSHOT_MAX_AGE:
+        return None
+
+    try:
+        registro = snapshot.consultar(mac)
+    except ValueError:
+        return False, f"MAC inválido: {mac}"
+    if registro:
+        return True, f"MAC {mac} autorizado ({registro.tipo})"
+    return None
+
+
+def consultar_servico(mac):
+    """
+    Consulta o serviço residente de autorização.
+    Retorna (autorizado, mensagem) ou None se o serviço estiver indisponível.
+    """
+    try:
+        conn = UnixHTTPConnection(RADIUS_AUTH_SOCKET)
+        conn.request('GET', '/authorize?' + urlencode({'mac': mac}))
+        response = conn.getresponse()
+        dados = json.loads(response.read() or b'{}')
+        conn.close()
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+
+    if response.status in (200, 400, 401):
+        return response.status == 200, dados.get('Reply-Message', '')
+    return None
+
+
+def consultar_banco(mac):
+    """Consulta direta ao banco, usada apenas se o serviço residente estiver fora do ar"""
+    import django
+
+    # Configura o Django (ajuste o nome do seu projeto aqui)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unifi_auth_project.settings')
+    django.setup()
+
+    from django.core.exceptions import ValidationError
+    from unifi_auth_app.mac_authorization import macs_visitantes_todos_autorizados
+    from unifi_auth_app.models import UniFiUser, format_mac_address
+
+    try:
+        # Normaliza o MAC para a busca exata usar o índice único de mac_address
+        mac = format_mac_address(mac)
+    except ValidationError:
+        return False, f"MAC inválido: {mac}"
+
     try:
-        # Busca o usuário que tem dispositivo com MAC igual (case insensitive)
-        user = UniFiUser.objects.get(dispositivos__mac_address__iexact=mac)
-        print(f"MAC {mac} autorizado: dispositivo do usuário {user.nome}")
-        sys.exit(0)
+        user = UniFiUser.objects.get(dispositivos__mac_address=mac, ativo=True)
+        return True, f"MAC {mac} autorizado: dispositivo do usuário {user.nome}"
     except UniFiUser.DoesNotExist:
-        print(f"MAC {mac} não encontrado no banco")
-        sys.exit(1)
+        pass
+
+    # Mesmas fontes do serviço residente: dispositivos de visitantes e visitantes do portal
+    if any(macs_visitantes_todos_autorizados({mac})):
+        return True, f"MAC {mac} autorizado: visitante"
+    return False, f"MAC {mac} não encontrado no banco"
+
+
+def main(mac):
+    try:
+        resultado = consultar_snapshot(mac) or consultar_servico(mac) or consultar_banco(mac)
     except Exception as e:
         print(f"Erro inesperado: {str(e)}")
         sys.exit(1)
 
+    autorizado, mensagem = resultado
+    print(mensagem)
+    sys.exit(0 if autorizado else 1)
+
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Uso: radius_mac_auth.py <MAC>")
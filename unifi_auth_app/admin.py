@@ -4,7 +4,7 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.contrib import messages
 from django.http import HttpResponseRedirect
-from .models import UniFiUser, Dispositivo, Visitante, VisitanteDispositivo
+from .models import UniFiUser, Dispositivo, Visitante, VisitanteDispositivo, WhitelistOutbox, AuditEvent
 
 class DispositivoInline(admin.TabularInline):
     model = Dispositivo
@@ -12,9 +12,9 @@ class DispositivoInline(admin.TabularInline):
 
 @admin.register(UniFiUser)
 class UniFiUserAdmin(admin.ModelAdmin):
-    list_display = ("nome", "matricula", "departamento", "vinculo", "get_mac_addresses", "created_at")
+    list_display = ("nome", "matricula", "departamento", "vinculo", "ativo", "get_mac_addresses", "created_at")
     search_fields = ("nome", "matricula", "dispositivos__mac_address")
-    list_filter = ("departamento", "vinculo", "created_at")
+    list_filter = ("ativo", "departamento", "vinculo", "created_at")
     inlines = [DispositivoInline]
 
     def get_mac_addresses(self, obj):
@@ -89,7 +89,7 @@ class VisitanteDispositivoAdmin(admin.ModelAdmin):
 # Registra o modelo Visitante
 @admin.register(Visitante)
 class VisitanteAdmin(admin.ModelAdmin):
-    list_display = ("nome", "email", "telefone", "get_mac_addresses", "ip_address", "data_acesso", "autorizado", "total_dispositivos_ativos")
+    list_display = ("nome", "email", "telefone", "get_mac_addresses", "ip_address", "data_acesso", "autorizado", "autorizado_ate", "total_dispositivos_ativos")
     search_fields = ("nome", "email", "telefone", "ip_address", "visitante_dispositivos__visitante_mac_address")
     list_filter = ("autorizado", "data_acesso")
     readonly_fields = ("data_acesso", "total_dispositivos_ativos_display")
@@ -146,3 +146,38 @@ class VisitanteAdmin(admin.ModelAdmin):
     # Adiciona os campos de total de dispositivos à listagem
     def get_list_display(self, request):
         return super().get_list_display(request) + ('total_dispositivos_ativos',)
+
+
+@admin.register(WhitelistOutbox)
+class WhitelistOutboxAdmin(admin.ModelAdmin):
+    """Acompanhamento da fila de alterações da whitelist (somente leitura)"""
+    list_display = ('mac_address', 'ssid', 'operacao', 'status', 'tentativas', 'proxima_tentativa', 'criado_em', 'processado_em')
+    list_filter = ('status', 'operacao', 'ssid')
+    search_fields = ('mac_address',)
+    readonly_fields = [f.name for f in WhitelistOutbox._meta.fields]
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(admin.ModelAdmin):
+    """Consulta dos eventos de auditoria das APIs (somente leitura)"""
+    list_display = ('timestamp', 'method', 'path', 'status_code', 'duration_ms', 'client_ip', 'mac_address', 'usuario')
+    list_filter = ('method', 'status_code')
+    # Busca exata, para usar os índices por IP e MAC
+    search_fields = ('=client_ip', '=mac_address')
+    date_hierarchy = 'timestamp'
+    readonly_fields = [f.name for f in AuditEvent._meta.fields]
+    show_full_result_count = False
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
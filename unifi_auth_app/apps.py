@@ -8,3 +8,4 @@ class UnifiAuthAppConfig(AppConfig):
     def ready(self):
         # Importa os sinais para que eles sejam conectados quando a app estiver pronta.
         import unifi_auth_app.signals
+        import unifi_auth_app.visitante_signals
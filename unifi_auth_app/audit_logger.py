@@ -1,91 +1,83 @@
-import json
 import logging
 import time
-from datetime import datetime
-from django.utils import timezone
-from django.conf import settings
-import socket
+from django.http.request import RawPostDataException
+from django.utils.deprecation import MiddlewareMixin
 
-# Configura o logger de auditoria
+from .audit_pipeline import HOSTNAME, MAX_BODY_SIZE
+from .client_ip import get_client_ip
+
+# Configura o logger de auditoria (handler AuditQueueHandler, ver settings.LOGGING)
 audit_logger = logging.getLogger('audit')
 
-# Obtém o nome do host para incluir nos logs
-HOSTNAME = socket.gethostname()
+logger = logging.getLogger('unifi_auth_app')
+
+# Métodos cujo corpo é registrado
+METODOS_COM_CORPO = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
 
-class APIAuditMiddleware:
+class APIAuditMiddleware(MiddlewareMixin):
     """
     Middleware para registrar requisições de API para fins de auditoria.
-    """
-    def __init__(self, get_response):
-        self.get_response = get_response
+    Usa os hooks do MiddlewareMixin para funcionar tanto em WSGI quanto em ASGI.
 
-    def __call__(self, request):
+    Na requisição só são coletados os dados brutos; a decodificação do corpo,
+    a serialização e a gravação acontecem em lote na thread do audit_pipeline.
+    """
+    def process_request(self, request):
         # Ignora requisições que não são da API
         if not request.path.startswith('/api/'):
-            return self.get_response(request)
-        
-        try:
-            # Captura o corpo da requisição para registro
-            request_body = self._get_request_body(request)
-            
-            # Processa a requisição
-            start_time = timezone.now()
-            response = self.get_response(request)
-            end_time = timezone.now()
-            
-            # Registra a requisição no log de auditoria
-            self._log_request(
-                request=request,
-                response=response,
-                request_body=request_body,
-                start_time=start_time,
-                end_time=end_time
-            )
-            
+            return None
+
+        request._audit_start = time.time()
+        request._audit_start_monotonic = time.monotonic()
+        return None
+
+    def process_response(self, request, response):
+        start_time = getattr(request, '_audit_start', None)
+        if start_time is None:
             return response
-            
-        except Exception as e:
-            # Em caso de erro, registra e propaga a exceção
-            logger = logging.getLogger('django.request')
-            logger.error(
-                f"Erro no middleware de auditoria: {str(e)}",
-                exc_info=True,
-                extra={
-                    'status_code': 500,
-                    'request': request
-                }
-            )
-            # Propaga a exceção para o próximo middleware/tratador de exceção
-            raise
-    
+
+        # Registra a requisição no log de auditoria
+        self._log_request(request=request, response=response, start_time=start_time)
+        return response
+
     def _get_request_body(self, request):
-        """Obtém o corpo da requisição de forma segura."""
+        """
+        Obtém o corpo bruto da requisição, somente se for pequeno o suficiente.
+
+        O corpo não é decodificado aqui; montar_evento() faz isso em segundo plano.
+        """
+        if request.method not in METODOS_COM_CORPO:
+            return None
+        try:
+            tamanho = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if not 0 < tamanho < MAX_BODY_SIZE:
+            return None
         try:
-            if request.body:
-                if request.content_type == 'application/json':
-                    return json.loads(request.body.decode('utf-8'))
-                return request.body.decode('utf-8')
+            return request.body
+        except RawPostDataException:
+            # A view consumiu o stream sem guardar o corpo
+            return None
         except Exception as e:
             logger.warning(f"Erro ao obter corpo da requisição: {str(e)}")
         return None
-    
-    def _log_request(self, request, response, request_body, start_time, end_time):
+
+    def _log_request(self, request, response, start_time):
         """Registra a requisição no log de auditoria."""
         try:
             # Calcula o tempo de processamento em milissegundos
-            duration_ms = int((timezone.now() - start_time).total_seconds() * 1000)
-            
+            duration_ms = int((time.monotonic() - request._audit_start_monotonic) * 1000)
+
             # Obtém informações do usuário
             user_info = 'anonymous'
             if hasattr(request, 'user') and request.user.is_authenticated:
                 user_info = f"{request.user} (id: {request.user.id})"
-            
-            # Obtém o IP do cliente
-            client_ip = self._get_client_ip(request)
-            
-            # Prepara os dados do log
+
+            # Prepara os dados do log (a thread de gravação completa o evento)
             log_data = {
-                'timestamp': start_time.isoformat(),
+                'started_at': start_time,
                 'hostname': HOSTNAME,
                 'method': request.method,
                 'path': request.path,
@@ -93,33 +85,23 @@ class APIAuditMiddleware:
                 'status_code': response.status_code,
                 'duration_ms': duration_ms,
                 'user': user_info,
-                'client_ip': client_ip,
+                'client_ip': get_client_ip(request),
                 'user_agent': request.META.get('HTTP_USER_AGENT', ''),
                 'referer': request.META.get('HTTP_REFERER', ''),
+                'raw_body': self._get_request_body(request),
+                'content_type': request.content_type,
             }
-            
-            # Adiciona o corpo da requisição se existir e for pequeno o suficiente
-            if request_body and len(str(request_body)) < 1000:  # Limita o tamanho do log
-                log_data['request_body'] = request_body
-            
-            # Registra no log de auditoria no formato JSON
+
+            # Enfileira o registro; nada é formatado nem gravado nesta thread
             audit_logger.info(
                 'API Request',
                 extra={
                     'audit': log_data
                 }
             )
-            
+
         except Exception as e:
             # Se ocorrer um erro ao registrar o log, registra o erro no log do Django
             logger = logging.getLogger('django')
             logger.error(f"Erro ao registrar requisição de auditoria: {str(e)}", exc_info=True)
-    
-    def _get_client_ip(self, request):
-        """Obtém o IP do cliente considerando proxies."""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+
@@ -0,0 +1,225 @@
+"""
+Pipeline assíncrono dos registros de auditoria das APIs.
+
+O APIAuditMiddleware apenas monta um dicionário pequeno com os dados da
+requisição e o entrega ao logger 'audit'. O AuditQueueHandler coloca o
+registro em uma fila limitada do processo, sem formatar nada e sem tocar no
+disco; se a fila estiver cheia o registro é descartado e contado em
+portal_audit_events_dropped_total, para que a auditoria nunca atrase uma
+requisição.
+
+Uma thread em segundo plano (AuditListener) retira os registros da fila em
+lotes de até AUDIT_BATCH_SIZE, ou a cada AUDIT_FLUSH_INTERVAL segundos,
+termina de montar cada evento (decodifica o corpo, formata datas) e grava o
+lote inteiro com uma única escrita em cada destino configurado: o arquivo
+JSON lines e, com AUDIT_DB_ENABLED, a tabela AuditEvent (ver audit_store).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('unifi_auth_app')
+
+HOSTNAME = socket.gethostname()
+
+# Corpos maiores que isso não são registrados
+MAX_BODY_SIZE = 1000
+
+
+def montar_evento(dados: dict) -> dict:
+    """Completa, fora da requisição, o evento registrado pelo middleware."""
+    evento = dict(dados)
+    evento['timestamp'] = datetime.fromtimestamp(
+        evento.pop('started_at', time.time()), tz=dt_timezone.utc
+    ).isoformat()
+    evento.setdefault('hostname', HOSTNAME)
+
+    corpo = evento.pop('raw_body', None)
+    content_type = evento.pop('content_type', '')
+    if corpo:
+        try:
+            texto = corpo.decode('utf-8') if isinstance(corpo, bytes) else corpo
+            evento['request_body'] = json.loads(texto) if content_type == 'application/json' else texto
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Erro ao obter corpo da requisição: {str(e)}")
+    return evento
+
+
+class JsonLinesSink:
+    """
+    Grava lotes de eventos como JSON lines, com rotação por tamanho.
+
+    Uma única chamada de write/flush por lote.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 10):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._arquivo = None
+
+    def __call__(self, eventos: List[dict]) -> None:
+        linhas = ''.join(json.dumps(evento, default=str, ensure_ascii=False) + '\n' for evento in eventos)
+        if self._arquivo is None:
+            self._arquivo = open(self.path, 'a', encoding='utf-8')
+        self._arquivo.write(linhas)
+        self._arquivo.flush()
+        if self.max_bytes and self._arquivo.tell() >= self.max_bytes:
+            self._rotacionar()
+
+    def _rotacionar(self) -> None:
+        self._arquivo.close()
+        self._arquivo = None
+        for indice in range(self.backup_count - 1, 0, -1):
+            origem = f"{self.path}.{indice}"
+            if os.path.exists(origem):
+                os.replace(origem, f"{self.path}.{indice + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self) -> None:
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+
+def sinks_configurados() -> List[Callable[[List[dict]], None]]:
+    """Destinos dos eventos de auditoria conforme as configurações."""
+    sinks = [
+        JsonLinesSink(
+            getattr(settings, 'AUDIT_LOG_PATH', '/opt/auth_project/logs/audit.jsonl'),
+            max_bytes=getattr(settings, 'AUDIT_LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backup_count=getattr(settings, 'AUDIT_LOG_BACKUP_COUNT', 10),
+        )
+    ]
+    if getattr(settings, 'AUDIT_DB_ENABLED', True):
+        # Importado aqui: este módulo é carregado pelo LOGGING antes dos models
+        from .audit_store import AuditEventSink
+        sinks.append(AuditEventSink())
+    return sinks
+
+
+class AuditListener:
+    """Thread que retira os registros da fila e os grava em lotes."""
+
+    def __init__(self, fila: queue.Queue, sinks, batch_size: int = 200, flush_interval: float = 1.0):
+        self.fila = fila
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='audit-listener', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Grava o que ainda estiver na fila e encerra a thread."""
+        self._parar.set()
+        self._thread.join(timeout)
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    def _executar(self) -> None:
+        while not self._parar.is_set() or not self.fila.empty():
+            lote = self._coletar()
+            if lote:
+                self._gravar(lote)
+
+    def _coletar(self) -> List[logging.LogRecord]:
+        """Aguarda até encher um lote ou o intervalo de gravação acabar."""
+        lote = []
+        limite = time.monotonic() + self.flush_interval
+        while len(lote) < self.batch_size:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _gravar(self, lote: List[logging.LogRecord]) -> None:
+        eventos = []
+        for registro in lote:
+            try:
+                eventos.append(montar_evento(getattr(registro, 'audit', None) or {'message': registro.getMessage()}))
+            except Exception as e:
+                logger.error(f"Erro ao montar evento de auditoria: {str(e)}")
+
+        metrics.track_audit_flush(len(eventos), self.fila.qsize())
+        for sink in self.sinks:
+            try:
+                sink(eventos)
+            except Exception as e:
+                # Uma falha de disco não deve derrubar a thread
+                logger.error(f"Erro ao gravar {len(eventos)} eventos de auditoria: {str(e)}")
+
+
+class AuditQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler com fila limitada e descarte quando a fila está cheia.
+
+    A thread de gravação é iniciada no primeiro registro de cada processo
+    (após o fork dos workers).
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        maxsize = maxsize or getattr(settings, 'AUDIT_QUEUE_SIZE', 10000)
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self._listener: Optional[AuditListener] = None
+        self._pid: Optional[int] = None
+        self._iniciar_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Nada de formatação na thread da requisição: o evento já é um dicionário
+        return record
+
+    def enqueue(self, record):
+        self._garantir_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.track_audit_dropped()
+
+    def _garantir_listener(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._iniciar_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Fila e thread herdadas de um fork não servem ao novo processo
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = AuditListener(
+                self.queue,
+                sinks_configurados(),
+                batch_size=getattr(settings, 'AUDIT_BATCH_SIZE', 200),
+                flush_interval=getattr(settings, 'AUDIT_FLUSH_INTERVAL', 1.0),
+            )
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._listener.stop)
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+        super().close()
@@ -0,0 +1,143 @@
+"""
+Armazenamento consultável dos eventos de auditoria das APIs.
+
+Os eventos montados pelo audit_pipeline são gravados em lote na tabela
+AuditEvent (somente inclusão), indexada por timestamp e pelas chaves de
+consulta (IP do cliente, MAC e caminho, sempre combinadas com o timestamp).
+As consultas exigem um intervalo de tempo, de modo que o banco use sempre um
+desses índices em vez de varrer todo o histórico. A retenção é aplicada pelo
+comando purge_audit_events, que apaga os eventos antigos em lotes pequenos
+para não travar a tabela.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import AuditEvent, format_mac_address
+from .rate_limit import MAC_FIELDS
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Campos do evento que viram colunas; o restante vai para AuditEvent.detalhes
+CAMPOS_COLUNAS = (
+    'timestamp', 'hostname', 'method', 'path', 'status_code',
+    'duration_ms', 'client_ip', 'user', 'user_agent',
+)
+
+
+def extrair_mac(evento: dict) -> Optional[str]:
+    """MAC do cliente informado no corpo ou na query string do evento, normalizado."""
+    fontes = [evento.get('request_body'), evento.get('query_params')]
+    for fonte in fontes:
+        if not isinstance(fonte, dict):
+            continue
+        for campo in MAC_FIELDS:
+            valor = fonte.get(campo)
+            if isinstance(valor, list):
+                valor = valor[0] if valor else None
+            if valor:
+                try:
+                    return format_mac_address(str(valor))
+                except ValidationError:
+                    return None
+    return None
+
+
+def evento_para_modelo(evento: dict) -> AuditEvent:
+    """Converte um evento montado por audit_pipeline.montar_evento em AuditEvent."""
+    timestamp = evento.get('timestamp')
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return AuditEvent(
+        timestamp=timestamp or timezone.now(),
+        hostname=evento.get('hostname') or '',
+        method=(evento.get('method') or '')[:10],
+        path=(evento.get('path') or '')[:255],
+        status_code=evento.get('status_code') or 0,
+        duration_ms=max(int(evento.get('duration_ms') or 0), 0),
+        client_ip=evento.get('client_ip') or None,
+        mac_address=extrair_mac(evento),
+        usuario=(evento.get('user') or '')[:255],
+        user_agent=evento.get('user_agent') or '',
+        detalhes={chave: valor for chave, valor in evento.items() if chave not in CAMPOS_COLUNAS},
+    )
+
+
+class AuditEventSink:
+    """Destino do audit_pipeline que grava cada lote com um único bulk_create."""
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+
+    def __call__(self, eventos: List[dict]) -> None:
+        # A thread de gravação vive mais que qualquer requisição: descarta conexões vencidas
+        close_old_connections()
+        AuditEvent.objects.bulk_create(
+            [evento_para_modelo(evento) for evento in eventos],
+            batch_size=self.batch_size,
+        )
+
+    def close(self) -> None:
+        close_old_connections()
+
+
+def consultar_eventos(desde, ate, client_ip: Optional[str] = None, mac: Optional[str] = None,
+                      path: Optional[str] = None, limite: int = 100):
+    """
+    Eventos de auditoria no intervalo [desde, ate), do mais recente ao mais antigo.
+
+    Args:
+        desde (datetime): Início do intervalo (obrigatório)
+        ate (datetime): Fim do intervalo (obrigatório)
+        client_ip (str, optional): IP do cliente
+        mac (str, optional): MAC do cliente, em qualquer formato aceito
+        path (str, optional): Caminho exato, ou prefixo se terminar em '*'
+        limite (int): Quantidade máxima de eventos
+
+    Raises:
+        ValidationError: Se o MAC informado for inválido
+    """
+    eventos = AuditEvent.objects.filter(timestamp__gte=desde, timestamp__lt=ate)
+    if client_ip:
+        eventos = eventos.filter(client_ip=client_ip)
+    if mac:
+        eventos = eventos.filter(mac_address=format_mac_address(mac))
+    if path:
+        if path.endswith('*'):
+            eventos = eventos.filter(path__startswith=path[:-1])
+        else:
+            eventos = eventos.filter(path=path)
+    return eventos.order_by('-timestamp')[:limite]
+
+
+def purgar_eventos(dias: Optional[int] = None, lote: int = 5000) -> int:
+    """
+    Apaga os eventos de auditoria mais antigos que `dias` (padrão AUDIT_RETENTION_DAYS).
+
+    Returns:
+        int: Quantidade de eventos apagados
+    """
+    if dias is None:
+        dias = getattr(settings, 'AUDIT_RETENTION_DAYS', 90)
+    limite = timezone.now() - timedelta(days=dias)
+
+    total = 0
+    while True:
+        ids = list(
+            AuditEvent.objects.filter(timestamp__lt=limite)
+            .order_by('timestamp')
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            break
+        apagados, _ = AuditEvent.objects.filter(id__in=ids).delete()
+        total += apagados
+
+    if total:
+        logger.info(f"[AUDITORIA] {total} eventos anteriores a {limite:%d/%m/%Y %H:%M} apagados")
+    return total
@@ -0,0 +1,129 @@
+"""
+Cache dos visitantes autorizados por IP, usado por check_auth_status.
+
+Os portais cativos dos celulares consultam check_auth_status o tempo todo.
+A consulta passa primeiro por um dicionário no próprio processo (TTL curto)
+e depois pelo cache compartilhado do Django; só então vai ao banco. IPs sem
+visitante autorizado também são guardados, por pouco tempo (cache negativo).
+
+Os signals de Visitante chamam invalidar_ip() ao salvar ou apagar um
+visitante, removendo a entrada do cache compartilhado e do processo atual;
+nos demais workers a entrada local expira em AUTH_STATUS_LOCAL_TTL segundos.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger('unifi_auth_app')
+
+CACHE_KEY_PREFIX = 'auth_status:ip:'
+# Valor guardado no cache para IPs sem visitante autorizado
+NAO_AUTORIZADO = '-'
+# Limite de IPs mantidos na memória de cada processo
+LOCAL_MAX_ENTRADAS = 10000
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _ttl(nome: str, padrao: float) -> float:
+    return getattr(settings, nome, padrao)
+
+
+def resumo_visitante(visitante) -> dict:
+    """Dados do visitante devolvidos por check_auth_status."""
+    return {
+        'nome': visitante.nome,
+        'email': visitante.email,
+        'data_acesso': visitante.data_acesso.isoformat(),
+    }
+
+
+def visitante_autorizado_por_ip(ip: str) -> Optional[dict]:
+    """
+    Resumo do visitante autorizado com o IP informado, ou None.
+
+    Ordem de consulta: memória do processo, cache compartilhado e banco.
+    """
+    if not ip:
+        return None
+
+    agora = time.monotonic()
+    entrada = _local.get(ip)
+    if entrada and entrada[0] > agora:
+        metrics.track_auth_status_cache('local')
+        return entrada[1]
+
+    try:
+        valor = cache.get(CACHE_KEY_PREFIX + ip)
+    except Exception as e:
+        logger.warning(f"Cache de autorização por IP indisponível: {str(e)}")
+        valor = None
+
+    if valor is not None:
+        metrics.track_auth_status_cache('shared')
+    else:
+        metrics.track_auth_status_cache('miss')
+        valor = _consultar_banco(ip)
+
+    resumo = None if valor == NAO_AUTORIZADO else valor
+    with _local_lock:
+        if len(_local) >= LOCAL_MAX_ENTRADAS:
+            _descartar_expirados(agora)
+        _local[ip] = (agora + _ttl('AUTH_STATUS_LOCAL_TTL', 1), resumo)
+    return resumo
+
+
+def _descartar_expirados(agora: float) -> None:
+    for ip in [ip for ip, (expira, _) in _local.items() if expira <= agora]:
+        del _local[ip]
+    if len(_local) >= LOCAL_MAX_ENTRADAS:
+        _local.clear()
+
+
+def _consultar_banco(ip: str):
+    from .models import Visitante
+
+    agora = timezone.now()
+    visitante = Visitante.objects.filter(
+        Q(autorizado_ate__isnull=True) | Q(autorizado_ate__gt=agora),
+        ip_address=ip,
+        autorizado=True,
+    ).first()
+    if visitante:
+        valor, timeout = resumo_visitante(visitante), _ttl('AUTH_STATUS_CACHE_TTL', 300)
+        if visitante.autorizado_ate:
+            # A entrada não pode sobreviver à autorização
+            timeout = max(1, min(timeout, int((visitante.autorizado_ate - agora).total_seconds())))
+    else:
+        valor, timeout = NAO_AUTORIZADO, _ttl('AUTH_STATUS_NEGATIVE_TTL', 5)
+
+    try:
+        cache.set(CACHE_KEY_PREFIX + ip, valor, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o cache de autorização por IP: {str(e)}")
+    return valor
+
+
+def invalidar_ip(*ips) -> None:
+    """Remove os IPs do cache compartilhado e da memória do processo."""
+    for ip in filter(None, ips):
+        with _local_lock:
+            _local.pop(ip, None)
+        try:
+            cache.delete(CACHE_KEY_PREFIX + ip)
+        except Exception as e:
+            logger.warning(f"Não foi possível invalidar o cache de autorização do IP {ip}: {str(e)}")
+
+
+def limpar_cache_local() -> None:
+    with _local_lock:
+        _local.clear()
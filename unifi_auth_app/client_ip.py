@@ -0,0 +1,31 @@
+"""
+Endereço IP do cliente que fez a requisição.
+
+Usado pelas views do portal, pelo limitador de taxa e pela auditoria. O
+cabeçalho X-Forwarded-For é montado pelo próprio cliente até chegar ao
+primeiro proxy, então só os endereços acrescentados por proxies confiáveis
+(TRUSTED_PROXIES) são considerados.
+"""
+from django.conf import settings
+
+
+def get_client_ip(request):
+    """
+    Obtém o endereço IP do cliente.
+
+    Se a conexão não vem de um proxy confiável, o IP é REMOTE_ADDR. Se vem,
+    o X-Forwarded-For é percorrido da direita para a esquerda e o primeiro
+    endereço que não é de um proxy confiável é o do cliente; os valores mais à
+    esquerda, que o cliente pode forjar, são ignorados.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
+    proxies = getattr(settings, 'TRUSTED_PROXIES', ())
+    if remote_addr not in proxies:
+        return remote_addr
+
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for ip in reversed(x_forwarded_for.split(',')):
+        ip = ip.strip()
+        if ip and ip not in proxies:
+            return ip
+    return remote_addr
@@ -0,0 +1,293 @@
+"""
+Snapshot indexado dos clientes conectados ao UniFi Controller (stat/sta).
+
+Em vez de baixar e percorrer a lista completa de clientes a cada requisição,
+o snapshot é obtido no máximo uma vez por UNIFI_CLIENT_SNAPSHOT_TTL segundos,
+compartilhado entre os workers pelo cache do Django e indexado em memória por
+IP, MAC normalizado e AP, permitindo consultas O(1).
+
+Quando o snapshot expira, ele ainda é servido por até
+UNIFI_CLIENT_SNAPSHOT_STALE_TTL segundos enquanto uma thread em segundo plano
+busca a versão nova (stale-while-revalidate).
+
+Apenas um processo busca stat/sta por vez (trava REFRESH_LOCK_KEY, obtida com
+cache.add); os demais continuam servindo o snapshot que já têm. Consultas sem
+resultado forçam no máximo uma atualização por IP (ou MAC) a cada
+UNIFI_CLIENT_SNAPSHOT_NEGATIVE_TTL segundos; o cache negativo só é gravado
+quando a própria consulta buscou o snapshot em que o cliente não estava.
+
+Os MACs dos índices estão no formato canônico de mac_utils (XX:XX:XX:XX:XX:XX).
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .mac_utils import MacInvalido, normalizar_mac, normalizar_macs
+from .unifi_session import get_default_controller_session
+
+logger = logging.getLogger('unifi_auth_app')
+
+CACHE_KEY = 'unifi:client_snapshot'
+REFRESH_LOCK_KEY = 'unifi:client_snapshot:refresh'
+NEGATIVE_KEY_PREFIX = 'unifi:client_snapshot:miss:'
+
+# Apenas os campos usados pelo portal são guardados no cache compartilhado
+SNAPSHOT_FIELDS = (
+    'mac', 'ip', 'ap_mac', 'hostname', 'name', 'essid',
+    'is_guest', 'authorized', 'last_seen',
+)
+
+
+def _chave_mac(mac: str) -> Optional[str]:
+    """MAC no formato canônico usado pelos índices, ou None se vazio ou inválido"""
+    try:
+        return normalizar_mac(mac) if mac else None
+    except MacInvalido:
+        return None
+
+
+class ClientSnapshot:
+    """Lista de clientes de um instante, com índices por IP, MAC e AP."""
+
+    def __init__(self, clients: List[dict], fetched_at: float):
+        self.clients = clients
+        self.fetched_at = fetched_at
+        self.by_ip: Dict[str, dict] = {}
+        self.by_mac: Dict[str, dict] = {}
+        by_ap: Dict[str, List[dict]] = defaultdict(list)
+
+        # MACs normalizados em lote (inválidos ou ausentes ficam como None); os
+        # APs são poucos, então cada MAC de AP distinto é normalizado uma vez
+        macs = normalizar_macs(client.get('mac', '') for client in clients).macs
+        aps = {ap_mac: _chave_mac(ap_mac) for ap_mac in {client.get('ap_mac') for client in clients}}
+
+        for client, mac in zip(clients, macs):
+            ip = client.get('ip')
+            if ip:
+                self.by_ip[ip] = client
+            if mac:
+                self.by_mac[mac] = client
+            ap_mac = aps[client.get('ap_mac')]
+            if ap_mac:
+                by_ap[ap_mac].append(client)
+
+        self.by_ap = dict(by_ap)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def __len__(self):
+        return len(self.clients)
+
+
+class ClientSnapshotService:
+    """
+    Serviço que mantém o snapshot de clientes atualizado e responde consultas.
+
+    Uma instância por processo (ver get_client_snapshot_service); o conteúdo
+    é compartilhado entre processos pelo cache configurado em
+    UNIFI_CLIENT_SNAPSHOT_CACHE.
+    """
+
+    def __init__(self):
+        self.ttl = getattr(settings, 'UNIFI_CLIENT_SNAPSHOT_TTL', 15)
+        self.stale_ttl = getattr(settings, 'UNIFI_CLIENT_SNAPSHOT_STALE_TTL', 60)
+        # Intervalo mínimo entre atualizações forçadas por consultas sem resultado
+        self.min_refresh_interval = getattr(settings, 'UNIFI_CLIENT_SNAPSHOT_MIN_REFRESH', 2)
+        # Tempo em que um IP/MAC sem resultado não força outra atualização
+        self.negative_ttl = getattr(settings, 'UNIFI_CLIENT_SNAPSHOT_NEGATIVE_TTL', 10)
+        # Espera máxima pelo primeiro snapshot quando outro processo já o está buscando
+        self.wait_timeout = getattr(settings, 'UNIFI_CLIENT_SNAPSHOT_WAIT', 3)
+        self.cache = caches[getattr(settings, 'UNIFI_CLIENT_SNAPSHOT_CACHE', 'default')]
+        self._snapshot: Optional[ClientSnapshot] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    # === Consultas ===
+
+    def mac_for_ip(self, ip: str) -> Optional[str]:
+        """Retorna o MAC (como informado pelo controlador) do cliente com o IP dado"""
+        if not ip:
+            return None
+        client = self._lookup(lambda snapshot: snapshot.by_ip.get(ip), f'ip:{ip}')
+        return client.get('mac') if client else None
+
+    def client_for_mac(self, mac: str) -> Optional[dict]:
+        """Retorna os dados do cliente com o MAC informado"""
+        key = _chave_mac(mac)
+        if key is None:
+            return None
+        return self._lookup(lambda snapshot: snapshot.by_mac.get(key), f'mac:{key}')
+
+    def clients_for_ap(self, ap_mac: str) -> List[dict]:
+        """Retorna os clientes associados ao AP informado"""
+        snapshot = self.get_snapshot()
+        key = _chave_mac(ap_mac)
+        if snapshot is None or key is None:
+            return []
+        return snapshot.by_ap.get(key, [])
+
+    def _lookup(self, finder, negative_key: str):
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+
+        result = finder(snapshot)
+        if result is not None or snapshot.age <= self.min_refresh_interval:
+            return result
+
+        # Um cliente que acabou de se associar pode não estar no snapshot atual,
+        # mas o mesmo IP sem resultado não força outra atualização tão cedo
+        negative_key = NEGATIVE_KEY_PREFIX + negative_key
+        if self.cache.get(negative_key):
+            return None
+
+        fresh = self._refresh_single_flight()
+        if fresh is None:
+            # Outra atualização em andamento (ou falha): o cliente pode estar no
+            # próximo snapshot, então não grava o cache negativo
+            latest = self._current(check_shared=True)
+            if latest is None or latest is snapshot:
+                return None
+            return finder(latest)
+
+        result = finder(fresh)
+        if result is None:
+            self.cache.set(negative_key, 1, timeout=self.negative_ttl)
+        return result
+
+    # === Ciclo de vida do snapshot ===
+
+    def get_snapshot(self) -> Optional[ClientSnapshot]:
+        """Retorna o snapshot vigente, atualizando-o se necessário"""
+        snapshot = self._current()
+
+        if snapshot is not None and snapshot.age <= self.ttl:
+            metrics.track_client_snapshot('hit', snapshot)
+            return snapshot
+
+        if snapshot is not None and snapshot.age <= self.ttl + self.stale_ttl:
+            metrics.track_client_snapshot('stale', snapshot)
+            self._refresh_in_background()
+            return snapshot
+
+        metrics.track_client_snapshot('miss', snapshot)
+        fresh = self._refresh_single_flight()
+        if fresh is None and snapshot is None:
+            # Outro processo está buscando o snapshot: espera por ele
+            fresh = self._wait_for_snapshot()
+        return fresh or snapshot
+
+    def refresh(self) -> Optional[ClientSnapshot]:
+        """Busca stat/sta no controlador e publica o novo snapshot"""
+        try:
+            clients = self._fetch_clients()
+        except Exception as e:
+            logger.error(f'Erro ao atualizar snapshot de clientes do UniFi: {str(e)}')
+            metrics.track_client_snapshot('error', self._snapshot)
+            return None
+
+        fetched_at = time.time()
+        self.cache.set(
+            CACHE_KEY,
+            {'fetched_at': fetched_at, 'clients': clients},
+            timeout=self.ttl + self.stale_ttl,
+        )
+        snapshot = ClientSnapshot(clients, fetched_at)
+        self._snapshot = snapshot
+        metrics.update_client_snapshot_size(len(snapshot))
+        return snapshot
+
+    def _current(self, check_shared: bool = False) -> Optional[ClientSnapshot]:
+        """
+        Snapshot local, substituído pelo do cache compartilhado se este for mais novo.
+
+        O cache só é consultado quando o snapshot local venceu, ou sempre com check_shared.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age <= self.ttl and not check_shared:
+            return snapshot
+
+        cached = self.cache.get(CACHE_KEY)
+        if cached and (snapshot is None or cached['fetched_at'] > snapshot.fetched_at):
+            snapshot = ClientSnapshot(cached['clients'], cached['fetched_at'])
+            self._snapshot = snapshot
+        return snapshot
+
+    def _acquire_refresh(self) -> bool:
+        """Obtém a trava de atualização; False se outra thread ou processo já estiver atualizando"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            # Evita que todos os workers atualizem ao mesmo tempo
+            if not self.cache.add(REFRESH_LOCK_KEY, 1, timeout=30):
+                return False
+            self._refreshing = True
+            return True
+
+    def _release_refresh(self) -> None:
+        self.cache.delete(REFRESH_LOCK_KEY)
+        self._refreshing = False
+
+    def _refresh_single_flight(self) -> Optional[ClientSnapshot]:
+        """Atualiza o snapshot agora, a menos que outra atualização esteja em andamento (None)"""
+        if not self._acquire_refresh():
+            return None
+        try:
+            return self.refresh()
+        finally:
+            self._release_refresh()
+
+    def _wait_for_snapshot(self) -> Optional[ClientSnapshot]:
+        """Aguarda até wait_timeout segundos o snapshot publicado por outra atualização"""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            snapshot = self._current()
+            if snapshot is not None:
+                return snapshot
+        return None
+
+    def _refresh_in_background(self) -> None:
+        if not self._acquire_refresh():
+            return
+
+        def worker():
+            try:
+                self.refresh()
+            finally:
+                self._release_refresh()
+
+        threading.Thread(target=worker, name='unifi-client-snapshot', daemon=True).start()
+
+    @metrics.track_api_call('client_snapshot')
+    def _fetch_clients(self) -> List[dict]:
+        session = get_default_controller_session()
+        site = settings.UNIFI_CONTROLLER_CONFIG['SITE_ID']
+        response = session.get(f"{session.base_url}/api/s/{site}/stat/sta")
+        response.raise_for_status()
+        return [
+            {field: client[field] for field in SNAPSHOT_FIELDS if field in client}
+            for client in response.json().get('data', [])
+        ]
+
+
+_service: Optional[ClientSnapshotService] = None
+_service_lock = threading.Lock()
+
+
+def get_client_snapshot_service() -> ClientSnapshotService:
+    """Retorna o serviço de snapshot do processo atual"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ClientSnapshotService()
+    return _service
@@ -0,0 +1,370 @@
+"""
+Importação da lista de servidores (UniFiUser) a partir de planilhas CSV, XLSX ou XLS.
+
+As linhas são lidas sob demanda (csv.reader, openpyxl em modo read_only) e
+processadas em blocos: cada bloco consulta os usuários existentes com uma
+única consulta por matrícula e grava com bulk_create/bulk_update, tudo em
+uma única transação.
+
+Cada linha normalizada gera um hash guardado em UniFiUser.import_hash; na
+reimportação, linhas com o mesmo hash são contadas como sem alteração e não
+geram escrita no banco.
+
+Com desativar_ausentes, servidores que não estão na nova lista são marcados
+como inativos e os MACs dos seus dispositivos saem da whitelist com uma única
+escrita (servidores que voltam à lista são reativados da mesma forma). Linhas
+ignoradas que trazem a matrícula contam como presentes, e a desativação é
+recusada se a fração de linhas ignoradas passar de IMPORTACAO_MAX_IGNORADOS.
+"""
+import csv
+import hashlib
+import logging
+import os
+import re
+import time
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Departamento, Dispositivo, UniFiUser
+from .whitelist_outbox import ADIAMENTO_EM_LOTE, aplicar_enfileirados, enfileirar_em_lote, ultimo_id
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Dicionário completo de mapeamento de departamentos
+DEPARTAMENTO_MAP = {
+    'ASSESSORIA DE COMUNICACAO': 'ASC',
+    'BIBLIOTECA LEGISLATIVA': 'MBL',
+    'CONTABILIDADE': 'CONT',
+    'CONTROLADORIA INTERNA': 'CNT',
+    'DEPART. DE POLICIA LEGISLATIVA': 'POL',
+    'DEPARTAMENTO DE COMPRAS': 'COM',
+    'DEPARTAMENTO DE MATERIAIS E SERVICOS': 'MTS',
+    'DEPARTAMENTO DE PLANEJAMENTO DE CONTRATACOES': 'PLN',
+    'DEPARTAMENTO DE RADIO E TV': 'RTV',
+    'DEPARTAMENTO DE TI': 'DTI',
+    'DIRETORIA ADMINISTRATIVA': 'DIA',
+    'DIRETORIA FINANCEIRA': 'DIF',
+    'DIRETORIA LEGISLATIVA': 'DIL',
+    'ESCOLA DO LEGISLATIVO': 'ILCM',
+    'ILCM - INSTITUTO LEGISLATIVO DA CAMARA MUNICIPAL DE PARAUAPE': 'ILCM',
+    'LICITACAO': 'LIC',
+    'PATRIMONIO': 'PAT',
+    'PRESIDENCIA': 'PRL',
+    'PROCURADORIA': 'PRO',
+    'RECURSOS HUMANOS': 'RH',
+    'SIC-SERVICO DE INFORMACAO AO CIDADAO': 'SIC',
+
+    'GAB. VER. ALEX OHANA': 'GAB8',
+    'GAB. VER. ANDERSON MARCOS MORATORIO': 'GAB16',
+    'GAB. VER. ELIAS FERREIRA DE ALMEIDA FILHO': 'GAB15',
+    'GAB. VER. ELVIS SILVA CRUZ': 'GAB10',
+    'GAB. VER. ERICA RIBEIRO': 'GAB17',
+    'GAB. VER. FRED SANCAO': 'GAB9',
+    'GAB. VER. FRANCISCO ELOECIO SILVA LIMA': 'GAB6',
+    'GAB. VER. GRACIELE BRITO': 'GAB13',
+    'GAB. VER. LAECIO DA ACT': 'GAB12',
+    'GAB. VER. LEONARDO DA SILVA MENDES': 'GAB11',
+    'GAB. VER. MAQUIVALDA': 'GAB2',
+    'GAB. VER. MICHEL CARTEIRO': 'GAB14',
+    'GAB. VER. SADISVAN': 'GAB5',
+    'GAB. VER. SARGENTO NOGUEIRA': 'GAB4',
+    'GAB. VER. TITO DO MST': 'GAB1',
+    'GAB. VER. ZE DA LATA': 'GAB7',
+    'GAB. VER. ELEOMARCIO ALMEIDA DE LIMA': 'GAB3'
+}
+
+# Siglas válidas, calculadas uma única vez
+DEPARTAMENTOS_VALIDOS = frozenset(choice[0] for choice in Departamento.choices)
+
+# Normalização do vínculo informado na planilha
+VINCULO_MAP = {
+    'COMISSIONADOS': 'comissionado',
+    'VEREADOR': 'comissionado',
+    'EFETIVOS': 'efetivo',
+}
+
+CAMPOS_ATUALIZAVEIS = ('nome', 'vinculo', 'departamento', 'import_hash', 'ativo')
+
+# Matrícula numérica escrita como decimal ('12345.0')
+MATRICULA_DECIMAL = re.compile(r'^(\d+)\.0+$')
+
+
+class ResultadoImportacao:
+    """Contagens de uma importação."""
+
+    def __init__(self):
+        self.linhas = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.inalterados = 0
+        self.ignorados = 0
+        self.reativados = 0
+        self.desativados = 0
+        self.macs_adicionados = 0
+        self.macs_removidos = 0
+        self.whitelist_aplicada = True
+        self.desativacao_recusada = False
+        self.duracao = 0.0
+
+    @property
+    def linhas_por_segundo(self) -> float:
+        return self.linhas / self.duracao if self.duracao else 0.0
+
+
+# === Leitura das planilhas ===
+
+def ler_linhas(caminho: str) -> Iterator[list]:
+    """
+    Linhas de dados da planilha (sem o cabeçalho), lidas sob demanda.
+
+    Ordem das colunas: MATRICULA, NOME, SETOR_NOME, VINCULO_NOME.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.csv':
+        return _ler_csv(caminho)
+    if extensao in ('.xlsx', '.xlsm'):
+        return _ler_xlsx(caminho)
+    if extensao == '.xls':
+        return _ler_xls(caminho)
+    raise ValueError(f"Formato de planilha não suportado: '{extensao}' (use .csv, .xlsx ou .xls)")
+
+
+def _ler_csv(caminho: str) -> Iterator[list]:
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        amostra = arquivo.read(4096)
+        arquivo.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+        except csv.Error:
+            dialeto = csv.excel
+        leitor = csv.reader(arquivo, dialeto)
+        next(leitor, None)  # Ignora cabeçalho
+        for linha in leitor:
+            if any(campo.strip() for campo in linha):
+                yield linha
+
+
+def _ler_xlsx(caminho: str) -> Iterator[list]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('O pacote openpyxl é necessário para importar arquivos .xlsx')
+
+    planilha = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        for linha in planilha.worksheets[0].iter_rows(min_row=2, values_only=True):
+            if any(valor not in (None, '') for valor in linha):
+                yield ['' if valor is None else valor for valor in linha]
+    finally:
+        planilha.close()
+
+
+def _ler_xls(caminho: str) -> Iterator[list]:
+    import xlrd
+
+    planilha = xlrd.open_workbook(caminho, on_demand=True)
+    try:
+        pagina = planilha.sheet_by_index(0)
+        for row_idx in range(1, pagina.nrows):  # Ignora cabeçalho
+            yield pagina.row_values(row_idx)
+    finally:
+        planilha.release_resources()
+
+
+# === Normalização ===
+
+def normalizar_matricula(valor) -> str:
+    """
+    Matrícula como texto, igual para CSV, XLSX e XLS.
+
+    O xlrd lê células numéricas como float (12345.0); esses valores, e textos
+    como '12345.0' gravados por importações antigas, viram '12345'.
+    """
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    texto = str(valor).strip()
+    decimal = MATRICULA_DECIMAL.match(texto)
+    return decimal.group(1) if decimal else texto
+
+
+def normalizar_linha(linha: list):
+    """
+    Converte uma linha da planilha nos campos do UniFiUser.
+
+    Returns:
+        tuple: (dados, None) ou (None, motivo) se a linha deve ser ignorada
+    """
+    if len(linha) < 4:
+        return None, f"Linha incompleta: {linha}"
+
+    # Ordem correta das colunas: MATRICULA, NOME, SETOR_NOME, VINCULO_NOME
+    matricula = normalizar_matricula(linha[0])
+    nome = str(linha[1]).strip().upper()
+    departamento_raw = str(linha[2]).strip().upper()
+    vinculo_raw = str(linha[3]).strip().upper()
+
+    if not matricula:
+        return None, f"Matrícula vazia para o usuário '{nome}'"
+
+    # Normaliza o vínculo
+    vinculo = VINCULO_MAP.get(vinculo_raw)
+    if not vinculo:
+        return None, f"Vínculo inválido: '{vinculo_raw}' para o usuário '{nome}'"
+
+    # Tenta encontrar o departamento no mapeamento; senão verifica se já é uma sigla válida
+    departamento = DEPARTAMENTO_MAP.get(departamento_raw)
+    if not departamento and departamento_raw in DEPARTAMENTOS_VALIDOS:
+        departamento = departamento_raw
+
+    if not departamento:
+        return None, f"Departamento não mapeado: '{departamento_raw}' para o usuário '{nome}'"
+
+    dados = {
+        'matricula': matricula,
+        'nome': nome,
+        'vinculo': vinculo,
+        'departamento': departamento,
+    }
+    dados['import_hash'] = hash_linha(dados)
+    return dados, None
+
+
+def hash_linha(dados: dict) -> str:
+    """Hash dos campos normalizados de uma linha."""
+    conteudo = '\x1f'.join((dados['matricula'], dados['nome'], dados['vinculo'], dados['departamento']))
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+
+def _em_blocos(linhas: Iterable[list], tamanho: int) -> Iterator[List[list]]:
+    linhas = iter(linhas)
+    while True:
+        bloco = list(islice(linhas, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+# === Importação ===
+
+def importar_usuarios(linhas: Iterable[list], lote: int = 500, desativar_ausentes: bool = False,
+                      api=None, aviso: Optional[Callable[[str], None]] = None,
+                      max_ignorados: Optional[float] = None) -> ResultadoImportacao:
+    """
+    Importa as linhas da planilha para UniFiUser.
+
+    Args:
+        linhas: Linhas da planilha (ver ler_linhas)
+        lote (int): Linhas por bloco de consulta/gravação
+        desativar_ausentes (bool): Desativa os servidores com matrícula que
+            não estão na lista e remove os MACs deles da whitelist
+        api (UniFiControllerAPI, optional): API usada na escrita da whitelist
+        aviso: Função chamada com o motivo de cada linha ignorada
+        max_ignorados (float, optional): Fração máxima de linhas ignoradas
+            para ainda desativar ausentes (padrão: IMPORTACAO_MAX_IGNORADOS)
+
+    Returns:
+        ResultadoImportacao
+    """
+    inicio = time.monotonic()
+    if max_ignorados is None:
+        max_ignorados = getattr(settings, 'IMPORTACAO_MAX_IGNORADOS', 0.05)
+    resultado = ResultadoImportacao()
+    ssid = settings.UNIFI_SSID
+    cursor = ultimo_id()
+    vistos = set()
+    reativados = []
+    macs_adicionar = set()
+    macs_remover = set()
+
+    with transaction.atomic():
+        for bloco in _em_blocos(linhas, lote):
+            # Dados por matrícula; se a matrícula se repetir, vale a última linha
+            registros = {}
+            for linha in bloco:
+                resultado.linhas += 1
+                dados, motivo = normalizar_linha(linha)
+                if dados is None:
+                    resultado.ignorados += 1
+                    if aviso:
+                        aviso(motivo)
+                    # O servidor está na planilha: não pode ser tratado como ausente
+                    matricula = normalizar_matricula(linha[0]) if linha else ''
+                    if matricula:
+                        vistos.add(matricula)
+                    continue
+                registros[dados['matricula']] = dados
+            vistos.update(registros)
+
+            # Usuários já cadastrados, em uma única consulta por bloco
+            existentes = {}
+            for user_id, matricula, import_hash, ativo in (
+                UniFiUser.objects.filter(matricula__in=list(registros))
+                .order_by('id')
+                .values_list('id', 'matricula', 'import_hash', 'ativo')
+            ):
+                existentes.setdefault(matricula, (user_id, import_hash, ativo))
+
+            novos = []
+            alterados = []
+            for matricula, dados in registros.items():
+                atual = existentes.get(matricula)
+                if atual is None:
+                    novos.append(UniFiUser(ativo=True, **dados))
+                    continue
+                user_id, import_hash, ativo = atual
+                if import_hash == dados['import_hash'] and ativo:
+                    resultado.inalterados += 1
+                    continue
+                alterados.append(UniFiUser(id=user_id, ativo=True, **dados))
+                if not ativo:
+                    reativados.append(user_id)
+
+            UniFiUser.objects.bulk_create(novos, batch_size=lote)
+            UniFiUser.objects.bulk_update(alterados, CAMPOS_ATUALIZAVEIS, batch_size=lote)
+            resultado.criados += len(novos)
+            resultado.atualizados += len(alterados)
+
+        if reativados:
+            resultado.reativados = len(reativados)
+            macs_adicionar = set(
+                Dispositivo.objects.filter(usuario_id__in=reativados).values_list('mac_address', flat=True)
+            )
+
+        if desativar_ausentes:
+            if resultado.ignorados > max_ignorados * resultado.linhas:
+                resultado.desativacao_recusada = True
+                logger.warning(
+                    f'Importação com {resultado.ignorados} de {resultado.linhas} linhas ignoradas '
+                    f'(limite {max_ignorados:.0%}): nenhum servidor foi desativado'
+                )
+            elif vistos:
+                ausentes = [
+                    user_id for user_id, matricula in UniFiUser.objects.filter(
+                        ativo=True, matricula__isnull=False
+                    ).exclude(matricula='').values_list('id', 'matricula').iterator()
+                    if matricula not in vistos
+                ]
+                for pos in range(0, len(ausentes), lote):
+                    ids = ausentes[pos:pos + lote]
+                    UniFiUser.objects.filter(id__in=ids).update(ativo=False)
+                    macs_remover.update(
+                        Dispositivo.objects.filter(usuario_id__in=ids).values_list('mac_address', flat=True)
+                    )
+                resultado.desativados = len(ausentes)
+            else:
+                logger.warning('Importação sem linhas válidas: nenhum servidor foi desativado')
+
+        enfileirar_em_lote(ssid, adicionar=macs_adicionar, remover=macs_remover, adiamento=ADIAMENTO_EM_LOTE)
+
+    # Uma única escrita na whitelist para todos os servidores desativados/reativados
+    if macs_adicionar or macs_remover:
+        resultado.whitelist_aplicada = aplicar_enfileirados(
+            ssid, cursor, adicionar=macs_adicionar, remover=macs_remover, api=api
+        )
+    resultado.macs_adicionados = len(macs_adicionar)
+    resultado.macs_removidos = len(macs_remover)
+    resultado.duracao = time.monotonic() - inicio
+    return resultado
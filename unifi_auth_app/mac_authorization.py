@@ -0,0 +1,156 @@
+"""
+Conjunto em memória dos endereços MAC autorizados na rede.
+
+Usado pelo serviço residente de autorização do FreeRADIUS
+(comando radius_auth_server), que responde às consultas sem tocar no banco.
+O conjunto é carregado uma vez e atualizado incrementalmente a partir da
+fila WhitelistOutbox, com recargas completas periódicas para cobrir
+alterações que não passam pela fila.
+"""
+import logging
+import threading
+import time
+from itertools import chain
+from typing import Iterable, List, Optional, Set
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .mac_index import AuthorizedMacIndex, MacIndex
+from .mac_utils import LoteDeMacs, normalizar_macs
+from .models import Dispositivo, Visitante, VisitanteDispositivo, WhitelistOutbox
+
+logger = logging.getLogger('unifi_auth_app')
+
+
+def macs_dispositivos_autorizados():
+    """MACs dos dispositivos de servidores ativos, autorizados a acessar a rede."""
+    return Dispositivo.objects.filter(usuario__ativo=True).values_list('mac_address', flat=True)
+
+
+def macs_visitantes_autorizados():
+    """MACs dos dispositivos de visitantes atualmente ativos."""
+    return VisitanteDispositivo.objects.filter(
+        visitante_dispositivo_ativo=True
+    ).values_list('visitante_mac_address', flat=True)
+
+
+def macs_visitantes_portal_autorizados():
+    """MACs informados no portal (Visitante.mac_address) por visitantes autorizados e dentro do prazo."""
+    return Visitante.objects.filter(
+        Q(autorizado_ate__isnull=True) | Q(autorizado_ate__gt=timezone.now()),
+        autorizado=True,
+        mac_address__gt='',
+    ).values_list('mac_address', flat=True)
+
+
+def macs_visitantes_todos_autorizados(macs: Optional[Set[str]] = None) -> Iterable[str]:
+    """
+    MACs de visitantes autorizados: dispositivos ativos e MACs informados no portal.
+
+    Com `macs` (normalizados), apenas esses são consultados. O MAC do portal é
+    gravado como veio do cliente, então a forma em minúsculas também é buscada.
+    """
+    dispositivos, portal = macs_visitantes_autorizados(), macs_visitantes_portal_autorizados()
+    if macs is not None:
+        dispositivos = dispositivos.filter(visitante_mac_address__in=macs)
+        portal = portal.filter(mac_address__in=macs | {mac.lower() for mac in macs})
+    return chain(dispositivos.iterator(), portal.iterator())
+
+
+class AuthorizedMacSet(AuthorizedMacIndex):
+    """
+    MACs autorizados, separados entre servidores e visitantes (dispositivos e portal).
+
+    As consultas usam os índices de inteiros de 48 bits (O(1)). A recarga
+    completa monta índices novos e os substitui de uma vez; a atualização
+    incremental altera apenas os MACs afetados.
+
+    A atualização relê as últimas `janela_ids` alterações da fila além do
+    cursor: os ids são atribuídos na inserção, mas as transações podem fazer
+    commit fora de ordem, e uma alteração com id menor que o cursor ainda
+    pode aparecer. Os ids já aplicados dentro da janela são lembrados para
+    não reavaliar os mesmos MACs a cada leitura.
+    """
+
+    def __init__(self, janela_ids: int = 1000):
+        super().__init__()
+        self.carregado_em: Optional[float] = None
+        self.janela_ids = janela_ids
+        self._cursor_outbox = 0
+        self._aplicados: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def carregar(self) -> None:
+        """Recarrega todos os MACs autorizados a partir do banco."""
+        with self._lock:
+            # O cursor é lido antes dos MACs para não perder alterações concorrentes
+            cursor = WhitelistOutbox.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            staff = MacIndex(_inteiros(macs_dispositivos_autorizados().iterator()))
+            visitantes = MacIndex(_inteiros(macs_visitantes_todos_autorizados()))
+            self.staff, self.visitantes = staff, visitantes
+            self._cursor_outbox = cursor
+            # A janela antes do cursor é relida uma vez: alterações ainda sem commit na carga
+            self._aplicados = set()
+            self.carregado_em = time.time()
+        logger.info(f"MACs autorizados carregados: {len(staff)} de servidores, {len(visitantes)} de visitantes")
+
+    def atualizar(self) -> int:
+        """
+        Aplica as alterações registradas na WhitelistOutbox desde a última leitura.
+
+        Apenas os MACs alterados são consultados novamente no banco, incluindo
+        os de alterações que fizeram commit depois de outras com id maior.
+
+        Returns:
+            int: Quantidade de MACs reavaliados
+        """
+        with self._lock:
+            inicio_janela = max(self._cursor_outbox - self.janela_ids, 0)
+            alteracoes = [
+                (alteracao_id, mac) for alteracao_id, mac in
+                WhitelistOutbox.objects.filter(id__gt=inicio_janela)
+                .order_by('id')
+                .values_list('id', 'mac_address')
+                if alteracao_id not in self._aplicados
+            ]
+            if not alteracoes:
+                return 0
+
+            macs = set(_normalizar(mac for _, mac in alteracoes))
+            staff_ativos = set(_normalizar(
+                macs_dispositivos_autorizados().filter(mac_address__in=macs)
+            ))
+            visitantes_ativos = set(_normalizar(macs_visitantes_todos_autorizados(macs)))
+
+            for indice, ativos in ((self.staff, staff_ativos), (self.visitantes, visitantes_ativos)):
+                indice.difference_update(macs - ativos)
+                indice.update(ativos)
+
+            self._cursor_outbox = max(self._cursor_outbox, alteracoes[-1][0])
+            inicio_janela = self._cursor_outbox - self.janela_ids
+            self._aplicados = {
+                alteracao_id for alteracao_id in self._aplicados if alteracao_id > inicio_janela
+            }
+            self._aplicados.update(alteracao_id for alteracao_id, _ in alteracoes if alteracao_id > inicio_janela)
+            return len(macs)
+
+
+def _normalizar_lote(macs: Iterable[str]) -> LoteDeMacs:
+    """Normaliza os MACs em lote, registrando os inválidos."""
+    macs = list(macs)
+    lote = normalizar_macs(macs)
+    if any(lote.erros):
+        for mac, erro in zip(macs, lote.erros):
+            if erro is not None:
+                logger.warning(f"MAC inválido ignorado na carga de autorizações: {mac}")
+    return lote
+
+
+def _normalizar(macs: Iterable[str]) -> List[str]:
+    return [mac for mac in _normalizar_lote(macs).macs if mac is not None]
+
+
+def _inteiros(macs: Iterable[str]) -> List[int]:
+    lote = _normalizar_lote(macs)
+    return [valor for valor, erro in zip(lote.inteiros, lote.erros) if erro is None]
@@ -0,0 +1,205 @@
+"""
+Índice compacto de endereços MAC representados como inteiros de 48 bits.
+
+Comparar strings "XX:XX:XX:XX:XX:XX" custa caro em memória e em CPU quando
+há dezenas de milhares de MACs. Aqui os MACs são normalizados em lote com
+mac_utils e guardados como inteiros: um set para consultas O(1) e um
+array('Q') ordenado, gerado sob demanda, para busca binária O(log n) e para
+serialização em um arquivo que outros processos podem mapear com mmap.
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Union
+
+from .mac_utils import MacInvalido, mac_para_int, normalizar_macs
+
+MAGIC = b'MACIDX1\x00'
+# Cabeçalho: assinatura (8 bytes) + quantidade de MACs (uint64 little-endian)
+HEADER = struct.Struct('<8sQ')
+
+MacLike = Union[str, int]
+
+
+def _erro_de_validacao(mensagem: str):
+    # Importado aqui: o leitor do snapshot usa este módulo sem o Django configurado
+    from django.core.exceptions import ValidationError
+    return ValidationError(mensagem)
+
+
+def mac_to_int(value: MacLike) -> int:
+    """
+    Converte um MAC em inteiro de 48 bits.
+
+    Raises:
+        ValidationError: Se o MAC for inválido
+    """
+    try:
+        return mac_para_int(value)
+    except MacInvalido as e:
+        raise _erro_de_validacao(str(e))
+
+
+def macs_to_ints(values: Iterable[MacLike]) -> List[int]:
+    """
+    Converte vários MACs em inteiros de uma vez (mac_utils.normalizar_macs).
+
+    Raises:
+        ValidationError: Se algum MAC for inválido
+    """
+    inteiros, textos = [], []
+    for value in values:
+        (inteiros if isinstance(value, int) else textos).append(value)
+    if textos:
+        lote = normalizar_macs(textos)
+        if any(lote.erros):
+            raise _erro_de_validacao(next(erro for erro in lote.erros if erro))
+        inteiros.extend(lote.inteiros)
+    return inteiros
+
+
+def int_to_mac(value: int) -> str:
+    """Converte um inteiro de 48 bits no formato XX:XX:XX:XX:XX:XX"""
+    hexa = f'{value:012X}'
+    return ':'.join(hexa[i:i+2] for i in range(0, 12, 2))
+
+
+def _verificar_ordem_de_bytes():
+    # Os dados são lidos diretamente do mmap como uint64 nativos
+    if sys.byteorder != 'little':
+        raise RuntimeError('Arquivos de índice de MACs exigem uma plataforma little-endian')
+
+
+def gravar_atomicamente(path: str, escrever, prefixo: str = '.tmp-') -> None:
+    """
+    Grava um arquivo de forma atômica: `escrever(arquivo)` preenche um arquivo
+    temporário no mesmo diretório, que depois substitui `path` com os.replace.
+    Leitores nunca veem um arquivo pela metade.
+    """
+    diretorio = os.path.dirname(os.path.abspath(path))
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=prefixo)
+    try:
+        with os.fdopen(fd, 'wb') as arquivo:
+            escrever(arquivo)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, path)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+class MacIndex:
+    """Conjunto de MACs como inteiros, com consulta O(1) e exportação ordenada."""
+
+    def __init__(self, macs: Iterable[MacLike] = ()):
+        self._macs = set(macs_to_ints(macs))
+        self._ordenado = None
+
+    @classmethod
+    def from_queryset(cls, queryset) -> 'MacIndex':
+        """Monta o índice a partir de um values_list(..., flat=True) de MACs."""
+        return cls(queryset.iterator())
+
+    def __contains__(self, mac: MacLike) -> bool:
+        return mac_to_int(mac) in self._macs
+
+    def __len__(self):
+        return len(self._macs)
+
+    def __iter__(self):
+        return iter(self.to_array())
+
+    def add(self, mac: MacLike) -> None:
+        self._macs.add(mac_to_int(mac))
+        self._ordenado = None
+
+    def discard(self, mac: MacLike) -> None:
+        self._macs.discard(mac_to_int(mac))
+        self._ordenado = None
+
+    def update(self, macs: Iterable[MacLike]) -> None:
+        self._macs.update(macs_to_ints(macs))
+        self._ordenado = None
+
+    def difference_update(self, macs: Iterable[MacLike]) -> None:
+        self._macs.difference_update(macs_to_ints(macs))
+        self._ordenado = None
+
+    def to_array(self) -> array:
+        """MACs em um array('Q') ordenado (recalculado apenas após alterações)."""
+        if self._ordenado is None:
+            self._ordenado = array('Q', sorted(self._macs))
+        return self._ordenado
+
+    def save(self, path: str) -> None:
+        """
+        Grava o índice em `path` de forma atômica (arquivo temporário + rename).
+
+        Formato: cabeçalho HEADER seguido dos MACs como uint64 little-endian
+        em ordem crescente.
+        """
+        _verificar_ordem_de_bytes()
+        dados = self.to_array()
+
+        def escrever(arquivo):
+            arquivo.write(HEADER.pack(MAGIC, len(dados)))
+            dados.tofile(arquivo)
+
+        gravar_atomicamente(path, escrever, prefixo='.macidx-')
+
+    @staticmethod
+    def load(path: str) -> 'MappedMacIndex':
+        """Abre um índice gravado com save() via mmap, sem copiar os dados."""
+        return MappedMacIndex(path)
+
+
+class MappedMacIndex:
+    """Leitura de um índice gravado por MacIndex.save(), com busca binária sobre o mmap."""
+
+    def __init__(self, path: str):
+        _verificar_ordem_de_bytes()
+        with open(path, 'rb') as arquivo:
+            self._mmap = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        assinatura, quantidade = HEADER.unpack_from(self._mmap, 0)
+        if assinatura != MAGIC:
+            self._mmap.close()
+            raise ValueError(f'Arquivo de índice de MACs inválido: {path}')
+        self._macs = memoryview(self._mmap)[HEADER.size:HEADER.size + quantidade * 8].cast('Q')
+
+    def __contains__(self, mac: MacLike) -> bool:
+        valor = mac_to_int(mac)
+        posicao = bisect_left(self._macs, valor)
+        return posicao < len(self._macs) and self._macs[posicao] == valor
+
+    def __len__(self):
+        return len(self._macs)
+
+    def close(self) -> None:
+        self._macs.release()
+        self._mmap.close()
+
+
+class AuthorizedMacIndex:
+    """Tabelas separadas de MACs autorizados: dispositivos de servidores e de visitantes."""
+
+    def __init__(self, staff: MacIndex = None, visitantes: MacIndex = None):
+        self.staff = staff if staff is not None else MacIndex()
+        self.visitantes = visitantes if visitantes is not None else MacIndex()
+
+    def __len__(self):
+        return len(self.staff) + len(self.visitantes)
+
+    def consultar(self, mac: MacLike):
+        """Retorna 'staff', 'visitante' ou None."""
+        valor = mac_to_int(mac)
+        if valor in self.staff:
+            return 'staff'
+        if valor in self.visitantes:
+            return 'visitante'
+        return None
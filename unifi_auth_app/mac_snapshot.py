@@ -0,0 +1,245 @@
+"""
+Snapshot em arquivo dos MACs autorizados, compartilhado entre processos via mmap.
+
+O comando export_mac_snapshot grava um arquivo binário versionado e ordenado
+com os MACs de Dispositivo e de VisitanteDispositivo ativos. Os scripts do
+FreeRADIUS mapeiam o arquivo com mmap e fazem busca binária diretamente sobre
+ele: uma única cópia dos dados no page cache, sem consultas ao banco. Como o
+arquivo pode estar atrasado em relação ao banco, apenas os acertos são
+definitivos; um MAC ausente, ou um snapshot mais antigo que
+MAC_SNAPSHOT_MAX_AGE, é consultado no serviço residente e no banco.
+
+Formato (little-endian):
+    cabeçalho HEADER: assinatura, geração, quantidade, gerado_em (epoch)
+    macs       uint64[n]  ordenados
+    donos      uint64[n]  id do UniFiUser ou do Visitante
+    expiracoes int64[n]   epoch em segundos, 0 = sem expiração
+    tipos      uint8[n]   TIPO_STAFF ou TIPO_VISITANTE
+
+O arquivo é substituído por rename atômico; os leitores verificam o inode
+periodicamente e reabrem o arquivo quando a geração muda.
+
+Este módulo não depende do Django para leitura, para que os scripts do
+FreeRADIUS possam usá-lo sem django.setup().
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import islice
+from typing import Optional, Tuple
+
+from .mac_index import MacLike, _verificar_ordem_de_bytes, gravar_atomicamente
+from .mac_utils import mac_para_int, normalizar_macs
+
+MAGIC = b'MACSNP1\x00'
+# Cabeçalho: assinatura + geração (uint64) + quantidade (uint64) + gerado_em (double)
+HEADER = struct.Struct('<8sQQd')
+
+TIPO_STAFF = 1
+TIPO_VISITANTE = 2
+TIPOS = {TIPO_STAFF: 'staff', TIPO_VISITANTE: 'visitante'}
+
+MacSnapshotEntry = namedtuple('MacSnapshotEntry', ['mac', 'tipo', 'dono_id', 'expira_em'])
+
+
+def ler_geracao(path: str) -> int:
+    """Geração do snapshot gravado em `path`, ou 0 se não existir ou for inválido."""
+    try:
+        with open(path, 'rb') as arquivo:
+            assinatura, geracao, _, _ = HEADER.unpack(arquivo.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return geracao if assinatura == MAGIC else 0
+
+
+def gravar_snapshot(path: str, registros) -> Tuple[int, int]:
+    """
+    Grava o snapshot em `path` de forma atômica.
+
+    Args:
+        path (str): Caminho do arquivo
+        registros: Iterável de (mac, tipo, dono_id, expira_em). Se o mesmo MAC
+            aparecer mais de uma vez, prevalece o de menor tipo (servidores)
+
+    Returns:
+        tuple: (geração gravada, quantidade de MACs)
+    """
+    _verificar_ordem_de_bytes()
+    por_mac = {}
+    for mac, tipo, dono_id, expira_em in registros:
+        valor = mac_para_int(mac)
+        atual = por_mac.get(valor)
+        if atual is None or tipo < atual[0]:
+            por_mac[valor] = (tipo, dono_id or 0, int(expira_em or 0))
+
+    macs = array('Q', sorted(por_mac))
+    donos = array('Q', (por_mac[mac][1] for mac in macs))
+    expiracoes = array('q', (por_mac[mac][2] for mac in macs))
+    tipos = array('B', (por_mac[mac][0] for mac in macs))
+    geracao = ler_geracao(path) + 1
+
+    def escrever(arquivo):
+        arquivo.write(HEADER.pack(MAGIC, geracao, len(macs), time.time()))
+        for coluna in (macs, donos, expiracoes, tipos):
+            coluna.tofile(arquivo)
+
+    gravar_atomicamente(path, escrever, prefixo='.macsnap-')
+    return geracao, len(macs)
+
+
+def exportar_snapshot(path: str) -> Tuple[int, int]:
+    """Lê os MACs autorizados do banco e grava o snapshot em `path`."""
+    from .mac_authorization import macs_dispositivos_autorizados, macs_visitantes_autorizados
+
+    def registros():
+        for mac, dono_id in macs_dispositivos_autorizados().values_list(
+            'mac_address', 'usuario_id'
+        ).iterator():
+            yield mac, TIPO_STAFF, dono_id, 0
+        for mac, dono_id, expira_dispositivo, expira_visitante in macs_visitantes_autorizados().values_list(
+            'visitante_mac_address', 'visitante_id', 'visitante_autorizado_ate', 'visitante__autorizado_ate'
+        ).iterator():
+            # Vale a expiração mais próxima entre a do dispositivo e a do visitante
+            expiracoes = [e.timestamp() for e in (expira_dispositivo, expira_visitante) if e]
+            yield mac, TIPO_VISITANTE, dono_id, min(expiracoes) if expiracoes else 0
+
+    return gravar_snapshot(path, _validos(registros()))
+
+
+def _validos(registros, tamanho_lote: int = 10000):
+    """Registros com o MAC já convertido em inteiro, descartando MACs inválidos."""
+    registros = iter(registros)
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            return
+        normalizados = normalizar_macs(registro[0] for registro in lote)
+        for registro, valor, erro in zip(lote, normalizados.inteiros, normalizados.erros):
+            if erro is None:
+                yield (valor,) + tuple(registro[1:])
+
+
+class _Mapeamento:
+    """Uma geração do arquivo mapeada em memória."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as arquivo:
+            info = os.fstat(arquivo.fileno())
+            self.mmap = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identidade = (info.st_dev, info.st_ino)
+        assinatura, self.geracao, n, self.gerado_em = HEADER.unpack_from(self.mmap, 0)
+        if assinatura != MAGIC:
+            self.mmap.close()
+            raise ValueError(f'Arquivo de snapshot de MACs inválido: {path}')
+
+        dados = memoryview(self.mmap)
+        inicio = HEADER.size
+        self.macs = dados[inicio:inicio + 8 * n].cast('Q')
+        self.donos = dados[inicio + 8 * n:inicio + 16 * n].cast('Q')
+        self.expiracoes = dados[inicio + 16 * n:inicio + 24 * n].cast('q')
+        self.tipos = dados[inicio + 24 * n:inicio + 25 * n]
+
+    def buscar(self, valor: int) -> Optional[int]:
+        posicao = bisect_left(self.macs, valor)
+        if posicao < len(self.macs) and self.macs[posicao] == valor:
+            return posicao
+        return None
+
+    def close(self):
+        for visao in (self.macs, self.donos, self.expiracoes, self.tipos):
+            visao.release()
+        self.mmap.close()
+
+
+class MacSnapshotReader:
+    """
+    Leitor do snapshot de MACs autorizados.
+
+    A cada `verificar_a_cada` segundos (no máximo) confere se o arquivo foi
+    substituído e, se a geração mudou, passa a usar o novo mapeamento. O
+    mapeamento antigo é liberado quando não houver mais consultas usando-o.
+    """
+
+    def __init__(self, path: str, verificar_a_cada: float = 1.0):
+        _verificar_ordem_de_bytes()
+        self.path = path
+        self.verificar_a_cada = verificar_a_cada
+        self._mapa = _Mapeamento(path)
+        self._verificado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def geracao(self) -> int:
+        return self._mapa.geracao
+
+    @property
+    def gerado_em(self) -> float:
+        return self._mapa.gerado_em
+
+    def idade(self) -> float:
+        """Segundos desde a gravação da geração em uso (recarregando-a antes, se preciso)."""
+        self.recarregar_se_necessario()
+        return time.time() - self._mapa.gerado_em
+
+    def __len__(self):
+        return len(self._mapa.macs)
+
+    def __contains__(self, mac: MacLike) -> bool:
+        return self.consultar(mac) is not None
+
+    def recarregar_se_necessario(self) -> bool:
+        """Reabre o arquivo se ele foi substituído. Retorna True se a geração mudou."""
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.verificar_a_cada:
+            return False
+        with self._lock:
+            self._verificado_em = agora
+            try:
+                info = os.stat(self.path)
+            except OSError:
+                # Mantém a última geração válida se o arquivo sumir
+                return False
+            if (info.st_dev, info.st_ino) == self._mapa.identidade:
+                return False
+            novo = _Mapeamento(self.path)
+            if novo.geracao == self._mapa.geracao:
+                self._mapa.identidade = novo.identidade
+                novo.close()
+                return False
+            self._mapa = novo
+            return True
+
+    def consultar(self, mac: MacLike) -> Optional[MacSnapshotEntry]:
+        """
+        Procura o MAC no snapshot.
+
+        Returns:
+            MacSnapshotEntry ou None se o MAC não estiver autorizado (ausente ou expirado)
+
+        Raises:
+            ValueError: Se o MAC for inválido
+        """
+        valor = mac_para_int(mac)
+        self.recarregar_se_necessario()
+        mapa = self._mapa
+        posicao = mapa.buscar(valor)
+        if posicao is None:
+            return None
+        expira_em = mapa.expiracoes[posicao]
+        if expira_em and expira_em < time.time():
+            return None
+        return MacSnapshotEntry(
+            mac=valor,
+            tipo=TIPOS.get(mapa.tipos[posicao]),
+            dono_id=mapa.donos[posicao],
+            expira_em=expira_em or None,
+        )
+
+    def close(self) -> None:
+        self._mapa.close()
+
@@ -0,0 +1,142 @@
+"""
+Normalização e validação de endereços MAC, individual e em lote.
+
+O formato canônico é XX:XX:XX:XX:XX:XX em maiúsculas; o valor numérico é o
+inteiro de 48 bits usado pelos índices (mac_index, mac_snapshot).
+
+O caminho rápido cobre os formatos que chegam na prática (com dois-pontos,
+hífens, pontos ou sem separadores): remove os separadores com str.replace /
+str.translate e valida e converte os 12 dígitos de uma vez com
+bytes.fromhex, em C. Qualquer outra entrada passa pela validação completa,
+que gera as mesmas mensagens de erro de sempre.
+
+Este módulo não depende do Django, para que os scripts do FreeRADIUS e o
+leitor do snapshot possam usá-lo sem django.setup(). Os erros são
+MacInvalido (subclasse de ValueError); models.format_mac_address os converte
+em ValidationError.
+"""
+from array import array
+from collections import namedtuple
+from typing import Iterable, List
+
+HEX_DIGITS = frozenset('0123456789ABCDEFabcdef')
+_SEPARADORES = str.maketrans('', '', ':-. ')
+
+# Resultado de normalizar_macs, na mesma ordem da entrada:
+#   macs      MACs no formato canônico (None onde a entrada é inválida)
+#   inteiros  array('Q') com os MACs como inteiros de 48 bits (0 onde inválida)
+#   erros     mensagem de erro de cada item, ou None se válido (máscara de erros)
+LoteDeMacs = namedtuple('LoteDeMacs', ['macs', 'inteiros', 'erros'])
+
+
+class MacInvalido(ValueError):
+    """MAC com caracteres inválidos ou quantidade errada de dígitos."""
+
+
+def _digitos(value: str):
+    """Tenta o caminho rápido: os 6 bytes do MAC, ou None se precisar da validação completa."""
+    limpo = value.replace(':', '').replace('-', '')
+    if len(limpo) != 12:
+        limpo = limpo.translate(_SEPARADORES)
+        if len(limpo) != 12:
+            return None
+    try:
+        digitos = bytes.fromhex(limpo)
+    except ValueError:
+        return None
+    # fromhex ignora espaços entre os pares: menos de 6 bytes indica espaço no meio
+    return digitos if len(digitos) == 6 else None
+
+
+def _validar(value: str) -> bytes:
+    """Validação completa, caractere a caractere, com as mensagens de erro detalhadas."""
+    clean_mac = ''.join(c for c in value if c.isalnum())
+
+    invalid_chars = set(clean_mac) - HEX_DIGITS
+    if invalid_chars:
+        chars_list = ', '.join(sorted(invalid_chars))
+        raise MacInvalido(
+            f'MAC address contém caracteres inválidos: {chars_list}. '
+            'Use apenas números (0-9) e letras de A até F'
+        )
+
+    if len(clean_mac) != 12:
+        raise MacInvalido(
+            f'MAC address deve ter 12 caracteres hexadecimais, mas tem {len(clean_mac)}. '
+            'Formato esperado: XX:XX:XX:XX:XX:XX'
+        )
+
+    return bytes.fromhex(clean_mac)
+
+
+def normalizar_mac(value: str) -> str:
+    """
+    Converte o MAC para o formato XX:XX:XX:XX:XX:XX em maiúsculas.
+
+    Raises:
+        MacInvalido: Se o MAC for inválido
+    """
+    digitos = _digitos(value) if isinstance(value, str) else None
+    if digitos is None:
+        digitos = _validar(value)
+    return digitos.hex(':').upper()
+
+
+def mac_para_int(value) -> int:
+    """
+    Converte o MAC em inteiro de 48 bits (inteiros são devolvidos como estão).
+
+    Raises:
+        MacInvalido: Se o MAC for inválido
+    """
+    if isinstance(value, int):
+        return value
+    digitos = _digitos(value) if isinstance(value, str) else None
+    if digitos is None:
+        digitos = _validar(value)
+    return int.from_bytes(digitos, 'big')
+
+
+def normalizar_macs(valores: Iterable[str]) -> LoteDeMacs:
+    """
+    Normaliza e valida vários MACs de uma vez.
+
+    Entradas inválidas não interrompem o lote: ficam marcadas em `erros`,
+    com None em `macs` e 0 em `inteiros`.
+    """
+    macs: List = []
+    inteiros = array('Q')
+    erros: List = []
+    # Referências locais: o laço roda dezenas de milhares de vezes
+    adicionar_mac, adicionar_inteiro, adicionar_erro = macs.append, inteiros.append, erros.append
+    de_bytes, de_hex, separadores = int.from_bytes, bytes.fromhex, _SEPARADORES
+
+    for valor in valores:
+        # Mesmo caminho rápido de _digitos, repetido aqui para evitar uma chamada por item
+        digitos = None
+        if isinstance(valor, str):
+            limpo = valor.replace(':', '').replace('-', '')
+            if len(limpo) != 12:
+                limpo = limpo.translate(separadores)
+            if len(limpo) == 12:
+                try:
+                    digitos = de_hex(limpo)
+                except ValueError:
+                    pass
+                else:
+                    if len(digitos) != 6:
+                        digitos = None
+
+        if digitos is None:
+            try:
+                digitos = _validar(valor)
+            except MacInvalido as e:
+                adicionar_mac(None)
+                adicionar_inteiro(0)
+                adicionar_erro(str(e))
+                continue
+        adicionar_mac(digitos.hex(':').upper())
+        adicionar_inteiro(de_bytes(digitos, 'big'))
+        adicionar_erro(None)
+
+    return LoteDeMacs(macs, inteiros, erros)
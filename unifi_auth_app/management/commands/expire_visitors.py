@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from unifi_auth_app.visitante_expiracao import expirar_autorizacoes
+
+
+class Command(BaseCommand):
+    help = 'Revoga as autorizações vencidas de visitantes e remove os MACs da whitelist do UniFi'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Continua em execução, fazendo uma varredura a cada --intervalo segundos'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=60.0,
+            help='Segundos entre varreduras no modo --loop (padrão: 60)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Quantidade máxima de visitantes expirados por transação (padrão: 500)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self._varrer(options['lote'])
+            return
+
+        self.stdout.write(self.style.SUCCESS('Expiração de visitantes iniciada'))
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    self._varrer(options['lote'])
+                except Exception as e:
+                    self.stderr.write(f"Erro ao expirar visitantes: {str(e)}")
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Expiração de visitantes encerrada')
+
+    def _varrer(self, lote):
+        inicio = time.monotonic()
+        visitantes, dispositivos, macs = expirar_autorizacoes(lote=lote)
+        if visitantes or dispositivos:
+            self.stdout.write(
+                f"{visitantes} visitantes e {dispositivos} dispositivos expirados, "
+                f"{macs} MACs removidos da whitelist em {time.monotonic() - inicio:.3f}s"
+            )
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from unifi_auth_app.query_plans import CONSULTAS_QUENTES, auditar, resumir_plano
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa EXPLAIN nas consultas mais frequentes do portal e falha se alguma '
+        'fizer varredura completa de tabela ou índice'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apenas',
+            nargs='+',
+            choices=[consulta.nome for consulta in CONSULTAS_QUENTES],
+            help='Consultas a verificar (padrão: todas)'
+        )
+        parser.add_argument(
+            '--plano',
+            action='store_true',
+            help='Mostra o plano completo de cada consulta'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resultados = auditar(options['apenas'])
+        except NotImplementedError as e:
+            raise CommandError(str(e))
+
+        falhas = []
+        for resultado in resultados:
+            nome = resultado.consulta.nome
+            if resultado.problemas:
+                falhas.append(nome)
+                self.stdout.write(self.style.ERROR(f"FALHA {nome}: {', '.join(resultado.problemas)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK    {nome}: {resumir_plano(resultado.plano)}"))
+            if options['plano']:
+                self.stdout.write(f"      {resultado.consulta.descricao}")
+                for linha in resultado.plano:
+                    self.stdout.write(f"      {json.dumps(linha, default=str, ensure_ascii=False)}")
+
+        if falhas:
+            raise CommandError(f"{len(falhas)} consulta(s) com varredura completa: {', '.join(falhas)}")
+        self.stdout.write(f"{len(resultados)} consultas verificadas, nenhuma varredura completa")
@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from unifi_auth_app.mac_snapshot import exportar_snapshot
+from unifi_auth_app.models import WhitelistOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta os MACs autorizados para o arquivo de snapshot lido via mmap '
+        'pelos workers do gunicorn e pelos scripts do FreeRADIUS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--arquivo',
+            default=getattr(settings, 'MAC_SNAPSHOT_PATH', '/dev/shm/unifi_auth_macs.snap'),
+            help='Caminho do arquivo de snapshot (padrão: MAC_SNAPSHOT_PATH)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Continua em execução, exportando novamente a cada alteração na whitelist'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=1.0,
+            help='Segundos entre verificações de alterações no modo --loop (padrão: 1)'
+        )
+        parser.add_argument(
+            '--recarga',
+            type=float,
+            default=60.0,
+            help='Segundos entre exportações completas mesmo sem alterações (padrão: 60)'
+        )
+
+    def handle(self, *args, **options):
+        arquivo = options['arquivo']
+        if not options['loop']:
+            self._exportar(arquivo)
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Exportando snapshot de MACs para {arquivo}'))
+        cursor = self._cursor_outbox()
+        self._exportar(arquivo)
+        ultima_exportacao = time.monotonic()
+        try:
+            while True:
+                time.sleep(options['intervalo'])
+                try:
+                    close_old_connections()
+                    # Alterações de dispositivos passam pela WhitelistOutbox
+                    novo_cursor = self._cursor_outbox()
+                    if novo_cursor != cursor or time.monotonic() - ultima_exportacao >= options['recarga']:
+                        self._exportar(arquivo)
+                        cursor = novo_cursor
+                        ultima_exportacao = time.monotonic()
+                except Exception as e:
+                    self.stderr.write(f"Erro ao exportar snapshot de MACs: {str(e)}")
+        except KeyboardInterrupt:
+            pass
+
+    def _cursor_outbox(self):
+        return WhitelistOutbox.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def _exportar(self, arquivo):
+        inicio = time.monotonic()
+        geracao, quantidade = exportar_snapshot(arquivo)
+        self.stdout.write(
+            f"Snapshot geração {geracao}: {quantidade} MACs em {time.monotonic() - inicio:.3f}s"
+        )
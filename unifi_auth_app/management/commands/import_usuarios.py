@@ -1,135 +1,73 @@
 import os
-import xlrd
-from django.core.management.base import BaseCommand
-from unifi_auth_app.models import UniFiUser, Departamento
 
-# Dicionário completo de mapeamento de departamentos
-DEPARTAMENTO_MAP = {
-    'ASSESSORIA DE COMUNICACAO': 'ASC',
-    'BIBLIOTECA LEGISLATIVA': 'MBL',
-    'CONTABILIDADE': 'CONT',
-    'CONTROLADORIA INTERNA': 'CNT',
-    'DEPART. DE POLICIA LEGISLATIVA': 'POL',
-    'DEPARTAMENTO DE COMPRAS': 'COM',
-    'DEPARTAMENTO DE MATERIAIS E SERVICOS': 'MTS',
-    'DEPARTAMENTO DE PLANEJAMENTO DE CONTRATACOES': 'PLN',
-    'DEPARTAMENTO DE RADIO E TV': 'RTV',
-    'DEPARTAMENTO DE TI': 'DTI',
-    'DIRETORIA ADMINISTRATIVA': 'DIA',
-    'DIRETORIA FINANCEIRA': 'DIF',
-    'DIRETORIA LEGISLATIVA': 'DIL',
-    'ESCOLA DO LEGISLATIVO': 'ILCM',
-    'ILCM - INSTITUTO LEGISLATIVO DA CAMARA MUNICIPAL DE PARAUAPE': 'ILCM',
-    'LICITACAO': 'LIC',
-    'PATRIMONIO': 'PAT',
-    'PRESIDENCIA': 'PRL',
-    'PROCURADORIA': 'PRO',
-    'RECURSOS HUMANOS': 'RH',
-    'SIC-SERVICO DE INFORMACAO AO CIDADAO': 'SIC',
+from django.core.management.base import BaseCommand, CommandError
 
-    'GAB. VER. ALEX OHANA': 'GAB8',
-    'GAB. VER. ANDERSON MARCOS MORATORIO': 'GAB16',
-    'GAB. VER. ELIAS FERREIRA DE ALMEIDA FILHO': 'GAB15',
-    'GAB. VER. ELVIS SILVA CRUZ': 'GAB10',
-    'GAB. VER. ERICA RIBEIRO': 'GAB17',
-    'GAB. VER. FRED SANCAO': 'GAB9',
-    'GAB. VER. FRANCISCO ELOECIO SILVA LIMA': 'GAB6',
-    'GAB. VER. GRACIELE BRITO': 'GAB13',
-    'GAB. VER. LAECIO DA ACT': 'GAB12',
-    'GAB. VER. LEONARDO DA SILVA MENDES': 'GAB11',
-    'GAB. VER. MAQUIVALDA': 'GAB2',
-    'GAB. VER. MICHEL CARTEIRO': 'GAB14',
-    'GAB. VER. SADISVAN': 'GAB5',
-    'GAB. VER. SARGENTO NOGUEIRA': 'GAB4',
-    'GAB. VER. TITO DO MST': 'GAB1',
-    'GAB. VER. ZE DA LATA': 'GAB7',
-    'GAB. VER. ELEOMARCIO ALMEIDA DE LIMA': 'GAB3'
-}
+from unifi_auth_app.importacao_usuarios import importar_usuarios, ler_linhas
 
 
 class Command(BaseCommand):
-    help = 'Importa usuários do arquivo usuarios.xls'
-
-    def handle(self, *args, **kwargs):
-        caminho_arquivo = '/opt/auth_project/imports/usuarios.xls'
+    help = 'Importa usuários de uma planilha CSV, XLSX ou XLS (padrão: usuarios.xls)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--arquivo',
+            default='/opt/auth_project/imports/usuarios.xls',
+            help='Caminho da planilha .csv, .xlsx ou .xls (padrão: /opt/auth_project/imports/usuarios.xls)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Quantidade de linhas por bloco de consulta/gravação (padrão: 500)'
+        )
+        parser.add_argument(
+            '--desativar-ausentes',
+            action='store_true',
+            help='Desativa os servidores que não estão na planilha e remove os MACs deles da whitelist'
+        )
+        parser.add_argument(
+            '--max-ignorados',
+            type=float,
+            help='Fração máxima de linhas ignoradas para ainda desativar ausentes (padrão: IMPORTACAO_MAX_IGNORADOS)'
+        )
+
+    def handle(self, *args, **options):
+        caminho_arquivo = options['arquivo']
 
         if not os.path.exists(caminho_arquivo):
             self.stderr.write(self.style.ERROR(f"Arquivo não encontrado: {caminho_arquivo}"))
             return
 
-        planilha = xlrd.open_workbook(caminho_arquivo)
-        pagina = planilha.sheet_by_index(0)
-
-        criados = 0
-        atualizados = 0
-        ignorados = 0
-
-        for row_idx in range(1, pagina.nrows):  # Ignora cabeçalho
-            linha = pagina.row_values(row_idx)
-
-            # Ordem correta das colunas: MATRICULA, NOME, SETOR_NOME, VINCULO_NOME
-            matricula = str(linha[0]).strip()
-            nome = str(linha[1]).strip().upper()
-            departamento_raw = str(linha[2]).strip().upper()
-            vinculo_raw = str(linha[3]).strip().upper()
-
-            # Normaliza o vínculo
-            if vinculo_raw in ['COMISSIONADOS', 'VEREADOR']:
-                vinculo = 'comissionado'
-            elif vinculo_raw == 'EFETIVOS':
-                vinculo = 'efetivo'
-            else:
-                self.stdout.write(self.style.WARNING(
-                    f"Vínculo inválido: '{vinculo_raw}' para o usuário '{nome}'"
-                ))
-                ignorados += 1
-                continue
-
-            # Tenta encontrar o departamento no mapeamento
-            departamento = DEPARTAMENTO_MAP.get(departamento_raw)
-
-            # Se não encontrou no mapeamento, verifica se já é uma sigla válida
-            if not departamento and departamento_raw in [choice[0] for choice in Departamento.choices]:
-                departamento = departamento_raw
-
-            if not departamento:
-                self.stdout.write(self.style.WARNING(
-                    f"Departamento não mapeado: '{departamento_raw}' para o usuário '{nome}'"
-                ))
-                ignorados += 1
-                continue
-
-            # Atualiza ou cria o usuário
-            try:
-                user, created = UniFiUser.objects.update_or_create(
-                    matricula=matricula,
-                    defaults={
-                        'nome': nome,
-                        'vinculo': vinculo,
-                        'departamento': departamento
-                    }
-                )
-
-                if created:
-                    criados += 1
-                    self.stdout.write(self.style.SUCCESS(
-                        f"Criado: {nome} ({matricula}) - {departamento}"
-                    ))
-                else:
-                    atualizados += 1
-                    self.stdout.write(self.style.SUCCESS(
-                        f"Atualizado: {nome} ({matricula}) - {departamento}"
-                    ))
-
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f"Erro ao processar usuário {nome} ({matricula}): {str(e)}"
-                ))
-                ignorados += 1
+        try:
+            linhas = ler_linhas(caminho_arquivo)
+            resultado = importar_usuarios(
+                linhas,
+                lote=options['lote'],
+                desativar_ausentes=options['desativar_ausentes'],
+                max_ignorados=options['max_ignorados'],
+                aviso=lambda motivo: self.stdout.write(self.style.WARNING(motivo)),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
 
         self.stdout.write(self.style.SUCCESS(
             f"\nImportação concluída:\n" \
-            f"Criados: {criados}\n" \
-            f"Atualizados: {atualizados}\n" \
-            f"Ignorados: {ignorados}"
+            f"Criados: {resultado.criados}\n" \
+            f"Atualizados: {resultado.atualizados}\n" \
+            f"Sem alteração: {resultado.inalterados}\n" \
+            f"Ignorados: {resultado.ignorados}\n" \
+            f"Reativados: {resultado.reativados}\n" \
+            f"Desativados: {resultado.desativados}\n" \
+            f"{resultado.linhas} linhas em {resultado.duracao:.2f}s ({resultado.linhas_por_segundo:.0f} linhas/s)"
         ))
+        if resultado.desativacao_recusada:
+            self.stdout.write(self.style.WARNING(
+                f"Nenhum servidor foi desativado: {resultado.ignorados} linhas ignoradas "
+                f"(ajuste a planilha ou use --max-ignorados)"
+            ))
+        if resultado.macs_adicionados or resultado.macs_removidos:
+            situacao = 'aplicadas' if resultado.whitelist_aplicada else 'enfileiradas para o worker da whitelist'
+            self.stdout.write(
+                f"Whitelist: {resultado.macs_adicionados} MACs a adicionar e "
+                f"{resultado.macs_removidos} a remover ({situacao})"
+            )
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from unifi_auth_app.audit_store import purgar_eventos
+
+
+class Command(BaseCommand):
+    help = 'Apaga os eventos de auditoria mais antigos que o período de retenção'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=None,
+            help='Dias de retenção (padrão: AUDIT_RETENTION_DAYS, 90)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=5000,
+            help='Quantidade máxima de eventos apagados por comando DELETE (padrão: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        dias = options['dias'] if options['dias'] is not None else getattr(settings, 'AUDIT_RETENTION_DAYS', 90)
+        inicio = time.monotonic()
+        total = purgar_eventos(dias=dias, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} eventos de auditoria com mais de {dias} dias apagados em {time.monotonic() - inicio:.2f}s"
+        ))
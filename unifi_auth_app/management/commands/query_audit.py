@@ -0,0 +1,93 @@
+import json
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from unifi_auth_app.audit_store import consultar_eventos
+
+
+def _data_hora(valor):
+    """Converte 'AAAA-MM-DD' ou 'AAAA-MM-DDTHH:MM[:SS]' no fuso local em datetime."""
+    try:
+        data_hora = datetime.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Data inválida: {valor}. Use AAAA-MM-DD ou AAAA-MM-DDTHH:MM")
+    if timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora)
+    return data_hora
+
+
+class Command(BaseCommand):
+    help = 'Consulta os eventos de auditoria das APIs por intervalo de tempo e IP, MAC ou caminho'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            help='Início do intervalo, AAAA-MM-DD ou AAAA-MM-DDTHH:MM (padrão: 24 horas atrás)'
+        )
+        parser.add_argument(
+            '--ate',
+            help='Fim do intervalo, exclusivo (padrão: agora)'
+        )
+        parser.add_argument('--ip', help='IP do cliente')
+        parser.add_argument('--mac', help='MAC do cliente')
+        parser.add_argument('--path', help="Caminho da API; termine com '*' para buscar por prefixo")
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=100,
+            help='Quantidade máxima de eventos (padrão: 100)'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Mostra um evento JSON por linha'
+        )
+
+    def handle(self, *args, **options):
+        ate = _data_hora(options['ate']) if options['ate'] else timezone.now()
+        desde = _data_hora(options['desde']) if options['desde'] else ate - timedelta(days=1)
+        if desde >= ate:
+            raise CommandError('--desde deve ser anterior a --ate')
+
+        try:
+            eventos = consultar_eventos(
+                desde, ate,
+                client_ip=options['ip'],
+                mac=options['mac'],
+                path=options['path'],
+                limite=options['limite'],
+            )
+            eventos = list(eventos)
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        for evento in eventos:
+            if options['json']:
+                self.stdout.write(json.dumps({
+                    'timestamp': evento.timestamp.isoformat(),
+                    'hostname': evento.hostname,
+                    'method': evento.method,
+                    'path': evento.path,
+                    'status_code': evento.status_code,
+                    'duration_ms': evento.duration_ms,
+                    'client_ip': evento.client_ip,
+                    'mac_address': evento.mac_address,
+                    'user': evento.usuario,
+                    'user_agent': evento.user_agent,
+                    **evento.detalhes,
+                }, default=str, ensure_ascii=False))
+            else:
+                self.stdout.write(
+                    f"{timezone.localtime(evento.timestamp):%d/%m/%Y %H:%M:%S} "
+                    f"{evento.client_ip or '-':<15} {evento.mac_address or '-':<17} "
+                    f"{evento.method:<6} {evento.path} {evento.status_code} {evento.duration_ms}ms"
+                )
+
+        if not options['json']:
+            self.stdout.write(
+                f"{len(eventos)} eventos entre {timezone.localtime(desde):%d/%m/%Y %H:%M} "
+                f"e {timezone.localtime(ate):%d/%m/%Y %H:%M}"
+            )
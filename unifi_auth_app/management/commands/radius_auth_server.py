@@ -0,0 +1,193 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from unifi_auth_app.mac_authorization import AuthorizedMacSet
+
+# Atributos em que o FreeRADIUS (rlm_rest) pode enviar o MAC do dispositivo
+MAC_FIELDS = ('mac', 'User-Name', 'Calling-Station-Id')
+
+
+class RadiusAuthHandler(BaseHTTPRequestHandler):
+    """
+    Responde às consultas de autorização do FreeRADIUS.
+
+    GET /authorize?mac=AA:BB:CC:DD:EE:FF ou POST /authorize (JSON ou form)
+      200 -> MAC autorizado (accept)
+      401 -> MAC não autorizado (reject)
+      400 -> MAC ausente ou inválido
+    GET /health -> estado do conjunto em memória
+    """
+    server_version = 'UniFiRadiusAuth/1.0'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            macs = self.server.macs
+            return self._responder(200, {
+                'staff': len(macs.staff),
+                'visitantes': len(macs.visitantes),
+                'carregado_em': macs.carregado_em,
+            })
+        if url.path == '/authorize':
+            return self._autorizar(parse_qs(url.query))
+        return self._responder(404, {'Reply-Message': 'Recurso não encontrado'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/authorize':
+            return self._responder(404, {'Reply-Message': 'Recurso não encontrado'})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            try:
+                dados = json.loads(body or '{}')
+            except json.JSONDecodeError:
+                return self._responder(400, {'Reply-Message': 'JSON inválido'})
+            # rlm_rest envia atributos como {"User-Name": {"type": ..., "value": [...]}}
+            params = {
+                chave: valor.get('value', []) if isinstance(valor, dict) else [valor]
+                for chave, valor in dados.items()
+            }
+        else:
+            params = parse_qs(body)
+        return self._autorizar(params)
+
+    def _autorizar(self, params):
+        mac = next((params[campo][0] for campo in MAC_FIELDS if params.get(campo)), None)
+        if not mac:
+            return self._responder(400, {'Reply-Message': 'MAC não informado'})
+
+        try:
+            tipo = self.server.macs.consultar(mac)
+        except ValidationError:
+            return self._responder(400, {'Reply-Message': f'MAC inválido: {mac}'})
+
+        if tipo:
+            return self._responder(200, {'Reply-Message': f'MAC {mac} autorizado ({tipo})'})
+        return self._responder(401, {'Reply-Message': f'MAC {mac} não encontrado no banco'})
+
+    def _responder(self, status, dados):
+        body = json.dumps(dados).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Conexões via socket Unix não têm endereço IP
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Serviço residente de autorização de MACs para o FreeRADIUS (rlm_rest), '
+        'com os MACs autorizados mantidos em memória'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bind',
+            default='127.0.0.1:8450',
+            help='Endereço HOST:PORTA para escutar (padrão: 127.0.0.1:8450)'
+        )
+        parser.add_argument(
+            '--socket',
+            help='Caminho de um socket Unix para escutar (substitui --bind)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=1.0,
+            help='Segundos entre atualizações incrementais (padrão: 1)'
+        )
+        parser.add_argument(
+            '--recarga',
+            type=float,
+            default=60.0,
+            help='Segundos entre recargas completas do banco (padrão: 60)'
+        )
+        parser.add_argument(
+            '--verbose-http',
+            action='store_true',
+            help='Registra cada requisição HTTP recebida'
+        )
+
+    def handle(self, *args, **options):
+        macs = AuthorizedMacSet()
+        macs.carregar()
+
+        server = self._criar_servidor(options)
+        server.macs = macs
+        server.verbose = options['verbose_http']
+
+        atualizador = threading.Thread(
+            target=self._atualizar_periodicamente,
+            args=(macs, options['intervalo'], options['recarga']),
+            name='radius-auth-refresh',
+            daemon=True,
+        )
+        atualizador.start()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serviço de autorização escutando em {options['socket'] or options['bind']} "
+            f"({len(macs)} MACs autorizados)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if options['socket'] and os.path.exists(options['socket']):
+                os.unlink(options['socket'])
+
+    def _criar_servidor(self, options):
+        if options['socket']:
+            caminho = options['socket']
+            if os.path.exists(caminho):
+                os.unlink(caminho)
+            server = ThreadingUnixHTTPServer(caminho, RadiusAuthHandler)
+            os.chmod(caminho, 0o660)
+            return server
+
+        host, _, porta = options['bind'].rpartition(':')
+        if not host or not porta.isdigit():
+            raise CommandError(f"Endereço inválido para --bind: {options['bind']}")
+        return ThreadingHTTPServer((host, int(porta)), RadiusAuthHandler)
+
+    def _atualizar_periodicamente(self, macs, intervalo, recarga):
+        ultima_recarga = time.monotonic()
+        while True:
+            time.sleep(intervalo)
+            try:
+                close_old_connections()
+                if time.monotonic() - ultima_recarga >= recarga:
+                    macs.carregar()
+                    ultima_recarga = time.monotonic()
+                else:
+                    macs.atualizar()
+            except Exception as e:
+                self.stderr.write(f"Erro ao atualizar MACs autorizados: {str(e)}")
@@ -0,0 +1,106 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from unifi_auth_app.signals import get_unifi_api
+from unifi_auth_app.whitelist_reconcile import reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Compara a whitelist dos SSIDs do UniFi com os MACs autorizados no banco e corrige as diferenças'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ssid',
+            action='append',
+            dest='ssids',
+            help='SSID a reconciliar; pode ser repetido (padrão: UNIFI_SSID e UNIFI_SSID_VISITANTES)'
+        )
+        modo = parser.add_mutually_exclusive_group()
+        modo.add_argument(
+            '--aplicar',
+            action='store_true',
+            help='Escreve as diferenças no controlador'
+        )
+        modo.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostra as diferenças, sem alterar o controlador (padrão)'
+        )
+        parser.add_argument(
+            '--sem-remocao',
+            action='store_true',
+            help='Apenas adiciona os MACs ausentes, sem remover os que sobram na whitelist'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Continua em execução, reconciliando a cada --intervalo segundos'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=3600.0,
+            help='Segundos entre reconciliações no modo --loop (padrão: 3600)'
+        )
+        parser.add_argument(
+            '--detalhes',
+            action='store_true',
+            help='Lista os MACs adicionados e removidos'
+        )
+
+    def handle(self, *args, **options):
+        ssids = options['ssids'] or list(dict.fromkeys(
+            s for s in (settings.UNIFI_SSID, settings.UNIFI_SSID_VISITANTES) if s
+        ))
+        if not ssids:
+            raise CommandError('Informe --ssid ou configure UNIFI_SSID')
+
+        api = get_unifi_api()
+        if api is None:
+            raise CommandError('API do UniFi não configurada ou indisponível')
+
+        if not options['loop']:
+            self._reconciliar(api, ssids, options)
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciliação da whitelist iniciada: {', '.join(ssids)}"))
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    self._reconciliar(api, ssids, options)
+                except Exception as e:
+                    self.stderr.write(f"Erro na reconciliação da whitelist: {str(e)}")
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Reconciliação da whitelist encerrada')
+
+    def _reconciliar(self, api, ssids, options):
+        inicio = time.monotonic()
+        resultados = reconciliar(
+            api,
+            ssids,
+            aplicar=options['aplicar'],
+            remover=not options['sem_remocao'],
+        )
+        simulacao = '' if options['aplicar'] else ' (simulação)'
+
+        for resultado in resultados:
+            if resultado.erro:
+                self.stderr.write(self.style.ERROR(f"[{resultado.ssid}] {resultado.erro}"))
+            tempos = ', '.join(f"{etapa} {segundos:.3f}s" for etapa, segundos in resultado.tempos.items())
+            self.stdout.write(
+                f"[{resultado.ssid}]{simulacao} controlador: {resultado.no_controlador} MACs, "
+                f"banco: {resultado.no_banco} MACs, adicionar: {len(resultado.adicionar)}, "
+                f"remover: {len(resultado.remover)} ({tempos})"
+            )
+            if options['detalhes']:
+                for mac in sorted(resultado.adicionar):
+                    self.stdout.write(f"  + {mac}")
+                for mac in sorted(resultado.remover):
+                    self.stdout.write(f"  - {mac}")
+
+        self.stdout.write(f"Reconciliação concluída em {time.monotonic() - inicio:.3f}s")
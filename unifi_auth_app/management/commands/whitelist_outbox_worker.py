@@ -0,0 +1,103 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from unifi_auth_app.whitelist_outbox import (
+    processar_pendentes,
+    remover_concluidos,
+    ultima_notificacao,
+)
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de alterações pendentes na whitelist dos SSIDs do UniFi'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Processa a fila uma única vez e encerra'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5.0,
+            help='Intervalo máximo, em segundos, entre consultas à fila (padrão: 5)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=100,
+            help='Quantidade máxima de alterações processadas por lote (padrão: 100)'
+        )
+        parser.add_argument(
+            '--janela',
+            type=float,
+            default=1.0,
+            help='Segundos aguardados após uma notificação para agrupar alterações próximas no mesmo lote (padrão: 1)'
+        )
+        parser.add_argument(
+            '--reter-dias',
+            type=int,
+            default=7,
+            help='Dias que alterações concluídas permanecem na tabela (padrão: 7)'
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        lote = options['lote']
+        reter_dias = options['reter_dias']
+        janela = options['janela']
+
+        if options['once']:
+            self._drenar(lote)
+            self._limpar(reter_dias)
+            return
+
+        self.stdout.write(self.style.SUCCESS('Worker da whitelist iniciado'))
+        ultima_limpeza = 0.0
+        try:
+            while True:
+                close_old_connections()
+                processados = self._drenar(lote)
+
+                if time.monotonic() - ultima_limpeza > 3600:
+                    self._limpar(reter_dias)
+                    ultima_limpeza = time.monotonic()
+
+                if not processados:
+                    self._aguardar(intervalo, janela)
+        except KeyboardInterrupt:
+            self.stdout.write('Worker da whitelist encerrado')
+
+    def _drenar(self, lote):
+        """Processa lotes até a fila de itens vencidos esvaziar."""
+        total = 0
+        while True:
+            sucesso, falhas = processar_pendentes(limite=lote)
+            if sucesso or falhas:
+                self.stdout.write(f"Lote processado: {sucesso} com sucesso, {falhas} com falha")
+            total += sucesso + falhas
+            if sucesso + falhas < lote:
+                return total
+
+    def _limpar(self, reter_dias):
+        apagados = remover_concluidos(reter_dias)
+        if apagados:
+            self.stdout.write(f"{apagados} alterações concluídas removidas da fila")
+
+    def _aguardar(self, intervalo, janela):
+        """
+        Dorme até o intervalo acabar ou uma nova alteração ser enfileirada.
+
+        Após uma notificação, aguarda mais `janela` segundos para que
+        alterações feitas em sequência (cadastro em massa) caiam no mesmo lote.
+        """
+        inicio = time.monotonic()
+        notificacao = ultima_notificacao()
+        while time.monotonic() - inicio < intervalo:
+            time.sleep(0.25)
+            if ultima_notificacao() != notificacao:
+                time.sleep(janela)
+                return
@@ -38,6 +38,159 @@ bulk_operations = Counter(
     ['operation', 'status']
 )
 
+# Métricas do pool de sessões com o controlador
+session_pool_size = Gauge(
+    'unifi_session_pool_size',
+    'Number of authenticated UniFi controller sessions held by this process'
+)
+
+controller_logins = Counter(
+    'unifi_controller_logins_total',
+    'Number of logins performed against the UniFi controller',
+    ['reason', 'status']
+)
+
+# Métricas do snapshot de clientes (stat/sta)
+client_snapshot_requests = Counter(
+    'unifi_client_snapshot_requests_total',
+    'Client snapshot lookups by result (hit/stale/miss/error)',
+    ['result']
+)
+
+client_snapshot_age = Gauge(
+    'unifi_client_snapshot_age_seconds',
+    'Age of the client snapshot served by this process'
+)
+
+client_snapshot_clients = Gauge(
+    'unifi_client_snapshot_clients',
+    'Number of clients in the latest client snapshot'
+)
+
+# Métricas de escrita em lote na whitelist
+whitelist_batch_size = Histogram(
+    'unifi_whitelist_batch_size',
+    'Number of MAC changes coalesced into a single whitelist write',
+    buckets=[1, 2, 5, 10, 20, 50, 100, 200, 500]
+)
+
+whitelist_flush_latency = Histogram(
+    'unifi_whitelist_flush_latency_seconds',
+    'Time spent applying a coalesced whitelist batch to one SSID',
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+)
+
+# Métricas do limitador de taxa das APIs do portal
+rate_limit_rejections = Counter(
+    'portal_rate_limit_rejections_total',
+    'Requests rejected with 429 by the portal rate limiter',
+    ['path', 'scope']
+)
+
+# Métricas do cache de autorização por IP (check_auth_status)
+auth_status_cache_lookups = Counter(
+    'portal_auth_status_cache_lookups_total',
+    'Authorized-IP lookups by where they were answered (local/shared/miss)',
+    ['result']
+)
+
+# Métricas de resiliência das chamadas ao controlador
+circuit_breaker_state = Gauge(
+    'unifi_circuit_breaker_state',
+    'Circuit breaker state per controller (0=closed, 1=half_open, 2=open)',
+    ['controller']
+)
+
+circuit_breaker_trips = Counter(
+    'unifi_circuit_breaker_trips_total',
+    'Number of times the circuit breaker opened for a controller',
+    ['controller']
+)
+
+api_retries = Counter(
+    'unifi_api_retries_total',
+    'Retries of idempotent UniFi controller requests',
+    ['method']
+)
+
+# Métricas das escritas verificadas na whitelist
+whitelist_lost_updates = Counter(
+    'unifi_whitelist_lost_updates_total',
+    'Whitelist writes whose result diverged from the expected list on read-back',
+    ['ssid']
+)
+
+whitelist_lock_wait = Histogram(
+    'unifi_whitelist_lock_wait_seconds',
+    'Time spent waiting for the per-SSID whitelist write lock',
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0]
+)
+
+# Métricas da reconciliação da whitelist com o banco
+whitelist_drift = Gauge(
+    'unifi_whitelist_drift_macs',
+    'MACs differing between the SSID whitelist and the database at the last reconciliation',
+    ['ssid', 'operation']
+)
+
+# Métricas da expiração das autorizações de visitantes
+visitor_expirations = Counter(
+    'portal_visitor_expirations_total',
+    'Visitor authorizations revoked by the expiry sweeper',
+    ['kind']
+)
+
+# Métricas do pipeline assíncrono de auditoria das APIs
+audit_events_dropped = Counter(
+    'portal_audit_events_dropped_total',
+    'API audit events dropped because the in-process audit queue was full'
+)
+
+audit_batch_size = Histogram(
+    'portal_audit_batch_size',
+    'Number of audit events written in a single batch',
+    buckets=[1, 5, 10, 25, 50, 100, 200, 500]
+)
+
+audit_queue_depth = Gauge(
+    'portal_audit_queue_depth',
+    'Audit events waiting in the in-process queue after the last batch'
+)
+
+# Métricas de latência das requisições ao portal (RequestTimingMiddleware)
+REQUEST_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+request_latency = Histogram(
+    'portal_request_latency_seconds',
+    'End-to-end request latency measured by RequestTimingMiddleware',
+    ['url_name', 'method', 'status_class'],
+    buckets=REQUEST_LATENCY_BUCKETS
+)
+
+request_db_time = Histogram(
+    'portal_request_db_seconds',
+    'Time spent in database queries per request',
+    ['url_name'],
+    buckets=REQUEST_LATENCY_BUCKETS
+)
+
+request_controller_time = Histogram(
+    'portal_request_controller_seconds',
+    'Time spent in UniFi controller calls per request',
+    ['url_name'],
+    buckets=REQUEST_LATENCY_BUCKETS
+)
+
+# Métricas por fase dos fluxos do portal (tracing.span)
+phase_duration = Histogram(
+    'portal_phase_duration_seconds',
+    'Duration of each traced phase of a portal flow',
+    ['flow', 'phase'],
+    buckets=REQUEST_LATENCY_BUCKETS
+)
+
+CIRCUIT_BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
 def track_api_call(method: str) -> Callable:
     """
     Decorator para monitorar chamadas à API do UniFi.
@@ -66,6 +219,33 @@ def track_api_call(method: str) -> Callable:
         return wrapper
     return decorator
 
+def track_async_api_call(method: str) -> Callable:
+    """
+    Versão de track_api_call para corrotinas (cliente assíncrono do UniFi).
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs) -> Any:
+            start_time = time.time()
+            try:
+                result = await func(*args, **kwargs)
+                unifi_api_requests.labels(
+                    method=method,
+                    status='success'
+                ).inc()
+                return result
+            except Exception:
+                unifi_api_requests.labels(
+                    method=method,
+                    status='error'
+                ).inc()
+                raise
+            finally:
+                duration = time.time() - start_time
+                unifi_api_latency.labels(method=method).observe(duration)
+        return wrapper
+    return decorator
+
 def track_cache_access(hit: bool) -> None:
     """
     Registra hits e misses do cache
@@ -90,3 +270,122 @@ def update_mac_count(count: int) -> None:
     Atualiza o contador total de MACs
     """
     mac_addresses_total.set(count)
+
+def update_session_pool_size(size: int) -> None:
+    """
+    Atualiza o número de sessões mantidas pelo pool
+    """
+    session_pool_size.set(size)
+
+def track_controller_login(reason: str, success: bool) -> None:
+    """
+    Registra logins no controlador (initial/expired)
+    """
+    status = 'success' if success else 'error'
+    controller_logins.labels(reason=reason, status=status).inc()
+
+def track_client_snapshot(result: str, snapshot=None) -> None:
+    """
+    Registra consultas ao snapshot de clientes e a idade do snapshot servido
+    """
+    client_snapshot_requests.labels(result=result).inc()
+    if snapshot is not None:
+        client_snapshot_age.set(snapshot.age)
+
+def update_client_snapshot_size(count: int) -> None:
+    """
+    Atualiza o número de clientes no snapshot
+    """
+    client_snapshot_clients.set(count)
+    client_snapshot_age.set(0)
+
+def track_whitelist_flush(batch_size: int, duration: float) -> None:
+    """
+    Registra o tamanho e a duração de um lote aplicado na whitelist
+    """
+    whitelist_batch_size.observe(batch_size)
+    whitelist_flush_latency.observe(duration)
+
+def track_rate_limit_rejection(path: str, scope: str) -> None:
+    """
+    Registra uma requisição rejeitada pelo limitador de taxa (scope: ip/mac)
+    """
+    rate_limit_rejections.labels(path=path, scope=scope).inc()
+
+def track_auth_status_cache(result: str) -> None:
+    """
+    Registra onde foi respondida uma consulta de autorização por IP
+    """
+    auth_status_cache_lookups.labels(result=result).inc()
+
+def update_circuit_breaker_state(controller: str, state: str) -> None:
+    """
+    Atualiza o estado do circuit breaker do controlador (closed/half_open/open)
+    """
+    circuit_breaker_state.labels(controller=controller).set(CIRCUIT_BREAKER_STATES[state])
+
+def track_circuit_breaker_trip(controller: str) -> None:
+    """
+    Registra a abertura do circuit breaker de um controlador
+    """
+    circuit_breaker_trips.labels(controller=controller).inc()
+
+def track_api_retry(method: str) -> None:
+    """
+    Registra uma nova tentativa de requisição ao controlador
+    """
+    api_retries.labels(method=method).inc()
+
+def track_whitelist_lost_update(ssid: str) -> None:
+    """
+    Registra uma escrita na whitelist sobrescrita por outro escritor
+    """
+    whitelist_lost_updates.labels(ssid=ssid).inc()
+
+def track_whitelist_lock_wait(duration: float) -> None:
+    """
+    Registra o tempo de espera pelo lock de escrita da whitelist de um SSID
+    """
+    whitelist_lock_wait.observe(duration)
+
+def update_whitelist_drift(ssid: str, missing: int, extra: int) -> None:
+    """
+    Atualiza as diferenças encontradas pela última reconciliação da whitelist
+    """
+    whitelist_drift.labels(ssid=ssid, operation='add').set(missing)
+    whitelist_drift.labels(ssid=ssid, operation='remove').set(extra)
+
+def track_visitor_expirations(visitors: int, devices: int) -> None:
+    """
+    Registra visitantes e dispositivos de visitantes expirados em uma varredura
+    """
+    visitor_expirations.labels(kind='visitor').inc(visitors)
+    visitor_expirations.labels(kind='device').inc(devices)
+
+def track_audit_dropped() -> None:
+    """
+    Registra um evento de auditoria descartado por fila cheia
+    """
+    audit_events_dropped.inc()
+
+def track_audit_flush(batch_size: int, queue_depth: int) -> None:
+    """
+    Registra um lote de eventos de auditoria gravado e a fila restante
+    """
+    audit_batch_size.observe(batch_size)
+    audit_queue_depth.set(queue_depth)
+
+def track_request_timing(url_name: str, method: str, status_class: str,
+                         total: float, db: float, controller: float) -> None:
+    """
+    Registra a latência de uma requisição e o tempo gasto no banco e no controlador
+    """
+    request_latency.labels(url_name=url_name, method=method, status_class=status_class).observe(total)
+    request_db_time.labels(url_name=url_name).observe(db)
+    request_controller_time.labels(url_name=url_name).observe(controller)
+
+def track_phase_duration(flow: str, phase: str, duration: float) -> None:
+    """
+    Registra a duração de uma fase de um fluxo rastreado (phase='total' para o fluxo inteiro)
+    """
+    phase_duration.labels(flow=flow, phase=phase).observe(duration)
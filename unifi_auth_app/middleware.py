@@ -1,21 +1,15 @@
 from django.urls import resolve, Resolver404, reverse
 from django.http import HttpResponseNotFound, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
 import logging
 
 logger = logging.getLogger('unifi_auth_app')
 
 
-class ErrorHandlingMiddleware:
+class ErrorHandlingMiddleware(MiddlewareMixin):
     """
     Middleware para tratamento centralizado de erros.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        response = self.get_response(request)
-        return response
-        
     def process_exception(self, request, exception):
         """Processa exceções não tratadas."""
         logger.error(
@@ -37,12 +31,12 @@ class ErrorHandlingMiddleware:
         return None  # Deixa o Django lidar com a exceção normalmente
 
 
-class PortalMiddleware:
+class PortalMiddleware(MiddlewareMixin):
     """
     Middleware para controle de acesso ao portal de administração.
     """
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         # Lista de URLs públicas que não requerem autenticação
         self.public_urls = [
             '/api/authorize-visitor/',
@@ -50,14 +44,14 @@ class PortalMiddleware:
             '/api/check-auth/'
         ]
 
-    def __call__(self, request):
+    def process_request(self, request):
         # Verifica se é uma tentativa de acessar o admin na porta 8448
         if ':8448' in request.get_host() and request.path.startswith('/admin'):
             return HttpResponseNotFound('Admin interface not available on this port')
 
         # Verifica se a URL atual está na lista de URLs públicas
         if any(request.path.startswith(url) for url in self.public_urls):
-            return self.get_response(request)
+            return None
 
 
         try:
@@ -65,14 +59,14 @@ class PortalMiddleware:
             if resolver_match.url_name and resolver_match.url_name.startswith('admin:'):
                 # Se for uma URL do admin na porta correta, deixa passar
                 if ':8449' in request.get_host():
-                    return self.get_response(request)
+                    return None
                 return HttpResponseNotFound('Admin interface not available on this port')
         except Resolver404:
             pass
 
         # Se o usuário já estiver autenticado ou estiver acessando a página de login, permite o acesso
         if request.user.is_authenticated or request.path == reverse('login'):
-            return self.get_response(request)
+            return None
             
         # Para todas as outras URLs não autenticadas, redireciona para a página de login
         from django.shortcuts import redirect
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:34
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0016_alter_visitante_autorizado_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhitelistOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mac_address', models.CharField(max_length=17, verbose_name='Endereço MAC')),
+                ('ssid', models.CharField(max_length=64, verbose_name='SSID')),
+                ('operacao', models.CharField(choices=[('add', 'Adicionar'), ('remove', 'Remover')], max_length=10, verbose_name='Operação')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('concluido', 'Concluído'), ('falhou', 'Falhou')], default='pendente', max_length=10, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('proxima_tentativa', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima Tentativa')),
+                ('ultimo_erro', models.TextField(blank=True, default='', verbose_name='Último Erro')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('processado_em', models.DateTimeField(blank=True, null=True, verbose_name='Processado em')),
+            ],
+            options={
+                'verbose_name': 'Alteração Pendente de Whitelist',
+                'verbose_name_plural': 'Alterações Pendentes de Whitelist',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'proxima_tentativa'], name='outbox_status_proxima_idx')],
+            },
+        ),
+    ]
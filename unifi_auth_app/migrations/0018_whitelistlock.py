@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0017_whitelistoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhitelistLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ssid', models.CharField(max_length=64, unique=True, verbose_name='SSID')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Lock de Whitelist',
+                'verbose_name_plural': 'Locks de Whitelist',
+            },
+        ),
+    ]
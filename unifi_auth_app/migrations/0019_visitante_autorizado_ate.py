@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0018_whitelistlock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitante',
+            name='autorizado_ate',
+            field=models.DateTimeField(blank=True, help_text='Data e hora em que a autorização expira (vazio = sem expiração)', null=True, verbose_name='Autorizado até'),
+        ),
+        migrations.AddField(
+            model_name='visitantedispositivo',
+            name='visitante_autorizado_ate',
+            field=models.DateTimeField(blank=True, help_text='Data e hora em que a autorização do dispositivo expira (vazio = sem expiração própria)', null=True, verbose_name='Autorizado até'),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['autorizado', 'autorizado_ate'], name='visitante_autorizado_ate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantedispositivo',
+            index=models.Index(fields=['visitante_dispositivo_ativo', 'visitante_autorizado_ate'], name='visdisp_ativo_expira_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0019_visitante_autorizado_ate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unifiuser',
+            name='ativo',
+            field=models.BooleanField(default=True, help_text='Usuários inativos (fora da última importação) não têm os dispositivos autorizados', verbose_name='Ativo'),
+        ),
+        migrations.AddField(
+            model_name='unifiuser',
+            name='import_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40, verbose_name='Hash da Importação'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0020_unifiuser_ativo_import_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='Data/Hora')),
+                ('hostname', models.CharField(blank=True, default='', max_length=255, verbose_name='Servidor')),
+                ('method', models.CharField(max_length=10, verbose_name='Método')),
+                ('path', models.CharField(max_length=255, verbose_name='Caminho')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Status')),
+                ('duration_ms', models.PositiveIntegerField(default=0, verbose_name='Duração (ms)')),
+                ('client_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='IP do Cliente')),
+                ('mac_address', models.CharField(blank=True, max_length=17, null=True, verbose_name='Endereço MAC')),
+                ('usuario', models.CharField(blank=True, default='', max_length=255, verbose_name='Usuário')),
+                ('user_agent', models.TextField(blank=True, default='', verbose_name='User Agent')),
+                ('detalhes', models.JSONField(blank=True, default=dict, verbose_name='Detalhes')),
+            ],
+            options={
+                'verbose_name': 'Evento de Auditoria',
+                'verbose_name_plural': 'Eventos de Auditoria',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['timestamp'], name='audit_timestamp_idx'), models.Index(fields=['client_ip', 'timestamp'], name='audit_ip_timestamp_idx'), models.Index(fields=['mac_address', 'timestamp'], name='audit_mac_timestamp_idx'), models.Index(fields=['path', 'timestamp'], name='audit_path_timestamp_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0021_auditevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='unifiuser',
+            index=models.Index(fields=['matricula', 'import_hash', 'ativo'], name='unifiuser_matricula_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['ip_address', 'autorizado', '-data_acesso'], name='visitante_ip_autorizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['-data_acesso'], name='visitante_data_acesso_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitantedispositivo',
+            index=models.Index(fields=['visitante_mac_address', 'visitante_dispositivo_ativo'], name='visdisp_mac_ativo_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import re
+
+from django.db import migrations
+
+MATRICULA_DECIMAL = re.compile(r'^(\d+)\.0+$')
+
+
+def normalizar_matriculas(apps, schema_editor):
+    """
+    Remove o '.0' das matrículas gravadas a partir de células numéricas do .xls.
+
+    Se uma reimportação por CSV/XLSX já criou o servidor com a matrícula
+    correta, os dispositivos do registro antigo passam para ele e o registro
+    duplicado é apagado.
+    """
+    UniFiUser = apps.get_model('unifi_auth_app', 'UniFiUser')
+    Dispositivo = apps.get_model('unifi_auth_app', 'Dispositivo')
+
+    legados = UniFiUser.objects.filter(matricula__regex=r'^[0-9]+\.0+$').order_by('id')
+    for usuario in legados.iterator():
+        matricula = MATRICULA_DECIMAL.match(usuario.matricula).group(1)
+        atual = UniFiUser.objects.filter(matricula=matricula).order_by('id').first()
+        if atual is None:
+            UniFiUser.objects.filter(id=usuario.id).update(matricula=matricula)
+            continue
+        Dispositivo.objects.filter(usuario_id=usuario.id).update(usuario_id=atual.id)
+        UniFiUser.objects.filter(id=usuario.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0022_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_matriculas, migrations.RunPython.noop),
+    ]
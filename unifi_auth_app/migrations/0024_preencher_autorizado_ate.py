@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+
+
+def preencher_autorizado_ate(apps, schema_editor):
+    """
+    Dá às autorizações concedidas antes de autorizado_ate o prazo padrão do portal.
+
+    Sem isso os visitantes já autorizados (e os dispositivos ativos) nunca
+    expirariam, já que o campo vazio significa "sem expiração".
+    """
+    Visitante = apps.get_model('unifi_auth_app', 'Visitante')
+    VisitanteDispositivo = apps.get_model('unifi_auth_app', 'VisitanteDispositivo')
+    duracao = timedelta(minutes=settings.PORTAL_CONFIG['AUTH_DURATION_MINUTES'])
+
+    Visitante.objects.filter(autorizado=True, autorizado_ate__isnull=True).update(
+        autorizado_ate=F('data_acesso') + duracao
+    )
+    VisitanteDispositivo.objects.filter(
+        visitante_dispositivo_ativo=True, visitante_autorizado_ate__isnull=True
+    ).update(visitante_autorizado_ate=F('visitante_data_cadastro') + duracao)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unifi_auth_app', '0023_normalizar_matricula'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_autorizado_ate, migrations.RunPython.noop),
+    ]
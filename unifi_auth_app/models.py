@@ -5,6 +5,8 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.conf import settings
 
+from .mac_utils import MacInvalido, normalizar_mac
+
 # Não importamos o User aqui para evitar importação circular
 # A importação será feita dentro dos métodos que precisam dele
 
@@ -12,23 +14,10 @@ from django.conf import settings
 # === Funções auxiliares para validar MAC Address ===
 def format_mac_address(value):
     """Converte o MAC address para o formato padrão XX:XX:XX:XX:XX:XX em maiúsculas"""
-    clean_mac = ''.join(c for c in value if c.isalnum())
-
-    invalid_chars = set(clean_mac) - set('0123456789ABCDEFabcdef')
-    if invalid_chars:
-        chars_list = ', '.join(sorted(invalid_chars))
-        raise ValidationError(
-            f'MAC address contém caracteres inválidos: {chars_list}. '
-            'Use apenas números (0-9) e letras de A até F'
-        )
-
-    if len(clean_mac) != 12:
-        raise ValidationError(
-            f'MAC address deve ter 12 caracteres hexadecimais, mas tem {len(clean_mac)}. '
-            'Formato esperado: XX:XX:XX:XX:XX:XX'
-        )
-
-    return ':'.join(clean_mac[i:i+2].upper() for i in range(0, 12, 2))
+    try:
+        return normalizar_mac(value)
+    except MacInvalido as e:
+        raise ValidationError(str(e))
 
 
 def validate_mac_address(value):
@@ -125,12 +114,25 @@ class UniFiUser(models.Model):
         default='efetivo'
     )
 
+    ativo = models.BooleanField(
+        'Ativo',
+        default=True,
+        help_text='Usuários inativos (fora da última importação) não têm os dispositivos autorizados'
+    )
+
+    # Hash da linha da última importação, para ignorar linhas sem alteração
+    import_hash = models.CharField('Hash da Importação', max_length=40, blank=True, default='', editable=False)
+
     created_at = models.DateTimeField('Data de Criação', auto_now_add=True)
 
     class Meta:
         verbose_name = 'Usuário UniFi'
         verbose_name_plural = 'Usuários UniFi'
         ordering = ['nome']
+        indexes = [
+            # Cobre a busca dos usuários existentes na importação (id vem da chave primária)
+            models.Index(fields=['matricula', 'import_hash', 'ativo'], name='unifiuser_matricula_idx'),
+        ]
 
     def get_departamento_display_full(self):
         return f"{self.departamento} - {self.get_departamento_display()}"
@@ -225,11 +227,23 @@ class VisitanteDispositivo(models.Model):
         help_text='Indica se o dispositivo está atualmente autorizado'
     )
     
+    visitante_autorizado_ate = models.DateTimeField(
+        'Autorizado até',
+        null=True,
+        blank=True,
+        help_text='Data e hora em que a autorização do dispositivo expira (vazio = sem expiração própria)'
+    )
+    
     class Meta:
         verbose_name = 'Dispositivo de Visitante'
         verbose_name_plural = 'Dispositivos de Visitantes'
         unique_together = ('visitante', 'visitante_mac_address')
         ordering = ['-visitante_ultimo_acesso']
+        indexes = [
+            models.Index(fields=['visitante_dispositivo_ativo', 'visitante_autorizado_ate'], name='visdisp_ativo_expira_idx'),
+            # Verificação de MAC já ativo em clean() e no VisitanteDispositivoForm
+            models.Index(fields=['visitante_mac_address', 'visitante_dispositivo_ativo'], name='visdisp_mac_ativo_idx'),
+        ]
     
     def __str__(self):
         nome = self.visitante_nome_dispositivo or 'Dispositivo sem nome'
@@ -330,6 +344,13 @@ class Visitante(models.Model):
         help_text='Indica se o visitante está autorizado a acessar a rede'
     )
     
+    autorizado_ate = models.DateTimeField(
+        'Autorizado até',
+        null=True,
+        blank=True,
+        help_text='Data e hora em que a autorização expira (vazio = sem expiração)'
+    )
+    
     # Campo mantido para compatibilidade, mas não será mais usado
     mac_address = models.CharField(
         'Endereço MAC (Legado)',
@@ -343,6 +364,13 @@ class Visitante(models.Model):
         verbose_name = 'Visitante'
         verbose_name_plural = 'Visitantes'
         ordering = ['-data_acesso']
+        indexes = [
+            models.Index(fields=['autorizado', 'autorizado_ate'], name='visitante_autorizado_ate_idx'),
+            # check_auth_status: visitante autorizado pelo IP, já na ordem do acesso mais recente
+            models.Index(fields=['ip_address', 'autorizado', '-data_acesso'], name='visitante_ip_autorizado_idx'),
+            # Listagens ordenadas pelo acesso mais recente (ordering padrão)
+            models.Index(fields=['-data_acesso'], name='visitante_data_acesso_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nome} - {self.email} ({self.data_acesso.strftime('%d/%m/%Y %H:%M')})"
@@ -430,3 +458,104 @@ class Visitante(models.Model):
         return self.visitante_dispositivos.filter(
             visitante_dispositivo_ativo=True
         ).count() < 3
+
+
+class WhitelistOutbox(models.Model):
+    """
+    Fila durável de alterações pendentes na whitelist de SSIDs do UniFi.
+
+    Os registros são gravados na mesma transação que altera o dispositivo e
+    processados em segundo plano pelo comando whitelist_outbox_worker, que
+    repete as operações que falharem.
+    """
+    OPERACAO_ADICIONAR = 'add'
+    OPERACAO_REMOVER = 'remove'
+    OPERACAO_CHOICES = [
+        (OPERACAO_ADICIONAR, 'Adicionar'),
+        (OPERACAO_REMOVER, 'Remover'),
+    ]
+
+    STATUS_PENDENTE = 'pendente'
+    STATUS_CONCLUIDO = 'concluido'
+    STATUS_FALHOU = 'falhou'
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_CONCLUIDO, 'Concluído'),
+        (STATUS_FALHOU, 'Falhou'),
+    ]
+
+    mac_address = models.CharField('Endereço MAC', max_length=17)
+    ssid = models.CharField('SSID', max_length=64)
+    operacao = models.CharField('Operação', max_length=10, choices=OPERACAO_CHOICES)
+    status = models.CharField('Status', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDENTE)
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    proxima_tentativa = models.DateTimeField('Próxima Tentativa', default=timezone.now)
+    ultimo_erro = models.TextField('Último Erro', blank=True, default='')
+    criado_em = models.DateTimeField('Criado em', auto_now_add=True)
+    processado_em = models.DateTimeField('Processado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Alteração Pendente de Whitelist'
+        verbose_name_plural = 'Alterações Pendentes de Whitelist'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa'], name='outbox_status_proxima_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_operacao_display()} {self.mac_address} em '{self.ssid}' ({self.get_status_display()})"
+
+
+class WhitelistLock(models.Model):
+    """
+    Linha de lock por SSID para serializar as escritas na whitelist.
+
+    whitelist_mutation bloqueia a linha do SSID com SELECT ... FOR UPDATE
+    durante o ciclo leitura-escrita-verificação, de modo que workers,
+    comandos e o portal nunca gravem a mesma whitelist ao mesmo tempo.
+    """
+    ssid = models.CharField('SSID', max_length=64, unique=True)
+    atualizado_em = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Lock de Whitelist'
+        verbose_name_plural = 'Locks de Whitelist'
+
+    def __str__(self):
+        return self.ssid
+
+
+class AuditEvent(models.Model):
+    """
+    Evento de auditoria de uma requisição às APIs (somente inclusão).
+
+    Gravado em lote pela thread do audit_pipeline (audit_store.AuditEventSink)
+    e indexado pelas chaves usadas nas consultas do comando query_audit. Os
+    eventos mais antigos que AUDIT_RETENTION_DAYS são apagados pelo comando
+    purge_audit_events.
+    """
+    timestamp = models.DateTimeField('Data/Hora')
+    hostname = models.CharField('Servidor', max_length=255, blank=True, default='')
+    method = models.CharField('Método', max_length=10)
+    path = models.CharField('Caminho', max_length=255)
+    status_code = models.PositiveSmallIntegerField('Status')
+    duration_ms = models.PositiveIntegerField('Duração (ms)', default=0)
+    client_ip = models.GenericIPAddressField('IP do Cliente', null=True, blank=True)
+    mac_address = models.CharField('Endereço MAC', max_length=17, null=True, blank=True)
+    usuario = models.CharField('Usuário', max_length=255, blank=True, default='')
+    user_agent = models.TextField('User Agent', blank=True, default='')
+    detalhes = models.JSONField('Detalhes', default=dict, blank=True)
+
+    class Meta:
+        verbose_name = 'Evento de Auditoria'
+        verbose_name_plural = 'Eventos de Auditoria'
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='audit_timestamp_idx'),
+            models.Index(fields=['client_ip', 'timestamp'], name='audit_ip_timestamp_idx'),
+            models.Index(fields=['mac_address', 'timestamp'], name='audit_mac_timestamp_idx'),
+            models.Index(fields=['path', 'timestamp'], name='audit_path_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.status_code}) em {self.timestamp:%d/%m/%Y %H:%M:%S}"
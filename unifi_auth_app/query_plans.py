@@ -0,0 +1,157 @@
+"""
+Auditoria dos planos de execução das consultas mais frequentes do portal.
+
+Cada consulta de CONSULTAS_QUENTES reproduz uma consulta feita em um caminho
+quente (check-auth, validação de dispositivos, importação, expiração). O
+EXPLAIN de cada uma é analisado e qualquer varredura completa de tabela ou
+de índice é apontada, assim como ordenações sem índice (filesort) nas
+consultas que dependem de um índice para a ordem.
+
+Os planos dependem das estatísticas das tabelas: rode a auditoria
+(comando explain_hot_queries) contra um banco com volume de produção.
+Bancos suportados: MySQL/MariaDB e SQLite. No SQLite o Django escreve
+filtros `campo=True` como a coluna pura (sem `= 1`), o que impede o uso de
+índices que começam por um booleano; no MySQL/MariaDB a comparação é
+explícita e esses índices são usados.
+"""
+from collections import namedtuple
+from typing import List
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import UniFiUser, Visitante, VisitanteDispositivo
+
+# ordenada=True: a consulta lê as primeiras linhas na ordem de um índice,
+# então uma varredura (limitada) do índice é esperada, mas um filesort não
+ConsultaQuente = namedtuple('ConsultaQuente', ['nome', 'descricao', 'montar', 'ordenada'])
+ResultadoPlano = namedtuple('ResultadoPlano', ['consulta', 'plano', 'problemas'])
+
+IP_EXEMPLO = '10.0.0.1'
+MAC_EXEMPLO = 'AA:BB:CC:DD:EE:FF'
+
+
+def _check_auth_status():
+    agora = timezone.now()
+    return Visitante.objects.filter(
+        Q(autorizado_ate__isnull=True) | Q(autorizado_ate__gt=agora),
+        ip_address=IP_EXEMPLO,
+        autorizado=True,
+    ).order_by('-data_acesso')[:1]
+
+
+def _dispositivo_ativo_por_mac():
+    # Mesmo formato do .exists() de VisitanteDispositivo.clean e do VisitanteDispositivoForm
+    return VisitanteDispositivo.objects.filter(
+        visitante_mac_address=MAC_EXEMPLO,
+        visitante_dispositivo_ativo=True,
+    ).order_by().values('pk')[:1]
+
+
+def _visitantes_recentes():
+    return Visitante.objects.order_by('-data_acesso')[:50]
+
+
+def _usuarios_por_matricula():
+    return (
+        UniFiUser.objects.filter(matricula__in=['000001', '000002', '000003'])
+        .order_by('id')
+        .values_list('id', 'matricula', 'import_hash', 'ativo')
+    )
+
+
+def _usuario_por_mac():
+    return UniFiUser.objects.filter(dispositivos__mac_address=MAC_EXEMPLO, ativo=True)[:1]
+
+
+def _visitantes_expirados():
+    return (
+        Visitante.objects.filter(autorizado=True, autorizado_ate__lte=timezone.now())
+        .order_by('autorizado_ate')
+        .values_list('id', 'ip_address')[:500]
+    )
+
+
+CONSULTAS_QUENTES = [
+    ConsultaQuente('check_auth_status', 'Visitante autorizado pelo IP (auth_status_cache)', _check_auth_status, False),
+    ConsultaQuente('dispositivo_ativo_por_mac', 'MAC já ativo em outro dispositivo de visitante',
+                   _dispositivo_ativo_por_mac, False),
+    ConsultaQuente('visitantes_recentes', 'Visitantes por data de acesso mais recente', _visitantes_recentes, True),
+    ConsultaQuente('usuarios_por_matricula', 'Usuários existentes na importação', _usuarios_por_matricula, False),
+    ConsultaQuente('usuario_por_mac', 'Servidor ativo dono do MAC (FreeRADIUS)', _usuario_por_mac, False),
+    ConsultaQuente('visitantes_expirados', 'Lote de visitantes vencidos (expire_visitors)',
+                   _visitantes_expirados, True),
+]
+
+
+def explicar(queryset) -> List[dict]:
+    """Plano de execução da consulta como uma lista de linhas (dicionários)."""
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'mysql':
+        prefixo = 'EXPLAIN '
+    elif connection.vendor == 'sqlite':
+        prefixo = 'EXPLAIN QUERY PLAN '
+    else:
+        raise NotImplementedError(f'Auditoria de planos não suportada para o banco {connection.vendor}')
+
+    with connection.cursor() as cursor:
+        cursor.execute(prefixo + sql, params)
+        colunas = [coluna[0] for coluna in cursor.description]
+        return [dict(zip(colunas, linha)) for linha in cursor.fetchall()]
+
+
+def _problemas_mysql(plano: List[dict], ordenada: bool) -> List[str]:
+    problemas = []
+    for linha in plano:
+        tabela, tipo, extra = linha.get('table'), linha.get('type'), linha.get('Extra') or ''
+        if tipo == 'ALL':
+            problemas.append(f'varredura completa da tabela {tabela}')
+        elif tipo == 'index' and not ordenada:
+            problemas.append(f"varredura completa do índice {linha.get('key')} de {tabela}")
+        if ordenada and 'Using filesort' in extra:
+            problemas.append(f'ordenação sem índice (filesort) em {tabela}')
+    return problemas
+
+
+def _problemas_sqlite(plano: List[dict], ordenada: bool) -> List[str]:
+    problemas = []
+    for linha in plano:
+        detalhe = linha.get('detail', '')
+        if detalhe.startswith('SCAN'):
+            if ' USING ' not in detalhe:
+                problemas.append(f'varredura completa: {detalhe}')
+            elif not ordenada:
+                problemas.append(f'varredura completa do índice: {detalhe}')
+        if ordenada and 'TEMP B-TREE FOR ORDER BY' in detalhe:
+            problemas.append(f'ordenação sem índice: {detalhe}')
+    return problemas
+
+
+def problemas_do_plano(plano: List[dict], ordenada: bool = False) -> List[str]:
+    """Varreduras completas e ordenações sem índice encontradas no plano."""
+    if connection.vendor == 'mysql':
+        return _problemas_mysql(plano, ordenada)
+    return _problemas_sqlite(plano, ordenada)
+
+
+def auditar(nomes=None) -> List[ResultadoPlano]:
+    """Executa o EXPLAIN das consultas quentes (todas ou apenas `nomes`)."""
+    resultados = []
+    for consulta in CONSULTAS_QUENTES:
+        if nomes and consulta.nome not in nomes:
+            continue
+        plano = explicar(consulta.montar())
+        resultados.append(ResultadoPlano(consulta, plano, problemas_do_plano(plano, consulta.ordenada)))
+    return resultados
+
+
+def resumir_plano(plano: List[dict]) -> str:
+    """Uma linha por etapa do plano: tabela, tipo de acesso e índice (MySQL) ou o detalhe (SQLite)."""
+    if connection.vendor == 'mysql':
+        return '; '.join(
+            f"{linha.get('table')}: {linha.get('type')} {linha.get('key') or '-'}"
+            + (f" ({linha['Extra']})" if linha.get('Extra') else '')
+            for linha in plano
+        )
+    return '; '.join(linha.get('detail', '') for linha in plano)
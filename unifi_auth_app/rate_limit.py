@@ -0,0 +1,142 @@
+"""
+Limitação de taxa das APIs públicas do portal de visitantes.
+
+Cada requisição às URLs configuradas em PORTAL_RATE_LIMITS é contada por IP
+do cliente e, quando o corpo informa um MAC, também por MAC. O contador e a
+métrica usam o prefixo configurado, não o caminho da requisição: variar o
+final da URL não gera um novo orçamento nem um novo rótulo no Prometheus. Os contadores
+ficam no cache do Django (compartilhado entre os workers do gunicorn) e usam
+janela deslizante aproximada: o contador da janela atual somado à fração
+restante do contador da janela anterior.
+
+Requisições acima do limite recebem 429 com o cabeçalho Retry-After e não
+chegam às views, protegendo o controlador UniFi de rajadas.
+"""
+import json
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .client_ip import get_client_ip
+from .metrics import track_rate_limit_rejection
+from .models import format_mac_address
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Limites padrão por URL: {escopo: (requisições, janela em segundos)}
+DEFAULT_RATE_LIMITS = {
+    '/api/authorize-visitor/': {'ip': (10, 60), 'mac': (5, 60)},
+    '/api/authorize-guest/': {'ip': (10, 60), 'mac': (5, 60)},
+    '/api/check-auth/': {'ip': (60, 60)},
+}
+
+# Campos do corpo JSON em que as APIs recebem o MAC do cliente
+MAC_FIELDS = ('mac_address', 'client_mac')
+
+
+def get_client_mac(request):
+    """MAC informado no corpo JSON da requisição, normalizado, ou None."""
+    if request.method != 'POST' or 'json' not in (request.content_type or ''):
+        return None
+    try:
+        dados = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(dados, dict):
+        return None
+    for campo in MAC_FIELDS:
+        if dados.get(campo):
+            try:
+                return format_mac_address(str(dados[campo]))
+            except ValidationError:
+                return None
+    return None
+
+
+def contar(chave: str, limite: int, janela: int):
+    """
+    Registra uma requisição e verifica o limite na janela deslizante.
+
+    Returns:
+        tuple: (permitido, segundos até liberar)
+    """
+    agora = time.time()
+    indice = int(agora // janela)
+    atual_key = f'ratelimit:{chave}:{indice}'
+    anterior_key = f'ratelimit:{chave}:{indice - 1}'
+
+    cache.add(atual_key, 0, timeout=janela * 2)
+    atual = cache.incr(atual_key)
+    anterior = cache.get(anterior_key) or 0
+
+    decorrido = (agora % janela) / janela
+    estimado = anterior * (1 - decorrido) + atual
+    if estimado <= limite:
+        return True, 0
+
+    # Tempo até o peso da janela anterior cair o suficiente (ou a janela virar)
+    if anterior and atual <= limite:
+        espera = ((anterior * (1 - decorrido) + atual - limite) / anterior) * janela
+    else:
+        espera = janela - (agora % janela)
+    return False, max(1, math.ceil(espera))
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Middleware que limita a taxa de requisições às APIs públicas do portal.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.limites = getattr(settings, 'PORTAL_RATE_LIMITS', DEFAULT_RATE_LIMITS)
+
+    def process_request(self, request):
+        prefixo, limites = self._limites_para(request.path)
+        if not limites or request.method == 'OPTIONS':
+            return None
+
+        identificadores = {'ip': get_client_ip(request)}
+        if 'mac' in limites:
+            identificadores['mac'] = get_client_mac(request)
+
+        for escopo, (limite, janela) in limites.items():
+            identificador = identificadores.get(escopo)
+            if not identificador:
+                continue
+            try:
+                permitido, espera = contar(f'{escopo}:{identificador}:{prefixo}', limite, janela)
+            except Exception as e:
+                # Falha no cache não deve derrubar o portal
+                logger.warning(f"Limitador de taxa indisponível: {str(e)}")
+                return None
+
+            if not permitido:
+                track_rate_limit_rejection(prefixo, escopo)
+                logger.warning(
+                    f"Limite de requisições excedido em {request.path} por {escopo} {identificador}"
+                )
+                response = JsonResponse(
+                    {
+                        'success': False,
+                        'error': 'Muitas requisições. Aguarde alguns instantes e tente novamente.',
+                    },
+                    status=429
+                )
+                response['Retry-After'] = str(espera)
+                response['Access-Control-Allow-Origin'] = '*'
+                return response
+
+        return None
+
+    def _limites_para(self, path):
+        """Prefixo configurado que cobre o caminho e os limites dele, ou (None, None)."""
+        for prefixo, limites in self.limites.items():
+            if path.startswith(prefixo):
+                return prefixo, limites
+        return None, None
@@ -1,55 +1,139 @@
 """
 Middleware para medir e registrar o tempo de resposta das requisições.
+
+Cada requisição alimenta o histograma portal_request_latency_seconds, por
+view (url_name), método e classe do status. O tempo gasto em consultas ao
+banco e em chamadas ao UniFi Controller é acumulado em um contextvar durante
+a requisição e publicado em histogramas separados; opcionalmente os três
+tempos vão no cabeçalho Server-Timing.
 """
 import time
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
 from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics
 
 logger = logging.getLogger('performance')
 
-class RequestTimingMiddleware:
+# Tempos acumulados da requisição em andamento: {'db': segundos, 'unifi': segundos}
+_tempos: ContextVar[Optional[dict]] = ContextVar('request_timing_tempos', default=None)
+
+# Métodos HTTP usados como label; outros viram 'OTHER' para limitar a cardinalidade
+METODOS_CONHECIDOS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'})
+
+
+def registrar_tempo(componente: str, duracao: float) -> None:
+    """Soma `duracao` ao componente (db/unifi) da requisição em andamento, se houver."""
+    tempos = _tempos.get()
+    if tempos is not None:
+        tempos[componente] = tempos.get(componente, 0.0) + duracao
+
+
+@contextmanager
+def medir(componente: str):
+    """Mede o bloco e soma o tempo ao componente da requisição em andamento."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_tempo(componente, time.perf_counter() - inicio)
+
+
+def _medir_query(execute, sql, params, many, context):
+    """execute_wrapper que soma o tempo de cada consulta ao componente 'db'."""
+    if _tempos.get() is None:
+        return execute(sql, params, many, context)
+    with medir('db'):
+        return execute(sql, params, many, context)
+
+
+def _instalar_medicao_db(sender, connection, **kwargs):
+    if _medir_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_query)
+
+
+connection_created.connect(_instalar_medicao_db, dispatch_uid='request_timing_db')
+
+
+class RequestTimingMiddleware(MiddlewareMixin):
     """
     Middleware para medir e registrar o tempo de resposta das requisições.
+    Usa os hooks do MiddlewareMixin para funcionar tanto em WSGI quanto em ASGI.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        # Ignora requisições estáticas e de admin por padrão
-        if self._should_skip_request(request):
-            return self.get_response(request)
-        
-        # Inicia o timer
-        start_time = time.time()
-        
-        # Processa a requisição
-        response = self.get_response(request)
-        
+    def process_request(self, request):
+        # Ignora requisições estáticas por padrão
+        if not self._should_skip_request(request):
+            # Inicia o timer
+            request._request_timing_start = time.perf_counter()
+            request._request_timing_tempos = {}
+            _tempos.set(request._request_timing_tempos)
+
+    def process_response(self, request, response):
+        start_time = getattr(request, '_request_timing_start', None)
+        if start_time is None:
+            return response
+
         # Calcula o tempo de resposta
-        total_time = time.time() - start_time
-        
+        total_time = time.perf_counter() - start_time
+        tempos = request._request_timing_tempos
+        _tempos.set(None)
+        db_time = tempos.get('db', 0.0)
+        unifi_time = tempos.get('unifi', 0.0)
+
+        url_name = self._url_name(request)
+        metrics.track_request_timing(
+            url_name=url_name,
+            method=request.method if request.method in METODOS_CONHECIDOS else 'OTHER',
+            status_class=f"{response.status_code // 100}xx",
+            total=total_time,
+            db=db_time,
+            controller=unifi_time,
+        )
+
         # Registra o tempo de resposta se for maior que o limiar configurado
         slow_request_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0)  # 1 segundo por padrão
-        
+
         if total_time > slow_request_threshold:
             logger.warning(
-                'Slow request: %s %s (%.2f seconds)',
+                'Slow request: %s %s (%.2f seconds, db %.2f, unifi %.2f)',
                 request.method,
                 request.path,
                 total_time,
+                db_time,
+                unifi_time,
                 extra={
                     'request': request,
                     'total_time': total_time,
                     'status_code': response.status_code,
                 }
             )
-        
+
         # Adiciona o tempo de resposta no cabeçalho para depuração
         if getattr(settings, 'SHOW_REQUEST_TIME_HEADER', False):
             response['X-Request-Time'] = f"{total_time:.2f}s"
-        
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', False):
+            response['Server-Timing'] = (
+                f"total;dur={total_time * 1000:.1f}, "
+                f"db;dur={db_time * 1000:.1f}, "
+                f"unifi;dur={unifi_time * 1000:.1f}"
+            )
+
         return response
-    
+
+    def _url_name(self, request):
+        """Nome da rota resolvida (com namespace), ou 'unmatched' se nenhuma rota casou."""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route or 'unnamed'
+
     def _should_skip_request(self, request):
         """
         Verifica se a requisição deve ser ignorada pelo middleware.
@@ -60,7 +144,6 @@ class RequestTimingMiddleware:
             '/media/',
             '/favicon.ico',
             '/__debug__/',
-            '/admin/',
         ]
-        
+
         return any(request.path.startswith(path) for path in ignored_paths)
@@ -1,9 +1,12 @@
 import os
 import logging
-from django.db.models.signals import post_save, pre_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Dispositivo, VisitanteDispositivo, UniFiUser
+from .models import Dispositivo, VisitanteDispositivo, UniFiUser, Visitante
+from .whitelist_outbox import enfileirar_adicao, enfileirar_remocao
+from .auth_status_cache import invalidar_ip
 from django.utils.timezone import now
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -29,14 +32,13 @@ UNIFI_CONFIGURED = all([
 if UNIFI_CONFIGURED:
     try:
         from .unifi_api import UniFiControllerAPI
-        
-        # Nome da rede Wi-Fi para a qual os dispositivos serão adicionados à whitelist
-        UNIFI_SSID = os.getenv('UNIFI_SSID')
-        
     except ImportError:
         logger.warning("Módulo unifi_api não encontrado. A integração com o UniFi será desativada.")
         UNIFI_CONFIGURED = False
 
+# Nome da rede Wi-Fi para a qual os dispositivos serão adicionados à whitelist
+UNIFI_SSID = settings.UNIFI_SSID
+
 def get_unifi_api():
     """Retorna uma instância da API do UniFi configurada."""
     if not UNIFI_CONFIGURED:
@@ -143,72 +145,73 @@ def cadastrar_no_unifi(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Dispositivo)
 def adicionar_dispositivo_unifi(sender, instance, created, **kwargs):
     """
-    Adiciona o endereço MAC de um dispositivo à whitelist do UniFi quando o dispositivo é salvo.
+    Enfileira a adição do endereço MAC de um dispositivo à whitelist do UniFi quando o dispositivo é salvo.
     """
     if created or kwargs.get('update_fields') is None:  # Se for uma criação ou atualização completa
         logger.info(f"Dispositivo salvo: {instance.mac_address} (Usuário: {instance.usuario.nome})")
-        
-        # Adiciona o MAC à whitelist do UniFi
-        adicionar_mac_a_whitelist(instance.mac_address)
+
+        if not UNIFI_CONFIGURED:
+            logger.warning("Integração com UniFi não está configurada. Ignorando adição de MAC à whitelist.")
+            return
+
+        # O worker whitelist_outbox_worker aplica a alteração no controlador
+        enfileirar_adicao(instance.mac_address, UNIFI_SSID)
 
 @receiver(post_save, sender=VisitanteDispositivo)
 def adicionar_visitante_dispositivo_unifi(sender, instance, created, **kwargs):
     """
-    Adiciona o endereço MAC de um dispositivo de visitante à whitelist do UniFi quando o dispositivo é salvo.
+    Enfileira a adição do endereço MAC de um dispositivo de visitante à whitelist do UniFi quando o dispositivo é salvo.
     """
     if (created or kwargs.get('update_fields') is None) and instance.visitante_dispositivo_ativo:
         logger.info(f"Dispositivo de visitante salvo: {instance.visitante_mac_address} (Visitante: {instance.visitante.nome})")
-        
-        # Adiciona o MAC à whitelist do UniFi
-        adicionar_mac_a_whitelist(instance.visitante_mac_address)
+
+        if not UNIFI_CONFIGURED:
+            logger.warning("Integração com UniFi não está configurada. Ignorando adição de MAC à whitelist.")
+            return
+
+        enfileirar_adicao(instance.visitante_mac_address, settings.UNIFI_SSID_VISITANTES)
 
 @receiver(pre_delete, sender=VisitanteDispositivo)
 def remover_visitante_dispositivo_unifi(sender, instance, **kwargs):
     """
-    Remove o endereço MAC de um dispositivo de visitante da whitelist do UniFi quando o dispositivo é excluído.
+    Enfileira a remoção do endereço MAC de um dispositivo de visitante da whitelist do UniFi quando o dispositivo é excluído.
     """
     if instance.visitante_dispositivo_ativo and instance.visitante_mac_address:
         logger.info(f"Dispositivo de visitante removido: {instance.visitante_mac_address} (Visitante: {instance.visitante.nome})")
-        
-        try:
-            # Usa o SSID específico para visitantes, ou o padrão se não estiver configurado
-            ssid_visitantes = getattr(settings, 'UNIFI_SSID_VISITANTES', 'Câmara')
-            
-            api = get_unifi_api()
-            if api:
-                resposta = api.remove_mac_from_ssid_whitelist(
-                    instance.visitante_mac_address, 
-                    ssid_name=ssid_visitantes
-                )
-                logger.info(f"[UNI-FI] Dispositivo {instance.visitante_mac_address} removido da whitelist do SSID '{ssid_visitantes}': {resposta}")
-        except Exception as e:
-            logger.error(f"[ERRO UNI-FI] Falha ao remover dispositivo {instance.visitante_mac_address}: {e}")
+
+        if not UNIFI_CONFIGURED:
+            return
+
+        enfileirar_remocao(instance.visitante_mac_address, settings.UNIFI_SSID_VISITANTES)
 
 @receiver(pre_delete, sender=UniFiUser)
 def remover_dispositivos_usuario_unifi(sender, instance, **kwargs):
     """
-    Remove todos os endereços MAC associados a um usuário da whitelist do UniFi quando o usuário é excluído.
+    Enfileira a remoção de todos os endereços MAC associados a um usuário da whitelist do UniFi quando o usuário é excluído.
     """
-    try:
-        # Obtém o SSID da configuração
-        ssid = getattr(settings, 'UNIFI_SSID', 'Câmara')
-        api = get_unifi_api()
-        
-        if not api:
-            logger.warning("API do UniFi não disponível. Não foi possível remover dispositivos do usuário.")
-            return
-            
-        # Remove cada dispositivo do usuário da whitelist
-        for dispositivo in instance.dispositivos.all():
-            try:
-                logger.info(f"Removendo dispositivo {dispositivo.mac_address} do usuário {instance.nome} da whitelist...")
-                resposta = api.remove_mac_from_ssid_whitelist(
-                    dispositivo.mac_address,
-                    ssid_name=ssid
-                )
-                logger.info(f"[UNI-FI] Dispositivo {dispositivo.mac_address} removido da whitelist do SSID '{ssid}': {resposta}")
-            except Exception as e:
-                logger.error(f"[ERRO UNI-FI] Falha ao remover dispositivo {dispositivo.mac_address}: {e}")
-                
-    except Exception as e:
-        logger.error(f"[ERRO UNI-FI] Erro ao processar remoção de dispositivos do usuário {instance.nome}: {e}")
+    if not UNIFI_CONFIGURED:
+        logger.warning("API do UniFi não disponível. Não foi possível remover dispositivos do usuário.")
+        return
+
+    for mac_address in instance.dispositivos.values_list('mac_address', flat=True):
+        logger.info(f"Removendo dispositivo {mac_address} do usuário {instance.nome} da whitelist...")
+        enfileirar_remocao(mac_address, UNIFI_SSID)
+
+@receiver(post_init, sender=Visitante)
+def guardar_ip_anterior_visitante(sender, instance, **kwargs):
+    """
+    Guarda o IP carregado do banco para invalidar também o cache dele se o IP mudar.
+
+    Lê o __dict__ para não disparar uma consulta quando ip_address foi adiado (.only()/.defer()).
+    """
+    instance._ip_anterior = instance.__dict__.get('ip_address')
+
+@receiver(post_save, sender=Visitante)
+@receiver(post_delete, sender=Visitante)
+def invalidar_cache_autorizacao_visitante(sender, instance, **kwargs):
+    """
+    Invalida o cache de autorização por IP usado por check_auth_status após o commit.
+    """
+    ips = (instance.ip_address, getattr(instance, '_ip_anterior', None))
+    instance._ip_anterior = instance.ip_address
+    transaction.on_commit(lambda: invalidar_ip(*ips))
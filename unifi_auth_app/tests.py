@@ -1,3 +1,1294 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import SkipTest, mock
 
-# Create your tests here.
+import requests
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .audit_pipeline import AuditListener, AuditQueueHandler, JsonLinesSink, montar_evento
+from .audit_store import AuditEventSink, consultar_eventos, purgar_eventos
+from .auth_status_cache import visitante_autorizado_por_ip
+from .client_snapshot import CACHE_KEY, NEGATIVE_KEY_PREFIX, REFRESH_LOCK_KEY, ClientSnapshot, ClientSnapshotService
+from .importacao_usuarios import importar_usuarios, normalizar_matricula
+from .mac_authorization import AuthorizedMacSet
+from .mac_index import MacIndex, int_to_mac, mac_to_int
+from .mac_snapshot import TIPO_STAFF, TIPO_VISITANTE, MacSnapshotEntry, MacSnapshotReader, gravar_snapshot
+from .mac_utils import MacInvalido, mac_para_int, normalizar_mac, normalizar_macs
+from . import auth_status_cache, visitante_expiracao, whitelist_reconcile
+from .models import (
+    AuditEvent, Dispositivo, UniFiUser, Visitante, VisitanteDispositivo, WhitelistLock, WhitelistOutbox,
+    format_mac_address,
+)
+from .rate_limit import RateLimitMiddleware
+from .unifi_resilience import CallDeadlineExceeded, CircuitBreaker, CircuitOpenError, send_with_resilience
+from .unifi_session import ControllerSession
+from .visitante_expiracao import expirar_autorizacoes
+from .whitelist_mutation import WhitelistConflictError, WhitelistLockTimeout, WhitelistMutator, ssid_lock
+from .whitelist_outbox import enfileirar_adicao, enfileirar_remocao, processar_pendentes, remover_concluidos
+from .whitelist_reconcile import reconciliar
+
+FAKE_CONTROLLER = Path(__file__).resolve().parent.parent / 'scripts' / 'fake_unifi_controller.py'
+
+
+class FakeWhitelistAPI:
+    """Registra as chamadas a apply_whitelist_changes; falha nos SSIDs de `falhar`."""
+
+    def __init__(self, falhar=()):
+        self.falhar = set(falhar)
+        self.chamadas = []
+
+    def apply_whitelist_changes(self, ssid, add=(), remove=()):
+        self.chamadas.append((ssid, set(add), set(remove)))
+        if ssid in self.falhar:
+            raise ConnectionError(f'controlador indisponível para {ssid}')
+
+
+@override_settings(WHITELIST_OUTBOX_BACKOFF_BASE=5, WHITELIST_OUTBOX_BACKOFF_MAX=600,
+                   WHITELIST_OUTBOX_MAX_TENTATIVAS=3)
+class WhitelistOutboxTests(TestCase):
+    """Transições de estado da fila: pendente -> concluído, nova tentativa e falhou."""
+
+    def setUp(self):
+        self.mac = 'aa:bb:cc:dd:ee:01'
+
+    def test_enfileirar_grava_pendente_com_mac_em_maiusculas(self):
+        item = enfileirar_adicao(self.mac, 'Câmara')
+
+        self.assertEqual(item.status, WhitelistOutbox.STATUS_PENDENTE)
+        self.assertEqual(item.mac_address, 'AA:BB:CC:DD:EE:01')
+        self.assertEqual(item.tentativas, 0)
+        self.assertIsNone(enfileirar_adicao('', 'Câmara'))
+
+    def test_sucesso_marca_concluido(self):
+        item = enfileirar_adicao(self.mac, 'Câmara')
+        api = FakeWhitelistAPI()
+
+        self.assertEqual(processar_pendentes(api=api), (1, 0))
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, WhitelistOutbox.STATUS_CONCLUIDO)
+        self.assertEqual(item.tentativas, 1)
+        self.assertIsNotNone(item.processado_em)
+        self.assertEqual(item.ultimo_erro, '')
+        self.assertEqual(api.chamadas, [('Câmara', {'AA:BB:CC:DD:EE:01'}, set())])
+
+    def test_uma_escrita_por_ssid(self):
+        enfileirar_adicao(self.mac, 'Câmara')
+        enfileirar_remocao('aa:bb:cc:dd:ee:02', 'Câmara')
+        enfileirar_adicao('aa:bb:cc:dd:ee:03', 'Visitantes')
+        api = FakeWhitelistAPI()
+
+        self.assertEqual(processar_pendentes(api=api), (3, 0))
+        self.assertEqual(sorted(api.chamadas, key=lambda c: c[0]), [
+            ('Câmara', {'AA:BB:CC:DD:EE:01'}, {'AA:BB:CC:DD:EE:02'}),
+            ('Visitantes', {'AA:BB:CC:DD:EE:03'}, set()),
+        ])
+
+    def test_ignora_itens_ainda_nao_vencidos_e_concluidos(self):
+        futuro = enfileirar_adicao(self.mac, 'Câmara')
+        futuro.proxima_tentativa = timezone.now() + timedelta(minutes=5)
+        futuro.save()
+        WhitelistOutbox.objects.create(
+            mac_address='AA:BB:CC:DD:EE:02', ssid='Câmara',
+            operacao=WhitelistOutbox.OPERACAO_ADICIONAR, status=WhitelistOutbox.STATUS_CONCLUIDO,
+        )
+        api = FakeWhitelistAPI()
+
+        self.assertEqual(processar_pendentes(api=api), (0, 0))
+        self.assertEqual(api.chamadas, [])
+
+    def test_falha_agenda_nova_tentativa_com_backoff(self):
+        item = enfileirar_adicao(self.mac, 'Câmara')
+        antes = timezone.now()
+
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI(falhar={'Câmara'})), (0, 1))
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, WhitelistOutbox.STATUS_PENDENTE)
+        self.assertEqual(item.tentativas, 1)
+        self.assertIn('controlador indisponível', item.ultimo_erro)
+        self.assertIsNone(item.processado_em)
+        self.assertGreaterEqual(item.proxima_tentativa, antes + timedelta(seconds=5))
+
+        # Antes do backoff vencer o item não é reprocessado
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI()), (0, 0))
+
+        # Segunda falha dobra a espera
+        item.proxima_tentativa = timezone.now()
+        item.save()
+        antes = timezone.now()
+        processar_pendentes(api=FakeWhitelistAPI(falhar={'Câmara'}))
+        item.refresh_from_db()
+        self.assertEqual(item.tentativas, 2)
+        self.assertGreaterEqual(item.proxima_tentativa, antes + timedelta(seconds=10))
+
+    def test_nova_tentativa_bem_sucedida_conclui(self):
+        item = enfileirar_adicao(self.mac, 'Câmara')
+        processar_pendentes(api=FakeWhitelistAPI(falhar={'Câmara'}))
+        WhitelistOutbox.objects.filter(pk=item.pk).update(proxima_tentativa=timezone.now())
+
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI()), (1, 0))
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, WhitelistOutbox.STATUS_CONCLUIDO)
+        self.assertEqual(item.tentativas, 2)
+        self.assertEqual(item.ultimo_erro, '')
+
+    def test_desiste_apos_max_tentativas(self):
+        item = enfileirar_adicao(self.mac, 'Câmara')
+        WhitelistOutbox.objects.filter(pk=item.pk).update(tentativas=2)
+
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI(falhar={'Câmara'})), (0, 1))
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, WhitelistOutbox.STATUS_FALHOU)
+        self.assertEqual(item.tentativas, 3)
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI()), (0, 0))
+
+    def test_falha_em_um_ssid_nao_afeta_outro(self):
+        camara = enfileirar_adicao(self.mac, 'Câmara')
+        visitantes = enfileirar_adicao('aa:bb:cc:dd:ee:02', 'Visitantes')
+
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI(falhar={'Visitantes'})), (1, 1))
+
+        camara.refresh_from_db()
+        visitantes.refresh_from_db()
+        self.assertEqual(camara.status, WhitelistOutbox.STATUS_CONCLUIDO)
+        self.assertEqual(visitantes.status, WhitelistOutbox.STATUS_PENDENTE)
+
+    def test_limite_do_lote(self):
+        for final in range(5):
+            enfileirar_adicao(f'aa:bb:cc:dd:ee:0{final}', 'Câmara')
+
+        self.assertEqual(processar_pendentes(api=FakeWhitelistAPI(), limite=2), (2, 0))
+        self.assertEqual(
+            WhitelistOutbox.objects.filter(status=WhitelistOutbox.STATUS_PENDENTE).count(), 3
+        )
+
+    def test_remover_concluidos_antigos(self):
+        antigo = enfileirar_adicao(self.mac, 'Câmara')
+        recente = enfileirar_adicao('aa:bb:cc:dd:ee:02', 'Câmara')
+        processar_pendentes(api=FakeWhitelistAPI())
+        WhitelistOutbox.objects.filter(pk=antigo.pk).update(processado_em=timezone.now() - timedelta(days=10))
+
+        self.assertEqual(remover_concluidos(7), 1)
+        self.assertFalse(WhitelistOutbox.objects.filter(pk=antigo.pk).exists())
+        self.assertTrue(WhitelistOutbox.objects.filter(pk=recente.pk).exists())
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class WhitelistMutatorTests(TestCase):
+    """WhitelistMutator contra o simulador do controlador (scripts/fake_unifi_controller.py)."""
+
+    ssid = 'Teste'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if shutil.which('openssl') is None:
+            raise SkipTest('openssl necessário para o certificado do simulador')
+        # Um CA bundle no ambiente faria o requests verificar o certificado autoassinado
+        ambiente = mock.patch.dict(os.environ)
+        ambiente.start()
+        cls.addClassCleanup(ambiente.stop)
+        os.environ.pop('REQUESTS_CA_BUNDLE', None)
+        os.environ.pop('CURL_CA_BUNDLE', None)
+
+        porta = _porta_livre()
+        cls.processo = subprocess.Popen(
+            [sys.executable, str(FAKE_CONTROLLER), '--port', str(porta), '--clientes', '0', '--ssid', cls.ssid],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        cls.addClassCleanup(cls._encerrar_simulador)
+        cls.base_url = f'https://127.0.0.1:{porta}'
+        limite = time.monotonic() + 15
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', porta), timeout=0.5).close()
+                break
+            except OSError:
+                if cls.processo.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError('Simulador do UniFi Controller não iniciou')
+                time.sleep(0.1)
+
+    @classmethod
+    def _encerrar_simulador(cls):
+        cls.processo.terminate()
+        cls.processo.wait(timeout=5)
+
+    def setUp(self):
+        requests.post(f'{self.base_url}/__reset', verify=False, timeout=5)
+        self.session = ControllerSession(self.base_url, 'admin', 'senha')
+        self.mutator = WhitelistMutator(self.session, self.base_url, 'default')
+        # Começa cada teste com a whitelist vazia
+        self.mutator.write(self.mutator.fetch(self.ssid)['_id'], [])
+
+    def tearDown(self):
+        self.session.session.close()
+
+    def _whitelist(self):
+        return self.mutator.fetch(self.ssid)['mac_filter_list']
+
+    def _escritas(self):
+        estatisticas = requests.get(f'{self.base_url}/__stats', verify=False, timeout=5).json()['data']
+        return sum(n for chave, n in estatisticas['requests'].items() if chave.startswith('PUT '))
+
+    def test_adicoes_sao_mescladas_com_a_lista_atual(self):
+        self.mutator.apply(self.ssid, add={'aa:bb:cc:dd:ee:01', 'AA:BB:CC:DD:EE:02'})
+        self.mutator.apply(self.ssid, add={'aa:bb:cc:dd:ee:03'})
+
+        self.assertEqual(self._whitelist(), ['AA:BB:CC:DD:EE:01', 'AA:BB:CC:DD:EE:02', 'AA:BB:CC:DD:EE:03'])
+
+    def test_remocao_preserva_os_demais(self):
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:01', 'AA:BB:CC:DD:EE:02'})
+
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:03'}, remove={'aa:bb:cc:dd:ee:01'})
+
+        self.assertEqual(self._whitelist(), ['AA:BB:CC:DD:EE:02', 'AA:BB:CC:DD:EE:03'])
+
+    def test_mac_nos_dois_conjuntos_e_removido(self):
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:01'})
+
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:01'}, remove={'AA:BB:CC:DD:EE:01'})
+
+        self.assertEqual(self._whitelist(), [])
+
+    def test_preserva_alteracao_feita_por_outro_escritor(self):
+        # Outro escritor (interface do controlador) grava entre duas chamadas
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:01'})
+        self.mutator.write(self.mutator.fetch(self.ssid)['_id'], ['AA:BB:CC:DD:EE:01', 'AA:BB:CC:DD:EE:09'])
+
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:02'})
+
+        self.assertEqual(self._whitelist(), ['AA:BB:CC:DD:EE:01', 'AA:BB:CC:DD:EE:02', 'AA:BB:CC:DD:EE:09'])
+
+    def test_lista_ja_atualizada_nao_grava(self):
+        self.mutator.apply(self.ssid, add={'AA:BB:CC:DD:EE:01'})
+        escritas = self._escritas()
+
+        resultado, _ = self.mutator.apply(self.ssid, add={'aa:bb:cc:dd:ee:01'}, remove={'AA:BB:CC:DD:EE:05'})
+
+        self.assertEqual(resultado, {'msg': 'Whitelist já está atualizada'})
+        self.assertEqual(self._escritas(), escritas)
+
+    def test_whitelist_normalizada(self):
+        self.mutator.write(self.mutator.fetch(self.ssid)['_id'], ['aa:bb:cc:dd:ee:01', 'AA:BB:CC:DD:EE:02'])
+
+        self.assertEqual(self.mutator.whitelist(self.ssid), {'AA:BB:CC:DD:EE:01', 'AA:BB:CC:DD:EE:02'})
+
+    def test_ssid_inexistente(self):
+        with self.assertRaisesMessage(Exception, "SSID 'Outro' não encontrado"):
+            self.mutator.apply('Outro', add={'AA:BB:CC:DD:EE:01'})
+
+
+class SsidLockTests(TestCase):
+    """Espera limitada pelo lock de escrita do SSID."""
+
+    def _lock_ocupado(self, falhas):
+        """Simula o NOWAIT falhando enquanto outro escritor segura a linha."""
+        original = WhitelistLock.objects.select_for_update
+        tentativas = []
+
+        def select_for_update(**kwargs):
+            self.assertTrue(kwargs.get('nowait'))
+            tentativas.append(kwargs)
+            if len(tentativas) <= falhas:
+                raise OperationalError('could not obtain lock')
+            return original(**kwargs)
+
+        return mock.patch.object(WhitelistLock.objects, 'select_for_update', side_effect=select_for_update), tentativas
+
+    @mock.patch('unifi_auth_app.whitelist_mutation.LOCK_POLL_INTERVAL', 0.01)
+    def test_obtem_o_lock_quando_o_dono_libera(self):
+        patch, tentativas = self._lock_ocupado(falhas=2)
+        with patch:
+            with ssid_lock('Câmara', lock_wait=5):
+                pass
+        self.assertEqual(len(tentativas), 3)
+
+    @mock.patch('unifi_auth_app.whitelist_mutation.LOCK_POLL_INTERVAL', 0.01)
+    def test_desiste_apos_lock_wait(self):
+        patch, _ = self._lock_ocupado(falhas=10 ** 6)
+        inicio = time.monotonic()
+        with patch, self.assertRaises(WhitelistLockTimeout):
+            with ssid_lock('Câmara', lock_wait=0.1):
+                self.fail('Bloco executado sem o lock')
+        self.assertLess(time.monotonic() - inicio, 2)
+
+    @override_settings(WHITELIST_LOCK_WAIT=0)
+    def test_timeout_e_um_conflito_da_whitelist(self):
+        patch, _ = self._lock_ocupado(falhas=1)
+        with patch, self.assertRaises(WhitelistConflictError):
+            with ssid_lock('Câmara'):
+                pass
+
+
+class ImportacaoUsuariosTests(TestCase):
+    """Importação de servidores: hash, reativação, ausentes e matrículas do .xls."""
+
+    def setUp(self):
+        self.api = FakeWhitelistAPI()
+
+    def _importar(self, linhas, **kwargs):
+        return importar_usuarios(linhas, api=self.api, **kwargs)
+
+    def test_matricula_numerica_do_xls_igual_a_do_csv(self):
+        self.assertEqual(normalizar_matricula(12345.0), '12345')
+        self.assertEqual(normalizar_matricula(12345), '12345')
+        self.assertEqual(normalizar_matricula(' 12345.0 '), '12345')
+        self.assertEqual(normalizar_matricula('00123'), '00123')
+
+        self._importar([[12345.0, 'Fulano', 'DEPARTAMENTO DE TI', 'EFETIVOS']])
+        resultado = self._importar([['12345', 'Fulano', 'DEPARTAMENTO DE TI', 'EFETIVOS']])
+
+        self.assertEqual(resultado.inalterados, 1)
+        self.assertEqual(resultado.criados, 0)
+        self.assertEqual(list(UniFiUser.objects.values_list('matricula', flat=True)), ['12345'])
+
+    def test_linha_sem_alteracao_nao_grava(self):
+        linhas = [['1', 'Fulano', 'DEPARTAMENTO DE TI', 'EFETIVOS'], ['2', 'Beltrano', 'DTI', 'COMISSIONADOS']]
+        primeira = self._importar(linhas)
+        segunda = self._importar(linhas + [['2', 'Beltrano', 'RECURSOS HUMANOS', 'COMISSIONADOS']])
+
+        self.assertEqual((primeira.criados, primeira.atualizados), (2, 0))
+        self.assertEqual((segunda.criados, segunda.atualizados, segunda.inalterados), (0, 1, 1))
+        self.assertEqual(UniFiUser.objects.get(matricula='2').departamento, 'RH')
+
+    def test_desativa_ausentes_e_reativa_quem_volta(self):
+        self._importar([['1', 'Fulano', 'DTI', 'EFETIVOS'], ['2', 'Beltrano', 'DTI', 'EFETIVOS']])
+        beltrano = UniFiUser.objects.get(matricula='2')
+        Dispositivo.objects.create(usuario=beltrano, mac_address='AA:BB:CC:DD:EE:02', nome_dispositivo='Celular')
+
+        resultado = self._importar([['1', 'Fulano', 'DTI', 'EFETIVOS']], desativar_ausentes=True)
+
+        self.assertEqual(resultado.desativados, 1)
+        self.assertFalse(UniFiUser.objects.get(matricula='2').ativo)
+        self.assertEqual(self.api.chamadas, [(settings.UNIFI_SSID, set(), {'AA:BB:CC:DD:EE:02'})])
+
+        self.api.chamadas.clear()
+        resultado = self._importar([['1', 'Fulano', 'DTI', 'EFETIVOS'], ['2', 'Beltrano', 'DTI', 'EFETIVOS']])
+
+        self.assertEqual(resultado.reativados, 1)
+        self.assertTrue(UniFiUser.objects.get(matricula='2').ativo)
+        self.assertEqual(self.api.chamadas, [(settings.UNIFI_SSID, {'AA:BB:CC:DD:EE:02'}, set())])
+
+    def test_linha_ignorada_com_matricula_nao_desativa(self):
+        linhas = [[str(n), f'Servidor {n}', 'DTI', 'EFETIVOS'] for n in range(1, 41)]
+        self._importar(linhas)
+        linhas[0] = ['1', 'Servidor 1', 'SETOR NOVO', 'EFETIVOS']
+
+        resultado = self._importar(linhas, desativar_ausentes=True)
+
+        self.assertEqual(resultado.ignorados, 1)
+        self.assertEqual(resultado.desativados, 0)
+        self.assertTrue(UniFiUser.objects.get(matricula='1').ativo)
+
+    def test_recusa_desativar_com_muitas_linhas_ignoradas(self):
+        self._importar([['1', 'Fulano', 'DTI', 'EFETIVOS'], ['2', 'Beltrano', 'DTI', 'EFETIVOS']])
+
+        resultado = self._importar(
+            [['1', 'Fulano', 'DTI', 'EFETIVOS'], ['3', 'Sicrano', 'DTI', 'DESCONHECIDO']],
+            desativar_ausentes=True,
+        )
+
+        self.assertTrue(resultado.desativacao_recusada)
+        self.assertEqual(resultado.desativados, 0)
+        self.assertTrue(UniFiUser.objects.get(matricula='2').ativo)
+
+        resultado = self._importar(
+            [['1', 'Fulano', 'DTI', 'EFETIVOS'], ['3', 'Sicrano', 'DTI', 'DESCONHECIDO']],
+            desativar_ausentes=True, max_ignorados=0.5,
+        )
+        self.assertEqual(resultado.desativados, 1)
+
+    def test_migracao_corrige_matriculas_gravadas_com_ponto_zero(self):
+        migracao = import_module('unifi_auth_app.migrations.0023_normalizar_matricula')
+        legado = UniFiUser.objects.create(nome='Fulano', matricula='12345.0', departamento='DTI')
+        duplicado = UniFiUser.objects.create(nome='Beltrano', matricula='777.0', departamento='DTI')
+        Dispositivo.objects.create(usuario=duplicado, mac_address='AA:BB:CC:DD:EE:07', nome_dispositivo='Notebook')
+        correto = UniFiUser.objects.create(nome='Beltrano', matricula='777', departamento='DTI')
+
+        migracao.normalizar_matriculas(django_apps, None)
+
+        legado.refresh_from_db()
+        self.assertEqual(legado.matricula, '12345')
+        self.assertFalse(UniFiUser.objects.filter(pk=duplicado.pk).exists())
+        self.assertEqual(Dispositivo.objects.get(mac_address='AA:BB:CC:DD:EE:07').usuario_id, correto.pk)
+
+
+class FakeMutator:
+    """Whitelists por SSID devolvidas por WhitelistMutator.whitelist()."""
+
+    def __init__(self, whitelists):
+        self.whitelists = whitelists
+        self.leituras = []
+
+    def whitelist(self, ssid):
+        self.leituras.append(ssid)
+        if ssid not in self.whitelists:
+            raise Exception(f"SSID '{ssid}' não encontrado")
+        return set(self.whitelists[ssid])
+
+
+@override_settings(UNIFI_SSID='Servidores', UNIFI_SSID_VISITANTES='Visitantes')
+class ReconciliacaoWhitelistTests(TestCase):
+    """reconcile_whitelist: leitura pelo mutator e diferença aplicada sob o lock do SSID."""
+
+    def setUp(self):
+        Visitante.objects.create(
+            nome='Visitante', email='v@exemplo.com', telefone='1', autorizado=True,
+            autorizado_ate=timezone.now() + timedelta(hours=1), mac_address='aa:bb:cc:dd:ee:01'
+        )
+        WhitelistOutbox.objects.all().delete()
+        self.api = FakeWhitelistAPI()
+        self.api.mutator = FakeMutator({'Visitantes': {'AA:BB:CC:DD:EE:09'}})
+
+    def test_simulacao_nao_escreve(self):
+        resultado, = reconciliar(self.api, ['Visitantes'])
+
+        self.assertEqual(self.api.mutator.leituras, ['Visitantes'])
+        self.assertEqual(resultado.adicionar, {'AA:BB:CC:DD:EE:01'})
+        self.assertEqual(resultado.remover, {'AA:BB:CC:DD:EE:09'})
+        self.assertFalse(resultado.aplicado)
+        self.assertEqual(self.api.chamadas, [])
+
+    def test_aplica_sob_o_lock_do_ssid(self):
+        dentro_do_lock = []
+        original = whitelist_reconcile.ssid_lock
+
+        @contextmanager
+        def ssid_lock(ssid):
+            with original(ssid):
+                dentro_do_lock.append(ssid)
+                yield
+                dentro_do_lock.remove(ssid)
+
+        def apply_whitelist_changes(ssid, add=(), remove=()):
+            self.assertEqual(dentro_do_lock, [ssid])
+            self.api.chamadas.append((ssid, set(add), set(remove)))
+
+        self.api.apply_whitelist_changes = apply_whitelist_changes
+        with mock.patch.object(whitelist_reconcile, 'ssid_lock', ssid_lock):
+            resultado, = reconciliar(self.api, ['Visitantes'], aplicar=True)
+
+        self.assertTrue(resultado.aplicado)
+        self.assertEqual(self.api.chamadas, [('Visitantes', {'AA:BB:CC:DD:EE:01'}, {'AA:BB:CC:DD:EE:09'})])
+
+    def test_macs_pendentes_ficam_para_o_worker(self):
+        enfileirar_remocao('aa:bb:cc:dd:ee:01', 'Visitantes')
+
+        resultado, = reconciliar(self.api, ['Visitantes'], aplicar=True)
+
+        self.assertEqual(self.api.chamadas, [('Visitantes', set(), {'AA:BB:CC:DD:EE:09'})])
+        self.assertEqual(resultado.adicionar, set())
+
+    def test_erro_em_um_ssid_nao_interrompe_os_demais(self):
+        self.api.mutator.whitelists['Servidores'] = set()
+
+        visitantes, servidores, outro = reconciliar(self.api, ['Visitantes', 'Servidores', 'Outro'])
+
+        self.assertEqual(self.api.mutator.leituras, ['Visitantes', 'Servidores'])
+        self.assertIsNone(visitantes.erro)
+        self.assertIsNone(servidores.erro)
+        self.assertIn('não recebe MACs do banco', outro.erro)
+
+    def test_ssid_inexistente_no_controlador(self):
+        del self.api.mutator.whitelists['Visitantes']
+
+        resultado, = reconciliar(self.api, ['Visitantes'], aplicar=True)
+
+        self.assertEqual(resultado.erro, "SSID 'Visitantes' não encontrado")
+        self.assertEqual(self.api.chamadas, [])
+
+
+class ExpiracaoVisitantesTests(TestCase):
+    """Varredura de expire_visitors: lotes, escrita única e MACs reautorizados."""
+
+    def setUp(self):
+        self.api = FakeWhitelistAPI()
+        self.ssid = settings.UNIFI_SSID_VISITANTES
+        self.vencido = timezone.now() - timedelta(minutes=1)
+
+    def _visitante(self, mac, autorizado_ate, **kwargs):
+        return Visitante.objects.create(
+            nome='Visitante', email='v@exemplo.com', telefone='1', autorizado=True,
+            autorizado_ate=autorizado_ate, mac_address=mac, **kwargs
+        )
+
+    def test_expira_em_lotes_com_uma_unica_escrita(self):
+        for final in range(5):
+            self._visitante(f'aa:bb:cc:dd:ee:0{final}', self.vencido)
+        valido = self._visitante('aa:bb:cc:dd:ee:10', timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(expirar_autorizacoes(lote=2, api=self.api), (5, 0, 5))
+
+        self.assertEqual(self.api.chamadas, [
+            (self.ssid, set(), {f'AA:BB:CC:DD:EE:0{final}' for final in range(5)}),
+        ])
+        self.assertEqual(Visitante.objects.filter(autorizado=True).get(), valido)
+        self.assertFalse(WhitelistOutbox.objects.filter(
+            operacao=WhitelistOutbox.OPERACAO_REMOVER, status=WhitelistOutbox.STATUS_PENDENTE
+        ).exists())
+
+    def test_dispositivos_do_visitante_expirado(self):
+        visitante = self._visitante('', self.vencido)
+        VisitanteDispositivo.objects.create(visitante=visitante, visitante_mac_address='AA:BB:CC:DD:EE:01')
+
+        self.assertEqual(expirar_autorizacoes(api=self.api), (1, 1, 1))
+        self.assertFalse(VisitanteDispositivo.objects.get().visitante_dispositivo_ativo)
+
+    def test_mac_ainda_autorizado_nao_e_removido(self):
+        self._visitante('aa:bb:cc:dd:ee:01', self.vencido)
+        self._visitante('AA:BB:CC:DD:EE:01', timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(expirar_autorizacoes(api=self.api), (1, 0, 0))
+        self.assertEqual(self.api.chamadas, [])
+
+    def test_mac_reautorizado_durante_a_varredura_nao_e_removido(self):
+        self._visitante('aa:bb:cc:dd:ee:01', self.vencido)
+        self._visitante('aa:bb:cc:dd:ee:02', self.vencido)
+        expirar_lote = visitante_expiracao._expirar_lote
+
+        def expirar_e_reautorizar(*args):
+            resultado = expirar_lote(*args)
+            if resultado[0]:
+                self._visitante('aa:bb:cc:dd:ee:01', timezone.now() + timedelta(hours=1))
+            return resultado
+
+        with mock.patch.object(visitante_expiracao, '_expirar_lote', side_effect=expirar_e_reautorizar):
+            self.assertEqual(expirar_autorizacoes(api=self.api), (2, 0, 1))
+
+        self.assertEqual(self.api.chamadas, [(self.ssid, set(), {'AA:BB:CC:DD:EE:02'})])
+        self.assertFalse(WhitelistOutbox.objects.filter(
+            mac_address='AA:BB:CC:DD:EE:01', operacao=WhitelistOutbox.OPERACAO_REMOVER,
+            status=WhitelistOutbox.STATUS_PENDENTE,
+        ).exists())
+
+    def test_migracao_preenche_autorizacoes_sem_prazo(self):
+        migracao = import_module('unifi_auth_app.migrations.0024_preencher_autorizado_ate')
+        antigo = self._visitante('aa:bb:cc:dd:ee:01', None)
+        Visitante.objects.filter(pk=antigo.pk).update(data_acesso=timezone.now() - timedelta(days=3))
+        dispositivo = VisitanteDispositivo.objects.create(visitante=antigo, visitante_mac_address='AA:BB:CC:DD:EE:02')
+        nao_autorizado = Visitante.objects.create(nome='Outro', email='o@exemplo.com', telefone='1')
+
+        migracao.preencher_autorizado_ate(django_apps, None)
+
+        duracao = timedelta(minutes=settings.PORTAL_CONFIG['AUTH_DURATION_MINUTES'])
+        antigo.refresh_from_db()
+        dispositivo.refresh_from_db()
+        nao_autorizado.refresh_from_db()
+        self.assertEqual(antigo.autorizado_ate, antigo.data_acesso + duracao)
+        self.assertEqual(dispositivo.visitante_autorizado_ate, dispositivo.visitante_data_cadastro + duracao)
+        self.assertIsNone(nao_autorizado.autorizado_ate)
+
+        self.assertEqual(expirar_autorizacoes(api=self.api)[:2], (1, 1))
+
+
+@override_settings(
+    PORTAL_RATE_LIMITS={'/api/authorize-visitor/': {'ip': (3, 60), 'mac': (2, 60)}},
+    TRUSTED_PROXIES=['127.0.0.1'],
+)
+class RateLimitTests(TestCase):
+    """RateLimitMiddleware: 429 com Retry-After, contagem por prefixo e IP atrás do proxy."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = RateLimitMiddleware(lambda request: HttpResponse('ok'))
+
+    def _post(self, path='/api/authorize-visitor/', mac=None, ip='10.0.0.1', **extra):
+        corpo = json.dumps({'mac_address': mac} if mac else {})
+        request = self.factory.post(path, corpo, content_type='application/json', REMOTE_ADDR=ip, **extra)
+        return self.middleware(request)
+
+    def test_429_com_retry_after_apos_o_limite(self):
+        for _ in range(3):
+            self.assertEqual(self._post().status_code, 200)
+
+        resposta = self._post()
+
+        self.assertEqual(resposta.status_code, 429)
+        self.assertGreaterEqual(int(resposta['Retry-After']), 1)
+        self.assertEqual(self._post(ip='10.0.0.2').status_code, 200)
+
+    def test_limite_por_mac(self):
+        self.assertEqual(self._post(mac='aa:bb:cc:dd:ee:01', ip='10.0.0.1').status_code, 200)
+        self.assertEqual(self._post(mac='AA-BB-CC-DD-EE-01', ip='10.0.0.2').status_code, 200)
+        self.assertEqual(self._post(mac='aabbccddee01', ip='10.0.0.3').status_code, 429)
+
+    def test_variar_o_final_da_url_nao_gera_novo_limite(self):
+        with mock.patch('unifi_auth_app.rate_limit.track_rate_limit_rejection') as rejeicao:
+            for final in range(4):
+                resposta = self._post(path=f'/api/authorize-visitor/{final}/')
+
+        self.assertEqual(resposta.status_code, 429)
+        rejeicao.assert_called_once_with('/api/authorize-visitor/', 'ip')
+
+    def test_url_sem_limite(self):
+        for _ in range(5):
+            self.assertEqual(self._post(path='/api/outra/').status_code, 200)
+
+    def test_ip_do_cliente_atras_do_proxy_confiavel(self):
+        for _ in range(3):
+            self._post(ip='127.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.9.9.9')
+
+        # O valor forjado à esquerda não muda o cliente identificado
+        resposta = self._post(ip='127.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 10.9.9.9')
+        self.assertEqual(resposta.status_code, 429)
+        self.assertEqual(self._post(ip='127.0.0.1', HTTP_X_FORWARDED_FOR='10.9.9.8').status_code, 200)
+
+
+@override_settings(UNIFI_CLIENT_SNAPSHOT_TTL=60, UNIFI_CLIENT_SNAPSHOT_MIN_REFRESH=2)
+class ClientSnapshotTests(TestCase):
+    """Cache negativo do snapshot de clientes quando outra atualização está em andamento."""
+
+    cliente = {'mac': 'aa:bb:cc:dd:ee:01', 'ip': '10.0.0.5', 'ap_mac': '24:5a:4c:00:00:01'}
+
+    def setUp(self):
+        cache.clear()
+        self.service = ClientSnapshotService()
+        self.service._snapshot = ClientSnapshot([], time.time() - 10)
+        self.fetch = mock.patch.object(self.service, '_fetch_clients', return_value=[self.cliente]).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_sem_cache_negativo_se_outro_processo_atualiza(self):
+        cache.add(REFRESH_LOCK_KEY, 1)
+
+        self.assertIsNone(self.service.mac_for_ip('10.0.0.5'))
+        self.assertIsNone(cache.get(NEGATIVE_KEY_PREFIX + 'ip:10.0.0.5'))
+        self.fetch.assert_not_called()
+
+        cache.delete(REFRESH_LOCK_KEY)
+        self.assertEqual(self.service.mac_for_ip('10.0.0.5'), 'aa:bb:cc:dd:ee:01')
+
+    def test_usa_o_snapshot_publicado_por_outro_processo(self):
+        cache.add(REFRESH_LOCK_KEY, 1)
+        cache.set(CACHE_KEY, {'fetched_at': time.time(), 'clients': [self.cliente]})
+
+        self.assertEqual(self.service.client_for_mac('AA-BB-CC-DD-EE-01'), self.cliente)
+        self.fetch.assert_not_called()
+
+    def test_cache_negativo_apos_buscar_o_snapshot(self):
+        self.assertIsNone(self.service.mac_for_ip('10.0.0.9'))
+        self.assertEqual(cache.get(NEGATIVE_KEY_PREFIX + 'ip:10.0.0.9'), 1)
+
+        self.service._snapshot = ClientSnapshot([self.cliente], time.time() - 10)
+        self.assertIsNone(self.service.mac_for_ip('10.0.0.9'))
+        self.assertEqual(self.fetch.call_count, 1)
+
+
+def _resposta(status):
+    resposta = requests.Response()
+    resposta.status_code = status
+    resposta._content = b'{"data": []}'
+    return resposta
+
+
+class ControllerSessionTests(TestCase):
+    """Sessão compartilhada com o controlador: um único relogin para 401 simultâneos."""
+
+    def test_um_unico_login_para_401_simultaneos(self):
+        threads = 10
+        sessao = ControllerSession('https://controlador-relogin.test', 'admin', 'senha')
+        logins = []
+        barreira = threading.Barrier(threads)
+        local = threading.local()
+
+        def request(method, url, **kwargs):
+            if url.endswith('/api/login'):
+                logins.append(url)
+                time.sleep(0.05)
+                return _resposta(200)
+            if not getattr(local, 'expirou', False):
+                # Todas as threads recebem 401 do mesmo cookie expirado
+                local.expirou = True
+                barreira.wait(timeout=5)
+                return _resposta(401)
+            return _resposta(200)
+
+        sessao.session.request = request
+        respostas = []
+        trabalhadores = [
+            threading.Thread(target=lambda: respostas.append(sessao.get('https://controlador-relogin.test/x')))
+            for _ in range(threads)
+        ]
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.join(timeout=10)
+
+        self.assertEqual([resposta.status_code for resposta in respostas], [200] * threads)
+        # Login inicial e um único relogin
+        self.assertEqual(len(logins), 2)
+
+
+def _format_mac_address_original(value):
+    """format_mac_address antes do mac_utils, como referência de compatibilidade."""
+    clean_mac = ''.join(c for c in value if c.isalnum())
+    invalid_chars = set(clean_mac) - set('0123456789ABCDEFabcdef')
+    if invalid_chars:
+        raise ValidationError(
+            f'MAC address contém caracteres inválidos: {", ".join(sorted(invalid_chars))}. '
+            'Use apenas números (0-9) e letras de A até F'
+        )
+    if len(clean_mac) != 12:
+        raise ValidationError(
+            f'MAC address deve ter 12 caracteres hexadecimais, mas tem {len(clean_mac)}. '
+            'Formato esperado: XX:XX:XX:XX:XX:XX'
+        )
+    return ':'.join(clean_mac[i:i+2].upper() for i in range(0, 12, 2))
+
+
+class MacUtilsTests(TestCase):
+    """Normalização de MACs: caminho rápido, lote com máscara de erros e compatibilidade."""
+
+    entradas = [
+        'aa:bb:cc:dd:ee:ff', 'AA-BB-CC-DD-EE-FF', 'aabb.ccdd.eeff', 'aabbccddeeff',
+        ' aa:bb:cc:dd:ee:ff ', 'aa bb cc dd ee ff', 'aa_bb_cc_dd_ee_ff', 'aa:bb:cc:dd:ee:f f',
+        'aa:bb:cc:dd:ee:fg', 'aa:bb:cc:dd:ee', 'aa:bb:cc:dd:ee:ff:00', '', 'zz:zz', 'aabbccddee\tf',
+    ]
+
+    def test_format_mac_address_compativel_com_a_versao_original(self):
+        for entrada in self.entradas:
+            with self.subTest(entrada=entrada):
+                try:
+                    esperado = _format_mac_address_original(entrada)
+                except ValidationError as e:
+                    with self.assertRaises(ValidationError) as erro:
+                        format_mac_address(entrada)
+                    self.assertEqual(erro.exception.messages, e.messages)
+                else:
+                    self.assertEqual(format_mac_address(entrada), esperado)
+
+    def test_lote_marca_erros_sem_interromper(self):
+        lote = normalizar_macs(['aa-bb-cc-dd-ee-01', 'invalido', 'AABBCCDDEE02', 'aa:bb:cc'])
+
+        self.assertEqual(lote.macs, ['AA:BB:CC:DD:EE:01', None, 'AA:BB:CC:DD:EE:02', None])
+        self.assertEqual(list(lote.inteiros), [0xAABBCCDDEE01, 0, 0xAABBCCDDEE02, 0])
+        self.assertEqual([erro is None for erro in lote.erros], [True, False, True, False])
+        self.assertIn('caracteres inválidos', lote.erros[1])
+        self.assertIn('mas tem 6', lote.erros[3])
+
+    def test_lote_igual_a_normalizacao_individual(self):
+        lote = normalizar_macs(self.entradas)
+
+        for entrada, mac, inteiro, erro in zip(self.entradas, *lote):
+            with self.subTest(entrada=entrada):
+                try:
+                    esperado = normalizar_mac(entrada)
+                except MacInvalido as e:
+                    self.assertEqual((mac, inteiro, erro), (None, 0, str(e)))
+                else:
+                    self.assertEqual((mac, inteiro, erro), (esperado, mac_para_int(entrada), None))
+
+
+class MacIndexTests(TestCase):
+    """MacIndex: MACs como inteiros de 48 bits, em memória e no arquivo mapeado."""
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+
+    def test_ida_e_volta_entre_mac_e_inteiro(self):
+        for mac in ('00:00:00:00:00:00', 'AA:BB:CC:DD:EE:FF', '01:23:45:67:89:AB', 'FF:FF:FF:FF:FF:FF'):
+            with self.subTest(mac=mac):
+                self.assertEqual(int_to_mac(mac_to_int(mac)), mac)
+                self.assertEqual(mac_to_int(mac.lower().replace(':', '-')), mac_to_int(mac))
+        self.assertEqual(mac_to_int('00:00:00:00:01:00'), 256)
+        self.assertEqual(mac_to_int(256), 256)
+
+    def test_mac_invalido_gera_validation_error(self):
+        with self.assertRaises(ValidationError):
+            mac_to_int('aa:bb:cc')
+        with self.assertRaises(ValidationError):
+            MacIndex(['AA:BB:CC:DD:EE:01', 'invalido'])
+
+    def test_consulta_em_qualquer_formato(self):
+        indice = MacIndex(['aa:bb:cc:dd:ee:01', 'AA-BB-CC-DD-EE-02', 0xAABBCCDDEE03])
+
+        self.assertEqual(len(indice), 3)
+        self.assertIn('AABBCCDDEE01', indice)
+        self.assertIn('aa:bb:cc:dd:ee:03', indice)
+        self.assertNotIn('AA:BB:CC:DD:EE:04', indice)
+
+        indice.discard('aa-bb-cc-dd-ee-01')
+        indice.add('AA:BB:CC:DD:EE:00')
+        self.assertEqual([int_to_mac(mac) for mac in indice],
+                         ['AA:BB:CC:DD:EE:00', 'AA:BB:CC:DD:EE:02', 'AA:BB:CC:DD:EE:03'])
+
+    def test_arquivo_mapeado_com_busca_binaria(self):
+        macs = [f'AA:BB:CC:DD:{final // 256:02X}:{final % 256:02X}' for final in range(0, 1000, 3)]
+        path = os.path.join(self.diretorio, 'macs.idx')
+        MacIndex(macs).save(path)
+
+        mapeado = MacIndex.load(path)
+        self.addCleanup(mapeado.close)
+        self.assertEqual(len(mapeado), len(macs))
+        for mac in macs[::37]:
+            self.assertIn(mac.lower(), mapeado)
+        self.assertNotIn('AA:BB:CC:DD:00:01', mapeado)
+        self.assertNotIn('FF:FF:FF:FF:FF:FF', mapeado)
+
+
+class MacSnapshotTests(TestCase):
+    """Snapshot de MACs em arquivo: consulta, expiração e recarga quando a geração muda."""
+
+    def setUp(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        self.path = os.path.join(diretorio, 'macs.snap')
+
+    def _leitor(self):
+        leitor = MacSnapshotReader(self.path, verificar_a_cada=0)
+        self.addCleanup(leitor.close)
+        return leitor
+
+    def test_consulta_tipo_dono_e_expiracao(self):
+        futuro = time.time() + 3600
+        gravar_snapshot(self.path, [
+            ('aa:bb:cc:dd:ee:01', TIPO_STAFF, 7, 0),
+            ('aa:bb:cc:dd:ee:02', TIPO_VISITANTE, 9, futuro),
+            ('aa:bb:cc:dd:ee:03', TIPO_VISITANTE, 10, time.time() - 60),
+            # O mesmo MAC como visitante e servidor: prevalece o servidor
+            ('AA-BB-CC-DD-EE-01', TIPO_VISITANTE, 11, futuro),
+        ])
+        leitor = self._leitor()
+
+        self.assertEqual(leitor.consultar('AA:BB:CC:DD:EE:01'),
+                         MacSnapshotEntry(mac=0xAABBCCDDEE01, tipo='staff', dono_id=7, expira_em=None))
+        self.assertEqual(leitor.consultar('aabbccddee02').tipo, 'visitante')
+        self.assertIsNone(leitor.consultar('AA:BB:CC:DD:EE:03'))
+        self.assertNotIn('AA:BB:CC:DD:EE:04', leitor)
+
+    def test_recarrega_quando_a_geracao_muda(self):
+        self.assertEqual(gravar_snapshot(self.path, [('aa:bb:cc:dd:ee:01', TIPO_STAFF, 1, 0)]), (1, 1))
+        leitor = self._leitor()
+        self.assertEqual(leitor.geracao, 1)
+        self.assertNotIn('AA:BB:CC:DD:EE:02', leitor)
+
+        self.assertEqual(gravar_snapshot(self.path, [
+            ('aa:bb:cc:dd:ee:01', TIPO_STAFF, 1, 0),
+            ('aa:bb:cc:dd:ee:02', TIPO_VISITANTE, 2, 0),
+        ]), (2, 2))
+
+        self.assertIn('AA:BB:CC:DD:EE:02', leitor)
+        self.assertEqual(leitor.geracao, 2)
+        self.assertEqual(len(leitor), 2)
+
+    def test_mantem_a_ultima_geracao_se_o_arquivo_sumir(self):
+        gravar_snapshot(self.path, [('aa:bb:cc:dd:ee:01', TIPO_STAFF, 1, 0)])
+        leitor = self._leitor()
+        os.unlink(self.path)
+
+        self.assertFalse(leitor.recarregar_se_necessario())
+        self.assertIn('AA:BB:CC:DD:EE:01', leitor)
+
+
+@override_settings(AUTH_STATUS_LOCAL_TTL=60, AUTH_STATUS_CACHE_TTL=300, AUTH_STATUS_NEGATIVE_TTL=60)
+class AuthStatusCacheTests(TestCase):
+    """Cache de visitantes autorizados por IP e sua invalidação pelos signals de Visitante."""
+
+    ip = '10.0.0.10'
+
+    def setUp(self):
+        cache.clear()
+        auth_status_cache.limpar_cache_local()
+        self.addCleanup(auth_status_cache.limpar_cache_local)
+
+    def _visitante(self, **kwargs):
+        dados = dict(nome='Visitante', email='v@exemplo.com', telefone='1', autorizado=True,
+                     autorizado_ate=timezone.now() + timedelta(hours=1), ip_address=self.ip)
+        dados.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Visitante.objects.create(**dados)
+
+    def _salvar(self, visitante):
+        with self.captureOnCommitCallbacks(execute=True):
+            visitante.save()
+
+    def test_consulta_o_banco_uma_unica_vez(self):
+        self._visitante()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(visitante_autorizado_por_ip(self.ip)['nome'], 'Visitante')
+            self.assertEqual(visitante_autorizado_por_ip(self.ip)['nome'], 'Visitante')
+
+        # Outro processo: memória vazia, mas o cache compartilhado já tem o IP
+        auth_status_cache.limpar_cache_local()
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(visitante_autorizado_por_ip(self.ip))
+
+    def test_autorizacao_invalida_o_cache_negativo(self):
+        self.assertIsNone(visitante_autorizado_por_ip(self.ip))
+        self.assertEqual(cache.get(auth_status_cache.CACHE_KEY_PREFIX + self.ip), auth_status_cache.NAO_AUTORIZADO)
+
+        self._visitante()
+
+        self.assertIsNone(cache.get(auth_status_cache.CACHE_KEY_PREFIX + self.ip))
+        self.assertIsNotNone(visitante_autorizado_por_ip(self.ip))
+
+    def test_revogacao_invalida_o_cache(self):
+        visitante = self._visitante()
+        self.assertIsNotNone(visitante_autorizado_por_ip(self.ip))
+
+        visitante.autorizado = False
+        self._salvar(visitante)
+
+        self.assertIsNone(visitante_autorizado_por_ip(self.ip))
+
+    def test_mudanca_de_ip_invalida_o_ip_anterior(self):
+        visitante = self._visitante()
+        self.assertIsNotNone(visitante_autorizado_por_ip(self.ip))
+
+        # Carregado do banco, como nas views: o IP anterior vem do post_init
+        visitante = Visitante.objects.get(pk=visitante.pk)
+        visitante.ip_address = '10.0.0.11'
+        self._salvar(visitante)
+
+        self.assertIsNone(visitante_autorizado_por_ip(self.ip))
+        self.assertIsNotNone(visitante_autorizado_por_ip('10.0.0.11'))
+
+    def test_exclusao_invalida_o_cache(self):
+        visitante = self._visitante()
+        self.assertIsNotNone(visitante_autorizado_por_ip(self.ip))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            visitante.delete()
+
+        self.assertIsNone(visitante_autorizado_por_ip(self.ip))
+
+    def test_autorizacao_expirada_nao_e_devolvida(self):
+        self._visitante(autorizado_ate=timezone.now() - timedelta(minutes=1))
+
+        self.assertIsNone(visitante_autorizado_por_ip(self.ip))
+
+
+class FakeControllerHTTP:
+    """Session falsa: devolve (ou levanta) os itens de `respostas`, em ordem."""
+
+    def __init__(self, *respostas):
+        self.respostas = list(respostas)
+        self.chamadas = []
+
+    def request(self, method, url, **kwargs):
+        self.chamadas.append((method, kwargs['timeout']))
+        resposta = self.respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return _resposta(resposta)
+
+
+@override_settings(UNIFI_RETRY_ATTEMPTS=2, UNIFI_RETRY_BACKOFF_BASE=0, UNIFI_CALL_DEADLINE=25)
+class ResilienciaControladorTests(TestCase):
+    """Circuit breaker, novas tentativas e prazo total das chamadas ao controlador."""
+
+    url = 'https://controlador.test/api/s/default/stat/sta'
+
+    def setUp(self):
+        self.relogio = 1000.0
+        patch = mock.patch('unifi_auth_app.unifi_resilience.time.monotonic', side_effect=lambda: self.relogio)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.breaker = CircuitBreaker('https://controlador.test', failure_threshold=3, recovery_timeout=30)
+
+    def test_fechado_aberto_meio_aberto_fechado(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        # Após recovery_timeout apenas uma chamada de teste passa
+        self.relogio += 30
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+        self.breaker.before_call()
+
+    def test_falha_no_teste_reabre_o_circuito(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.relogio += 30
+        self.breaker.before_call()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.relogio += 29
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_circuito_aberto_nao_chama_o_controlador(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        http = FakeControllerHTTP(200)
+
+        with self.assertRaises(requests.ConnectionError):
+            send_with_resilience(http, self.breaker, 'GET', self.url)
+        self.assertEqual(http.chamadas, [])
+
+    @mock.patch('unifi_auth_app.unifi_resilience.time.sleep')
+    def test_get_repete_falhas_de_rede(self, _):
+        http = FakeControllerHTTP(requests.ConnectionError('recusada'), 503, 200)
+
+        self.assertEqual(send_with_resilience(http, self.breaker, 'GET', self.url).status_code, 200)
+        self.assertEqual(len(http.chamadas), 3)
+        self.assertEqual(http.chamadas[0][1], (3.05, 15))
+        self.assertEqual(self.breaker.failures, 0)
+
+    @mock.patch('unifi_auth_app.unifi_resilience.time.sleep')
+    def test_post_nao_e_repetido(self, _):
+        http = FakeControllerHTTP(requests.ConnectionError('recusada'), 200)
+
+        with self.assertRaises(requests.ConnectionError):
+            send_with_resilience(http, self.breaker, 'POST', self.url)
+        self.assertEqual(len(http.chamadas), 1)
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_timeout_limitado_ao_prazo_restante(self):
+        http = FakeControllerHTTP(200)
+
+        send_with_resilience(http, self.breaker, 'GET', self.url, deadline=self.relogio + 2)
+        self.assertEqual(http.chamadas[0][1], (2, 2))
+
+        with self.assertRaises(CallDeadlineExceeded):
+            send_with_resilience(http, self.breaker, 'GET', self.url, deadline=self.relogio)
+
+
+def _registro_de_auditoria(**dados):
+    registro = logging.LogRecord('audit', logging.INFO, __file__, 0, 'API', None, None)
+    registro.audit = dict({'method': 'POST', 'path': '/api/authorize-visitor/', 'started_at': 0}, **dados)
+    return registro
+
+
+class AuditPipelineTests(TestCase):
+    """Fila limitada do AuditQueueHandler e gravação em lotes pelo AuditListener."""
+
+    def test_fila_cheia_descarta_e_conta(self):
+        handler = AuditQueueHandler(maxsize=2)
+        self.addCleanup(handler.close)
+
+        with mock.patch.object(handler, '_garantir_listener'), \
+                mock.patch('unifi_auth_app.audit_pipeline.metrics.track_audit_dropped') as descartado:
+            for _ in range(5):
+                handler.emit(_registro_de_auditoria())
+
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(descartado.call_count, 3)
+
+    def test_listener_grava_em_lotes(self):
+        fila = queue.Queue()
+        for indice in range(5):
+            fila.put(_registro_de_auditoria(status_code=200 + indice))
+        lotes = []
+        listener = AuditListener(fila, [lotes.append], batch_size=2, flush_interval=0.05)
+
+        listener.start()
+        listener.stop()
+
+        self.assertEqual([len(lote) for lote in lotes], [2, 2, 1])
+        self.assertEqual([evento['status_code'] for lote in lotes for evento in lote], list(range(200, 205)))
+        self.assertEqual(lotes[0][0]['timestamp'], '1970-01-01T00:00:00+00:00')
+
+    def test_falha_em_um_destino_nao_afeta_os_demais(self):
+        fila = queue.Queue()
+        fila.put(_registro_de_auditoria())
+        gravados = []
+
+        def destino_quebrado(eventos):
+            raise OSError('disco cheio')
+
+        listener = AuditListener(fila, [destino_quebrado, gravados.append], flush_interval=0.05)
+        listener.start()
+        listener.stop()
+
+        self.assertEqual(len(gravados), 1)
+
+    def test_montar_evento_decodifica_o_corpo_json(self):
+        evento = montar_evento({
+            'started_at': 0, 'raw_body': b'{"mac_address": "aa:bb:cc:dd:ee:01"}',
+            'content_type': 'application/json',
+        })
+
+        self.assertEqual(evento['request_body'], {'mac_address': 'aa:bb:cc:dd:ee:01'})
+        self.assertNotIn('raw_body', evento)
+        self.assertIn('hostname', evento)
+
+    def test_json_lines_com_rotacao(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        path = os.path.join(diretorio, 'audit.jsonl')
+        sink = JsonLinesSink(path, max_bytes=1, backup_count=2)
+
+        for indice in range(3):
+            sink([{'indice': indice}, {'indice': indice}])
+        sink.close()
+
+        self.assertFalse(os.path.exists(path))
+        with open(f'{path}.1', encoding='utf-8') as arquivo:
+            self.assertEqual([json.loads(linha) for linha in arquivo], [{'indice': 2}] * 2)
+        self.assertTrue(os.path.exists(f'{path}.2'))
+        self.assertFalse(os.path.exists(f'{path}.3'))
+
+
+class AuditStoreTests(TestCase):
+    """Tabela AuditEvent: gravação em lote, consultas por intervalo e retenção."""
+
+    def _evento(self, dias_atras=0, **dados):
+        evento = {
+            'timestamp': (timezone.now() - timedelta(days=dias_atras)).isoformat(),
+            'method': 'POST', 'path': '/api/authorize-visitor/', 'status_code': 200,
+            'duration_ms': 12, 'client_ip': '10.0.0.1',
+        }
+        evento.update(dados)
+        return evento
+
+    def test_grava_o_lote_com_um_unico_insert(self):
+        eventos = [self._evento(request_body={'mac_address': 'aa-bb-cc-dd-ee-01'}, extra='x'), self._evento()]
+
+        with self.assertNumQueries(1):
+            AuditEventSink()(eventos)
+
+        primeiro = AuditEvent.objects.get(mac_address__isnull=False)
+        self.assertEqual(primeiro.mac_address, 'AA:BB:CC:DD:EE:01')
+        self.assertEqual(primeiro.detalhes['extra'], 'x')
+        self.assertEqual(AuditEvent.objects.count(), 2)
+
+    def test_consulta_por_intervalo_ip_mac_e_caminho(self):
+        AuditEventSink()([
+            self._evento(request_body={'mac_address': 'aa:bb:cc:dd:ee:01'}),
+            self._evento(client_ip='10.0.0.2', path='/api/check-auth-status/'),
+            self._evento(dias_atras=3),
+        ])
+        agora = timezone.now()
+        desde, ate = agora - timedelta(days=1), agora + timedelta(minutes=1)
+
+        self.assertEqual(len(consultar_eventos(desde, ate)), 2)
+        self.assertEqual(len(consultar_eventos(desde, ate, client_ip='10.0.0.1')), 1)
+        self.assertEqual(len(consultar_eventos(desde, ate, mac='AABBCCDDEE01')), 1)
+        self.assertEqual(len(consultar_eventos(desde, ate, path='/api/check*')), 1)
+        self.assertEqual(len(consultar_eventos(agora - timedelta(days=5), ate)), 3)
+
+    @override_settings(AUDIT_RETENTION_DAYS=30)
+    def test_retencao_apaga_apenas_os_antigos_em_lotes(self):
+        AuditEventSink()([self._evento(dias_atras=dias) for dias in (40, 35, 31, 31, 29, 1)])
+
+        with mock.patch.object(AuditEvent.objects, 'filter', wraps=AuditEvent.objects.filter) as filtro:
+            self.assertEqual(purgar_eventos(lote=2), 4)
+
+        # Duas consultas de ids com 2 eventos, uma com 0, e um DELETE por lote
+        self.assertEqual(filtro.call_count, 5)
+        self.assertEqual(AuditEvent.objects.count(), 2)
+        self.assertFalse(AuditEvent.objects.filter(timestamp__lt=timezone.now() - timedelta(days=30)).exists())
+
+    def test_comando_purge_audit_events(self):
+        AuditEventSink()([self._evento(dias_atras=10), self._evento()])
+        saida = StringIO()
+
+        call_command('purge_audit_events', '--dias', '7', stdout=saida)
+
+        self.assertEqual(AuditEvent.objects.count(), 1)
+        self.assertIn('1 eventos de auditoria com mais de 7 dias apagados', saida.getvalue())
+
+
+class AuthorizedMacSetTests(TestCase):
+    """Conjunto de MACs do serviço RADIUS: carga, atualização pela fila e janela de ids."""
+
+    def setUp(self):
+        servidor = UniFiUser.objects.create(nome='Fulano', matricula='123', departamento='DTI')
+        Dispositivo.objects.create(usuario=servidor, mac_address='AA:BB:CC:DD:EE:01', nome_dispositivo='Celular')
+        self._visitante('aa:bb:cc:dd:ee:02')
+
+    def _visitante(self, mac, **kwargs):
+        return Visitante.objects.create(
+            nome='Visitante', email='v@exemplo.com', telefone='1', autorizado=True,
+            autorizado_ate=timezone.now() + timedelta(hours=1), mac_address=mac, **kwargs
+        )
+
+    def _carregado(self, **kwargs):
+        macs = AuthorizedMacSet(**kwargs)
+        macs.carregar()
+        return macs
+
+    def test_carga_separa_servidores_e_visitantes(self):
+        macs = self._carregado()
+
+        self.assertEqual(macs.consultar('aa-bb-cc-dd-ee-01'), 'staff')
+        self.assertEqual(macs.consultar('AA:BB:CC:DD:EE:02'), 'visitante')
+        self.assertIsNone(macs.consultar('AA:BB:CC:DD:EE:03'))
+
+    def test_atualiza_apenas_os_macs_da_fila(self):
+        macs = self._carregado()
+        macs.atualizar()
+        visitante = Visitante.objects.get(mac_address='aa:bb:cc:dd:ee:02')
+        visitante.autorizado = False
+        visitante.save()
+        # A revogação não passa pelo signal: quem revoga enfileira a remoção
+        enfileirar_remocao('aa:bb:cc:dd:ee:02', settings.UNIFI_SSID_VISITANTES)
+        self._visitante('aa:bb:cc:dd:ee:03')
+
+        self.assertEqual(macs.atualizar(), 2)
+
+        self.assertIsNone(macs.consultar('AA:BB:CC:DD:EE:02'))
+        self.assertEqual(macs.consultar('AA:BB:CC:DD:EE:03'), 'visitante')
+        # As alterações já aplicadas não são reavaliadas
+        self.assertEqual(macs.atualizar(), 0)
+
+    def _commit_fora_de_ordem(self, macs):
+        """Alteração que faz commit depois de outra com id maior, já lida pelo conjunto."""
+        atrasada = enfileirar_adicao('aa:bb:cc:dd:ee:04', settings.UNIFI_SSID_VISITANTES)
+        enfileirar_adicao('aa:bb:cc:dd:ee:05', settings.UNIFI_SSID_VISITANTES)
+        WhitelistOutbox.objects.filter(pk=atrasada.pk).delete()
+        macs.atualizar()
+
+        # O signal do visitante enfileira a adição; ela recebe o id reservado antes
+        self._visitante('aa:bb:cc:dd:ee:04')
+        WhitelistOutbox.objects.filter(id__gt=macs._cursor_outbox).update(id=atrasada.pk)
+        return macs.atualizar()
+
+    def test_alteracao_com_id_menor_que_o_cursor_e_aplicada(self):
+        macs = self._carregado()
+
+        self.assertEqual(self._commit_fora_de_ordem(macs), 1)
+        self.assertEqual(macs.consultar('AA:BB:CC:DD:EE:04'), 'visitante')
+
+    def test_sem_janela_a_alteracao_atrasada_se_perde(self):
+        macs = self._carregado(janela_ids=0)
+
+        self.assertEqual(self._commit_fora_de_ordem(macs), 0)
+        self.assertIsNone(macs.consultar('AA:BB:CC:DD:EE:04'))
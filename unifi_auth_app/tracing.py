@@ -0,0 +1,160 @@
+"""
+Medição por fase dos fluxos críticos do portal.
+
+A view decorada com @traced('fluxo') abre um trace para a requisição; cada
+bloco envolvido por `with span('fase'):` (na view, em sync_to_async ou em
+signals chamados por ela) soma sua duração ao histograma
+portal_phase_duration_seconds{flow, phase}. O trace é guardado em um
+contextvar, de modo que spans fora de um fluxo rastreado usam flow='none'.
+
+Opcionalmente:
+
+- TRACE_SAMPLE_RATE > 0 grava uma fração dos traces (fases, início relativo
+  e duração) em TRACE_LOG_PATH, um JSON por linha;
+- com TRACE_PROFILE_TOKEN configurado, a requisição que enviar o cabeçalho
+  X-Profile com esse valor é executada sob cProfile e o resultado é salvo em
+  TRACE_PROFILE_DIR (abrir com `python -m pstats` ou snakeviz). O cProfile
+  mede a thread do event loop: código rodando em sync_to_async aparece só
+  como espera, e corrotinas de outras requisições simultâneas também entram.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('unifi_auth_app')
+
+_trace: ContextVar[Optional['Trace']] = ContextVar('tracing_trace', default=None)
+
+# Só um cProfile pode estar ativo por vez no processo
+_perfil_lock = threading.Lock()
+_gravacao_lock = threading.Lock()
+
+
+class Trace:
+    """Fases medidas em uma execução de um fluxo."""
+
+    def __init__(self, fluxo: str):
+        self.fluxo = fluxo
+        self.inicio = time.perf_counter()
+        self.spans = []  # (fase, início relativo, duração), em segundos
+
+    def como_dict(self, total: float) -> dict:
+        return {
+            'flow': self.fluxo,
+            'timestamp': time.time() - total,
+            'total_ms': round(total * 1000, 3),
+            'spans': [
+                {'phase': fase, 'start_ms': round(inicio * 1000, 3), 'duration_ms': round(duracao * 1000, 3)}
+                for fase, inicio, duracao in self.spans
+            ],
+        }
+
+
+@contextmanager
+def span(fase: str):
+    """Mede o bloco como a fase `fase` do fluxo em andamento."""
+    trace = _trace.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        metrics.track_phase_duration(trace.fluxo if trace else 'none', fase, duracao)
+        if trace is not None:
+            trace.spans.append((fase, inicio - trace.inicio, duracao))
+
+
+def _iniciar_perfil(request) -> Optional[cProfile.Profile]:
+    token = getattr(settings, 'TRACE_PROFILE_TOKEN', '')
+    if not token or request.headers.get('X-Profile') != token:
+        return None
+    if not _perfil_lock.acquire(blocking=False):
+        logger.warning('cProfile já em uso por outra requisição; perfil não capturado')
+        return None
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError as e:
+        # Outro profiler (debugger, coverage) já está ativo
+        _perfil_lock.release()
+        logger.warning(f"Não foi possível iniciar o cProfile: {str(e)}")
+        return None
+    return perfil
+
+
+def _salvar_perfil(perfil: cProfile.Profile, fluxo: str) -> None:
+    perfil.disable()
+    try:
+        diretorio = getattr(settings, 'TRACE_PROFILE_DIR', '/opt/auth_project/logs/profiles')
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, f"{fluxo}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+        perfil.dump_stats(caminho)
+
+        resumo = io.StringIO()
+        pstats.Stats(perfil, stream=resumo).sort_stats('cumulative').print_stats(15)
+        logger.info(f"[PERFIL] {fluxo} salvo em {caminho}\n{resumo.getvalue()}")
+    except Exception as e:
+        logger.error(f"Erro ao salvar perfil de {fluxo}: {str(e)}")
+    finally:
+        _perfil_lock.release()
+
+
+def _gravar_amostra(trace: Trace, total: float) -> None:
+    taxa = getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+    if taxa <= 0 or random.random() >= taxa:
+        return
+    linha = json.dumps(trace.como_dict(total)) + '\n'
+    try:
+        with _gravacao_lock:
+            with open(getattr(settings, 'TRACE_LOG_PATH', '/opt/auth_project/logs/traces.jsonl'), 'a') as arquivo:
+                arquivo.write(linha)
+    except OSError as e:
+        logger.warning(f"Erro ao gravar trace de {trace.fluxo}: {str(e)}")
+
+
+@contextmanager
+def _rastrear(fluxo: str, request):
+    trace = Trace(fluxo)
+    token = _trace.set(trace)
+    perfil = _iniciar_perfil(request)
+    try:
+        yield
+    finally:
+        _trace.reset(token)
+        total = time.perf_counter() - trace.inicio
+        if perfil is not None:
+            _salvar_perfil(perfil, fluxo)
+        metrics.track_phase_duration(fluxo, 'total', total)
+        _gravar_amostra(trace, total)
+
+
+def traced(fluxo: str):
+    """Decorator de view que abre um trace do fluxo `fluxo` para cada requisição."""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def inner(request, *args, **kwargs):
+                with _rastrear(fluxo, request):
+                    return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def inner(request, *args, **kwargs):
+                with _rastrear(fluxo, request):
+                    return view_func(request, *args, **kwargs)
+        return inner
+    return decorator
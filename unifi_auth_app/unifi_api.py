@@ -1,7 +1,8 @@
-import requests
 import time
-from typing import List, Dict, Set
+from typing import Iterable, List, Dict, Optional, Set
 from . import metrics
+from .unifi_session import get_controller_session
+from .whitelist_mutation import WhitelistMutator
 
 class UniFiControllerAPI:
     def __init__(self, base_url, site, username, password, verify_ssl=False):
@@ -10,7 +11,10 @@ class UniFiControllerAPI:
         self.username = username
         self.password = password
         self.verify_ssl = verify_ssl
-        self.session = requests.Session()
+        # Sessão compartilhada pelo processo (login reaproveitado entre instâncias)
+        self.session = get_controller_session(base_url, username, password, verify_ssl)
+        # Escritas na whitelist com lock por SSID e verificação (ver whitelist_mutation)
+        self.mutator = WhitelistMutator(self.session, base_url, site, verify_ssl)
         # Cache de SSIDs
         self._ssid_cache: Dict[str, dict] = {}
         self._cache_timeout = 300  # 5 minutos
@@ -18,13 +22,7 @@ class UniFiControllerAPI:
         self._login()
 
     def _login(self):
-        login_url = f"{self.base_url}/api/login"
-        data = {
-            "username": self.username,
-            "password": self.password
-        }
-        response = self.session.post(login_url, json=data, verify=self.verify_ssl)
-        response.raise_for_status()
+        self.session.ensure_logged_in()
 
     def _get_ssid_info(self, ssid_name: str) -> dict:
         """Obtém informações do SSID com cache"""
@@ -48,33 +46,27 @@ class UniFiControllerAPI:
             raise Exception(f"SSID '{ssid_name}' não encontrado")
         return ssid_obj
 
-    @metrics.track_api_call('update_whitelist')
     def _update_whitelist(self, ssid_id: str, whitelist: List[str]) -> dict:
-        """Atualiza a whitelist de um SSID"""
-        update_url = f"{self.base_url}/api/s/{self.site}/rest/wlanconf/{ssid_id}"
-        data = {
-            "mac_filter_list": whitelist,
-            "mac_filter_enabled": True,
-            "mac_filter_policy": "allow"
-        }
-        resp = self.session.put(update_url, json=data, verify=self.verify_ssl)
-        resp.raise_for_status()
-        metrics.update_mac_count(len(whitelist))
-        return resp.json()
+        """Atualiza a whitelist de um SSID (grava a lista completa, sem verificação)"""
+        return self.mutator.write(ssid_id, whitelist)
+
+    def _apply(self, ssid_name: str, add: Iterable[str] = (), remove: Iterable[str] = (),
+               msg_inalterada: Optional[str] = None) -> dict:
+        """
+        Aplica as alterações com leitura, escrita e verificação sob o lock do SSID
+        (ver whitelist_mutation) e atualiza o cache com a lista lida do controlador.
+        """
+        result, ssid_obj = self.mutator.apply(ssid_name, add=add, remove=remove)
+        self._ssid_cache[ssid_name] = ssid_obj
+        if msg_inalterada and 'msg' in result:
+            return {"msg": msg_inalterada}
+        return result
 
     @metrics.track_api_call('add_single')
     def add_mac_to_ssid_whitelist(self, mac: str, ssid_name: str) -> dict:
         """Adiciona um MAC à lista de permissão (whitelist) do SSID especificado."""
         try:
-            ssid_obj = self._get_ssid_info(ssid_name)
-            whitelist = ssid_obj.get('mac_filter_list', [])
-            mac_upper = mac.upper()
-
-            if mac_upper in whitelist:
-                return {"msg": "MAC já está na whitelist"}
-
-            whitelist.append(mac_upper)
-            result = self._update_whitelist(ssid_obj['_id'], whitelist)
+            result = self._apply(ssid_name, add=[mac], msg_inalterada="MAC já está na whitelist")
             metrics.track_bulk_operation('add_single', success=True)
             return result
         except Exception as e:
@@ -85,14 +77,7 @@ class UniFiControllerAPI:
     def bulk_add_macs_to_ssid_whitelist(self, macs: List[str], ssid_name: str) -> dict:
         """Adiciona múltiplos MACs à whitelist de uma vez"""
         try:
-            ssid_obj = self._get_ssid_info(ssid_name)
-            whitelist = set(ssid_obj.get('mac_filter_list', []))
-            
-            # Converte todos os MACs para maiúsculo e adiciona ao set
-            new_macs = {mac.upper() for mac in macs}
-            whitelist.update(new_macs)
-            
-            result = self._update_whitelist(ssid_obj['_id'], list(whitelist))
+            result = self._apply(ssid_name, add=macs)
             metrics.track_bulk_operation('add', success=True)
             return result
         except Exception as e:
@@ -103,15 +88,7 @@ class UniFiControllerAPI:
     def remove_mac_from_ssid_whitelist(self, mac: str, ssid_name: str) -> dict:
         """Remove um MAC da lista de permissão (whitelist) do SSID especificado."""
         try:
-            ssid_obj = self._get_ssid_info(ssid_name)
-            whitelist = ssid_obj.get('mac_filter_list', [])
-            mac_upper = mac.upper()
-
-            if mac_upper not in whitelist:
-                return {"msg": "MAC não está na whitelist"}
-
-            whitelist.remove(mac_upper)
-            result = self._update_whitelist(ssid_obj['_id'], whitelist)
+            result = self._apply(ssid_name, remove=[mac], msg_inalterada="MAC não está na whitelist")
             metrics.track_bulk_operation('remove_single', success=True)
             return result
         except Exception as e:
@@ -122,16 +99,26 @@ class UniFiControllerAPI:
     def bulk_remove_macs_from_ssid_whitelist(self, macs: List[str], ssid_name: str) -> dict:
         """Remove múltiplos MACs da whitelist de uma vez"""
         try:
-            ssid_obj = self._get_ssid_info(ssid_name)
-            whitelist = set(ssid_obj.get('mac_filter_list', []))
-            
-            # Converte todos os MACs para maiúsculo e remove do set
-            macs_to_remove = {mac.upper() for mac in macs}
-            whitelist.difference_update(macs_to_remove)
-            
-            result = self._update_whitelist(ssid_obj['_id'], list(whitelist))
+            result = self._apply(ssid_name, remove=macs)
             metrics.track_bulk_operation('remove', success=True)
             return result
         except Exception as e:
             metrics.track_bulk_operation('remove', success=False)
             raise
+
+    @metrics.track_api_call('apply_changes')
+    def apply_whitelist_changes(self, ssid_name: str, add: Iterable[str] = (),
+                                remove: Iterable[str] = ()) -> dict:
+        """
+        Aplica adições e remoções na whitelist do SSID com um único PUT.
+
+        Um MAC presente nos dois conjuntos é removido. Se a whitelist já
+        estiver no estado desejado, nenhuma requisição de escrita é feita.
+        """
+        try:
+            result = self._apply(ssid_name, add=add, remove=remove)
+            metrics.track_bulk_operation('apply_changes', success=True)
+            return result
+        except Exception as e:
+            metrics.track_bulk_operation('apply_changes', success=False)
+            raise
@@ -0,0 +1,358 @@
+"""
+Cliente assíncrono (httpx) para o UniFi Controller, usado pelas views do portal sob ASGI.
+
+Enquanto uma view síncrona prende o worker do gunicorn durante toda a espera
+pelo controlador, as corrotinas deste módulo liberam o event loop: um único
+worker ASGI (uvicorn) mantém centenas de autorizações em andamento.
+
+Cada event loop tem o seu httpx.AsyncClient (keep-alive, pool de conexões),
+pois os clientes não podem ser compartilhados entre loops; eles são fechados
+quando o loop encerra. Os cookies de sessão são compartilhados pelo processo
+inteiro, inclusive com a sessão síncrona de unifi_session: o login é feito
+uma vez por worker, e refeito apenas quando o controlador responde 401 (uma
+única vez por expiração, mesmo com muitas requisições recebendo 401 juntas).
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+from .client_snapshot import get_client_snapshot_service
+from .request_timing import medir
+from .unifi_resilience import (
+    RETRYABLE_STATUS,
+    backoff_delay,
+    call_deadline,
+    can_retry,
+    get_breaker,
+    is_failure_status,
+    limit_timeout,
+    max_attempts,
+    timeout_for,
+)
+from .unifi_session import LOGIN_REQUIRED_MESSAGES, get_controller_session
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Cookies de sessão por (controlador, usuário), compartilhados entre os event loops
+_shared_cookies: Dict[Tuple[str, str], httpx.Cookies] = {}
+_shared_cookies_lock = threading.Lock()
+
+
+class AsyncControllerSession:
+    """
+    Sessão assíncrona autenticada com um UniFi Controller.
+
+    Equivalente assíncrono de unifi_session.ControllerSession: expõe
+    get/post/put e refaz o login uma única vez se a sessão tiver expirado.
+    Usa o mesmo circuit breaker da sessão síncrona do controlador.
+    """
+
+    def __init__(self, base_url: str, username: str, password: str, verify_ssl: bool = False):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.key = (self.base_url, username)
+        self._login_lock = asyncio.Lock()
+        # Incrementado a cada login: quem recebeu 401 só refaz o login se
+        # ninguém o tiver refeito depois que a sua requisição foi enviada
+        self._login_generation = 0
+        self.breaker = get_breaker(self.base_url)
+
+        max_connections = getattr(settings, 'UNIFI_ASYNC_MAX_CONNECTIONS', 100)
+        self.client = httpx.AsyncClient(
+            verify=verify_ssl,
+            timeout=getattr(settings, 'UNIFI_ASYNC_TIMEOUT', 10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            cookies=_initial_cookies(self.key, base_url, username, password, verify_ssl),
+        )
+        self.logged_in = bool(self.client.cookies)
+
+    async def login(self, reason: str = 'initial', deadline: Optional[float] = None) -> httpx.Response:
+        """
+        Faz login no controlador e compartilha o cookie com os demais loops.
+
+        `deadline` é o prazo da chamada que provocou o login (ver unifi_resilience).
+
+        Levanta httpx.HTTPStatusError se o controlador recusar as credenciais.
+        """
+        self.logged_in = False
+        response = await self._send(
+            'POST',
+            f"{self.base_url}/api/login",
+            json={"username": self.username, "password": self.password},
+            deadline=deadline,
+        )
+        if response.status_code != 200:
+            metrics.track_controller_login(reason=reason, success=False)
+            raise httpx.HTTPStatusError(
+                f"Login recusado pelo UniFi Controller (status {response.status_code})",
+                request=response.request,
+                response=response,
+            )
+
+        self.logged_in = True
+        self._login_generation += 1
+        with _shared_cookies_lock:
+            _shared_cookies[self.key] = httpx.Cookies(self.client.cookies)
+        metrics.track_controller_login(reason=reason, success=True)
+        logger.info(f'Sessão assíncrona autenticada no UniFi Controller {self.base_url} ({reason})')
+        return response
+
+    async def ensure_logged_in(self, deadline: Optional[float] = None) -> None:
+        """Faz login apenas se a sessão ainda não estiver autenticada."""
+        if self.logged_in:
+            return
+        async with self._login_lock:
+            if not self.logged_in:
+                await self.login(deadline=deadline)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Executa uma requisição autenticada, refazendo o login uma vez se necessário.
+
+        Login, tentativas e o novo envio compartilham o mesmo prazo (UNIFI_CALL_DEADLINE).
+        """
+        deadline = call_deadline()
+        with medir('unifi'):
+            await self.ensure_logged_in(deadline)
+            generation = self._login_generation
+            response = await self._send(method, url, deadline=deadline, **kwargs)
+            if self._login_required(response):
+                async with self._login_lock:
+                    if self._login_generation == generation:
+                        logger.info(f'Sessão do UniFi Controller expirada, refazendo login ({method} {url})')
+                        await self.login(reason='expired', deadline=deadline)
+                response = await self._send(method, url, deadline=deadline, **kwargs)
+        return response
+
+    async def _send(self, method: str, url: str, deadline: Optional[float] = None,
+                    **kwargs) -> httpx.Response:
+        """Versão assíncrona de unifi_resilience.send_with_resilience."""
+        if deadline is None:
+            deadline = call_deadline()
+        timeout = kwargs.pop('timeout', None) or timeout_for(url)
+        tentativas = max_attempts(method)
+        for tentativa in range(1, tentativas + 1):
+            connect, read = limit_timeout(timeout, deadline)
+            kwargs['timeout'] = httpx.Timeout(read, connect=connect)
+            self.breaker.before_call()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                espera = backoff_delay(tentativa)
+                if not can_retry(tentativa, tentativas, espera, deadline):
+                    raise
+                logger.warning(f'Falha de rede no UniFi Controller ({method} {url}): {str(e)}; nova tentativa')
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            else:
+                if is_failure_status(response.status_code):
+                    self.breaker.record_failure()
+                    espera = backoff_delay(tentativa)
+                    if (response.status_code not in RETRYABLE_STATUS
+                            or not can_retry(tentativa, tentativas, espera, deadline)):
+                        return response
+                    logger.warning(f'UniFi Controller respondeu {response.status_code} ({method} {url}); nova tentativa')
+                else:
+                    self.breaker.record_success()
+                    return response
+            metrics.track_api_retry(method)
+            await asyncio.sleep(espera)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('PUT', url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    @staticmethod
+    def _login_required(response: httpx.Response) -> bool:
+        if response.status_code == 401:
+            return True
+        if response.status_code in (400, 403) and any(
+            msg in response.text for msg in LOGIN_REQUIRED_MESSAGES
+        ):
+            return True
+        return False
+
+
+def _initial_cookies(key, base_url, username, password, verify_ssl) -> httpx.Cookies:
+    """Cookies já obtidos por outro loop ou pela sessão síncrona do processo."""
+    with _shared_cookies_lock:
+        cookies = _shared_cookies.get(key)
+    if cookies is not None:
+        return httpx.Cookies(cookies)
+
+    sync_session = get_controller_session(base_url, username, password, verify_ssl)
+    if sync_session.logged_in:
+        return httpx.Cookies(sync_session.cookies)
+    return httpx.Cookies()
+
+
+# Sessões por event loop; entradas somem junto com o loop
+_pools: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]' = weakref.WeakKeyDictionary()
+# Tarefa de cada loop que fecha as sessões dele no encerramento
+_closers: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]' = weakref.WeakKeyDictionary()
+_pools_pid: Optional[int] = None
+
+
+async def _close_on_loop_shutdown(pool: Dict) -> None:
+    """
+    Fica pendente até o loop encerrar e então fecha os clientes httpx do loop.
+
+    asyncio.run() (uvicorn) e o async_to_sync do asgiref cancelam as tarefas
+    pendentes antes de fechar o loop; o cancelamento cai no finally com o loop
+    ainda em execução.
+    """
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        sessions = list(pool.values())
+        pool.clear()
+        for session in sessions:
+            await session.aclose()
+
+
+def get_async_controller_session(base_url: str, username: str, password: str,
+                                 verify_ssl: bool = False) -> AsyncControllerSession:
+    """Retorna a sessão assíncrona do loop atual para o controlador/usuário informado."""
+    global _pools_pid
+    if _pools_pid != os.getpid():
+        # Sessões herdadas de um fork não podem ser usadas pelo novo processo
+        _pools.clear()
+        _closers.clear()
+        with _shared_cookies_lock:
+            _shared_cookies.clear()
+        _pools_pid = os.getpid()
+
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = {}
+        _closers[loop] = loop.create_task(_close_on_loop_shutdown(pool))
+
+    key = (base_url.rstrip('/'), username, verify_ssl)
+    session = pool.get(key)
+    if session is None or session.password != password:
+        if session is not None:
+            loop.create_task(session.aclose())
+        session = AsyncControllerSession(base_url, username, password, verify_ssl)
+        pool[key] = session
+    return session
+
+
+class AsyncUnifiController:
+    """
+    Versão assíncrona do UnifiController para as views do portal.
+
+    Todos os métodos que falam com o controlador são corrotinas. Assim como no
+    UnifiController síncrono, login, get_client_info e authorize_guest não
+    levantam exceções de rede (retornam False/None e registram o erro no log);
+    get_clients e os métodos de wlanconf levantam httpx.HTTPError.
+    """
+
+    def __init__(self):
+        config = settings.UNIFI_CONTROLLER_CONFIG
+        self.base_url = f"https://{config['IP']}:{config['PORT']}"
+        self.site_id = config['SITE_ID']
+        self.session = get_async_controller_session(
+            self.base_url,
+            config['USERNAME'],
+            config['PASSWORD'],
+            verify_ssl=getattr(settings, 'UNIFI_VERIFY_SSL', False),
+        )
+
+    @property
+    def logged_in(self):
+        return self.session.logged_in
+
+    async def login(self) -> bool:
+        """Garante uma sessão autenticada no UniFi Controller (reaproveita a do processo)"""
+        try:
+            await self.session.ensure_logged_in()
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            logger.error(f'Erro ao fazer login no UniFi Controller: {str(e)}')
+            return False
+
+    @metrics.track_async_api_call('async_get_clients')
+    async def get_clients(self) -> List[dict]:
+        """Lista os clientes conectados (stat/sta) diretamente do controlador."""
+        response = await self.session.get(f"{self.base_url}/api/s/{self.site_id}/stat/sta")
+        response.raise_for_status()
+        return response.json().get('data', [])
+
+    async def get_client_info(self, mac_address: str) -> Optional[dict]:
+        """Obtém informações de um cliente pelo MAC, usando o snapshot de clientes."""
+        try:
+            # O snapshot responde da memória/cache; só a primeira carga consulta o controlador
+            return await sync_to_async(
+                get_client_snapshot_service().client_for_mac, thread_sensitive=False
+            )(mac_address)
+        except Exception as e:
+            logger.error(f'Erro ao obter informações do cliente: {str(e)}')
+            return None
+
+    @metrics.track_async_api_call('async_authorize_guest')
+    async def _post_authorize_guest(self, payload: dict) -> httpx.Response:
+        return await self.session.post(
+            f"{self.base_url}/api/s/{self.site_id}/cmd/stamgr/authorize-guest",
+            json=payload,
+        )
+
+    async def authorize_guest(self, mac_address: str, ap_mac: Optional[str], minutes: int) -> bool:
+        """Autoriza um cliente no UniFi Controller (mesma requisição de UnifiController.authorize_guest)"""
+        payload = {'mac': mac_address, 'ap_mac': ap_mac, 'minutes': minutes}
+        try:
+            response = await self._post_authorize_guest(payload)
+        except (httpx.HTTPError, OSError) as e:
+            logger.error(f'Erro ao autorizar no UniFi Controller: {str(e)}')
+            return False
+
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {}
+        if response.status_code == 200 and response_data.get('meta', {}).get('rc') == 'ok':
+            logger.info(f'Dispositivo {mac_address} autorizado por {minutes} minutos')
+            return True
+
+        error_msg = response_data.get('meta', {}).get('msg', response.text)
+        logger.error(f'Erro ao autorizar no UniFi Controller. Status: {response.status_code} - {error_msg}')
+        return False
+
+    @metrics.track_async_api_call('async_get_wlanconf')
+    async def get_wlanconf(self) -> List[dict]:
+        """Lista as configurações das redes Wi-Fi (rest/wlanconf)."""
+        response = await self.session.get(f"{self.base_url}/api/s/{self.site_id}/rest/wlanconf")
+        response.raise_for_status()
+        return response.json().get('data', [])
+
+    @metrics.track_async_api_call('async_update_wlanconf')
+    async def update_wlanconf(self, wlan_id: str, data: dict) -> dict:
+        """Atualiza a configuração de uma rede Wi-Fi (PUT rest/wlanconf/<id>)."""
+        response = await self.session.put(
+            f"{self.base_url}/api/s/{self.site_id}/rest/wlanconf/{wlan_id}",
+            json=data,
+        )
+        response.raise_for_status()
+        return response.json()
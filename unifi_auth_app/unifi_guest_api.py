@@ -1,65 +1,59 @@
-import requests
 from django.conf import settings
-import urllib3
 from datetime import datetime, timedelta
 
-# Desabilitar avisos de SSL para certificados auto-assinados
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from .unifi_session import get_controller_session
+from .client_snapshot import get_client_snapshot_service
+from .whitelist_mutation import WhitelistMutator
 
 class UniFiGuestAPI:
     GUEST_SSID = 'VISITANTES'  # Nome da rede de visitantes
     
     def __init__(self):
-        self.session = requests.Session()
         self.base_url = settings.UNIFI_BASE_URL
         self.username = settings.UNIFI_USERNAME
         self.password = settings.UNIFI_PASSWORD
         self.site = 'default'
         self.verify_ssl = False
         self._ssid_id = None  # Cache do ID da rede VISITANTES
+        self._conectar()
+
+    def _conectar(self):
+        # Sessão compartilhada pelo processo (login reaproveitado entre instâncias)
+        self.session = get_controller_session(self.base_url, self.username, self.password, self.verify_ssl)
+        self.mutator = WhitelistMutator(self.session, self.base_url, self.site, self.verify_ssl)
 
     def __enter__(self):
         self.login()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.logout()
+        # A sessão é compartilhada com as demais instâncias do processo,
+        # portanto não é encerrada ao sair do contexto.
+        pass
 
     def login(self):
-        """Realiza login no UniFi Controller"""
-        login_url = f"{self.base_url}/api/login"
-        self.session.post(
-            login_url,
-            json={"username": self.username, "password": self.password},
-            verify=self.verify_ssl
-        )
+        """Garante uma sessão autenticada no UniFi Controller"""
+        if self.session is None:
+            self._conectar()
+        self.session.ensure_logged_in()
 
     def logout(self):
-        """Realiza logout do UniFi Controller"""
-        try:
-            logout_url = f"{self.base_url}/api/logout"
-            self.session.get(logout_url, verify=self.verify_ssl)
-        except:
-            pass
+        """
+        Libera a referência desta instância à sessão compartilhada.
+
+        A sessão do pool continua autenticada para as demais instâncias do
+        processo; um novo login() volta a usá-la.
+        """
+        self.session = None
+        self.mutator = None
 
     def get_mac_from_ip(self, ip_address):
         """
         Obtém o MAC address de um cliente a partir do seu IP.
         Retorna None se não encontrar.
         """
-        # Busca todos os clientes ativos
-        clients_url = f"{self.base_url}/api/s/{self.site}/stat/sta"
-        response = self.session.get(clients_url, verify=self.verify_ssl)
-        response.raise_for_status()
-        
-        clients = response.json().get('data', [])
-        
-        # Procura um cliente com o IP especificado
-        for client in clients:
-            if client.get('ip', '') == ip_address:
-                return client.get('mac', '').upper()
-        
-        return None
+        mac_address = get_client_snapshot_service().mac_for_ip(ip_address)
+        return mac_address.upper() if mac_address else None
 
     def _get_ssid_id(self):
         """Obtém o ID da rede VISITANTES"""
@@ -78,36 +72,15 @@ class UniFiGuestAPI:
         return self._ssid_id
 
     def _update_whitelist(self, mac_address, add=True):
-        """Atualiza a whitelist da rede VISITANTES"""
-        ssid_id = self._get_ssid_id()
-        url = f"{self.base_url}/api/s/{self.site}/rest/wlanconf"
-        
-        # Obtém a configuração atual da rede
-        response = self.session.get(url, verify=self.verify_ssl)
-        response.raise_for_status()
-        ssids = response.json().get('data', [])
-        ssid_obj = next((s for s in ssids if s.get('_id') == ssid_id), None)
-        
-        # Obtém a whitelist atual
-        whitelist = ssid_obj.get('mac_filter_list', [])
-        mac_upper = mac_address.upper()
-        
-        if add and mac_upper not in whitelist:
-            whitelist.append(mac_upper)
-        elif not add and mac_upper in whitelist:
-            whitelist.remove(mac_upper)
-        
-        # Atualiza a whitelist
-        update_url = f"{self.base_url}/api/s/{self.site}/rest/wlanconf/{ssid_id}"
-        data = {
-            "mac_filter_list": whitelist,
-            "mac_filter_enabled": True,
-            "mac_filter_policy": "allow"  # Política de whitelist
-        }
-        
-        response = self.session.put(update_url, json=data, verify=self.verify_ssl)
-        response.raise_for_status()
-        return response.json()
+        """
+        Atualiza a whitelist da rede VISITANTES.
+
+        A lista é relida do controlador sob o lock do SSID e verificada após
+        a escrita (ver whitelist_mutation).
+        """
+        alteracao = {'add': [mac_address]} if add else {'remove': [mac_address]}
+        result, _ = self.mutator.apply(self.GUEST_SSID, **alteracao)
+        return result
 
     def authorize_guest(self, mac_address, minutes=60):
         """
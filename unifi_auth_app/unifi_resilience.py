@@ -0,0 +1,248 @@
+"""
+Camada de resiliência para as chamadas ao UniFi Controller.
+
+Usada por unifi_session.ControllerSession e unifi_async.AsyncControllerSession,
+por onde passam todas as requisições ao controlador:
+
+- timeouts de conexão/leitura por endpoint (UNIFI_TIMEOUTS), para que um
+  controlador travado não prenda os workers até o --timeout do gunicorn;
+- circuit breaker por controlador: após UNIFI_BREAKER_FAILURE_THRESHOLD
+  falhas seguidas as chamadas falham imediatamente durante
+  UNIFI_BREAKER_RECOVERY_TIMEOUT segundos, e depois uma única chamada de
+  teste decide se o circuito fecha novamente;
+- novas tentativas com backoff exponencial e jitter apenas para métodos
+  idempotentes (GET/HEAD/OPTIONS);
+- prazo total por chamada (UNIFI_CALL_DEADLINE): login, tentativas e esperas
+  de backoff somados não passam desse limite, que fica abaixo do --timeout
+  de 30s do gunicorn. O timeout de cada tentativa é reduzido ao tempo que
+  resta e não há nova tentativa se a espera ultrapassar o prazo.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import requests
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Timeouts padrão (conexão, leitura) em segundos, por trecho da URL
+DEFAULT_TIMEOUTS = {
+    'default': (3.05, 10),
+    '/api/login': (3.05, 10),
+    '/stat/sta': (3.05, 15),
+    '/rest/wlanconf': (3.05, 10),
+    '/cmd/stamgr': (3.05, 10),
+}
+
+# Prazo total padrão de uma chamada, em segundos (abaixo do --timeout de 30s do gunicorn)
+DEFAULT_CALL_DEADLINE = 25.0
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+# Respostas que indicam controlador indisponível (contam como falha e podem ser repetidas)
+RETRYABLE_STATUS = frozenset({502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    O circuito do controlador está aberto e a chamada nem foi feita.
+
+    Herda de requests.ConnectionError para que os tratamentos de erro de rede
+    já existentes também cubram este caso.
+    """
+
+
+class CallDeadlineExceeded(requests.exceptions.Timeout):
+    """
+    O prazo total da chamada (UNIFI_CALL_DEADLINE) acabou antes de uma nova tentativa.
+
+    Herda de requests.Timeout para ser tratado como os demais timeouts.
+    """
+
+
+def timeout_for(url: str) -> Tuple[float, float]:
+    """Timeout (conexão, leitura) configurado para a URL."""
+    timeouts = getattr(settings, 'UNIFI_TIMEOUTS', DEFAULT_TIMEOUTS)
+    for trecho, timeout in timeouts.items():
+        if trecho != 'default' and trecho in url:
+            return tuple(timeout)
+    return tuple(timeouts.get('default', DEFAULT_TIMEOUTS['default']))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clássico (fechado -> aberto -> meio-aberto) por controlador.
+
+    O estado é por processo e protegido por lock, podendo ser usado tanto por
+    threads quanto pelas corrotinas do cliente assíncrono.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        metrics.update_circuit_breaker_state(name, self.state)
+
+    def before_call(self) -> None:
+        """Levanta CircuitOpenError se a chamada não deve ser feita agora."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    raise CircuitOpenError(f'Circuito aberto para o UniFi Controller {self.name}')
+                self._set_state(self.HALF_OPEN)
+            # Meio-aberto: apenas uma chamada de teste por vez
+            if self._trial_in_flight:
+                raise CircuitOpenError(f'Circuito em teste para o UniFi Controller {self.name}')
+            self._trial_in_flight = True
+
+    def release_trial(self) -> None:
+        """Libera a chamada de teste sem registrar sucesso nem falha."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                logger.info(f'Circuito do UniFi Controller {self.name} fechado')
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(
+                        f'Circuito do UniFi Controller {self.name} aberto após {self.failures} falhas; '
+                        f'novas chamadas falham imediatamente por {self.recovery_timeout}s'
+                    )
+                    metrics.track_circuit_breaker_trip(self.name)
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.update_circuit_breaker_state(self.name, state)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    """Circuit breaker compartilhado pelo processo para o controlador informado."""
+    name = base_url.rstrip('/')
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=getattr(settings, 'UNIFI_BREAKER_FAILURE_THRESHOLD', 5),
+                recovery_timeout=getattr(settings, 'UNIFI_BREAKER_RECOVERY_TIMEOUT', 30.0),
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def call_deadline() -> float:
+    """Instante (time.monotonic) em que termina o prazo de uma chamada iniciada agora."""
+    return time.monotonic() + getattr(settings, 'UNIFI_CALL_DEADLINE', DEFAULT_CALL_DEADLINE)
+
+
+def limit_timeout(timeout: Union[float, Tuple[float, float]], deadline: float) -> Tuple[float, float]:
+    """
+    Reduz o timeout (conexão, leitura) ao tempo que resta até o prazo.
+
+    Levanta CallDeadlineExceeded se o prazo já acabou.
+    """
+    restante = deadline - time.monotonic()
+    if restante <= 0:
+        raise CallDeadlineExceeded('Prazo da chamada ao UniFi Controller esgotado')
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return min(connect, restante), min(read, restante)
+
+
+def can_retry(attempt: int, attempts: int, delay: float, deadline: float) -> bool:
+    """Se ainda há tentativas e a espera de backoff termina antes do prazo."""
+    return attempt < attempts and time.monotonic() + delay < deadline
+
+
+def max_attempts(method: str) -> int:
+    """Quantidade total de tentativas permitidas para o método HTTP."""
+    if method.upper() not in IDEMPOTENT_METHODS:
+        return 1
+    return 1 + getattr(settings, 'UNIFI_RETRY_ATTEMPTS', 2)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Espera antes da tentativa `attempt` (1, 2, ...): backoff exponencial com jitter total."""
+    base = getattr(settings, 'UNIFI_RETRY_BACKOFF_BASE', 0.2)
+    maximo = getattr(settings, 'UNIFI_RETRY_BACKOFF_MAX', 2.0)
+    return random.uniform(0, min(maximo, base * (2 ** (attempt - 1))))
+
+
+def is_failure_status(status_code: Optional[int]) -> bool:
+    """Erros 5xx contam como falha do controlador; 4xx não."""
+    return status_code is not None and status_code >= 500
+
+
+def send_with_resilience(session: requests.Session, breaker: CircuitBreaker,
+                         method: str, url: str, deadline: Optional[float] = None,
+                         **kwargs) -> requests.Response:
+    """
+    Executa session.request aplicando timeout, circuit breaker e novas tentativas.
+
+    `deadline` é o instante (time.monotonic) em que a chamada deve terminar;
+    sem ele, vale UNIFI_CALL_DEADLINE a partir de agora.
+
+    Levanta CircuitOpenError sem chamar o controlador se o circuito estiver aberto
+    e CallDeadlineExceeded se o prazo acabar antes de uma tentativa.
+    """
+    if deadline is None:
+        deadline = call_deadline()
+    timeout = kwargs.pop('timeout', None) or timeout_for(url)
+    tentativas = max_attempts(method)
+    for tentativa in range(1, tentativas + 1):
+        kwargs['timeout'] = limit_timeout(timeout, deadline)
+        breaker.before_call()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            breaker.record_failure()
+            espera = backoff_delay(tentativa)
+            if not can_retry(tentativa, tentativas, espera, deadline):
+                raise
+            logger.warning(f'Falha de rede no UniFi Controller ({method} {url}): {str(e)}; nova tentativa')
+        except Exception:
+            # Erro que não indica problema no controlador (URL inválida, etc.)
+            breaker.release_trial()
+            raise
+        else:
+            if is_failure_status(response.status_code):
+                breaker.record_failure()
+                espera = backoff_delay(tentativa)
+                if (response.status_code not in RETRYABLE_STATUS
+                        or not can_retry(tentativa, tentativas, espera, deadline)):
+                    return response
+                logger.warning(f'UniFi Controller respondeu {response.status_code} ({method} {url}); nova tentativa')
+            else:
+                breaker.record_success()
+                return response
+        metrics.track_api_retry(method)
+        time.sleep(espera)
@@ -0,0 +1,204 @@
+"""
+Pool de sessões autenticadas com o UniFi Controller.
+
+Cada worker do gunicorn mantém uma única sessão HTTP (keep-alive) por
+controlador/usuário, compartilhada por UnifiController, UniFiControllerAPI e
+UniFiGuestAPI. O login é feito uma vez e refeito de forma transparente quando
+o controlador responde 401 (cookie expirado).
+"""
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+import urllib3
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .request_timing import medir
+from .unifi_resilience import call_deadline, get_breaker, send_with_resilience
+
+# Desabilitar avisos de SSL para certificados auto-assinados
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Mensagens do controlador que indicam sessão expirada mesmo com status 200/400
+LOGIN_REQUIRED_MESSAGES = ('api.err.LoginRequired', 'api.err.Invalid')
+
+
+class ControllerSession:
+    """
+    Sessão autenticada e reutilizável com um UniFi Controller.
+
+    Expõe get/post/put com a mesma assinatura de requests.Session, aceitando
+    URLs absolutas. Se a resposta indicar sessão expirada, faz um novo login
+    e repete a requisição uma única vez.
+
+    Todas as chamadas passam por unifi_resilience (timeout por endpoint,
+    circuit breaker e novas tentativas para métodos idempotentes).
+    """
+
+    def __init__(self, base_url: str, username: str, password: str, verify_ssl: bool = False):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.verify_ssl = verify_ssl
+        self.logged_in = False
+        # Incrementado a cada login: quem recebeu 401 só refaz o login se ninguém o fez depois
+        self._login_generation = 0
+        self._lock = threading.RLock()
+        self.breaker = get_breaker(self.base_url)
+
+        pool_maxsize = getattr(settings, 'UNIFI_SESSION_POOL_MAXSIZE', 10)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.verify = verify_ssl
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def cookies(self):
+        return self.session.cookies
+
+    def login(self, reason: str = 'initial', deadline: Optional[float] = None) -> requests.Response:
+        """
+        Faz login no controlador e guarda o cookie na sessão compartilhada.
+
+        `deadline` é o prazo da chamada que provocou o login (ver unifi_resilience).
+
+        Levanta requests.HTTPError se o controlador recusar as credenciais.
+        """
+        with self._lock:
+            self.logged_in = False
+            response = self._send(
+                'POST',
+                f"{self.base_url}/api/login",
+                json={"username": self.username, "password": self.password},
+                headers={"Content-Type": "application/json"},
+                deadline=deadline,
+            )
+            if response.status_code != 200:
+                metrics.track_controller_login(reason=reason, success=False)
+                response.raise_for_status()
+                # Status 2xx/3xx diferente de 200 também não é um login válido
+                raise requests.HTTPError(
+                    f"Login recusado pelo UniFi Controller (status {response.status_code})",
+                    response=response,
+                )
+
+            self.logged_in = True
+            self._login_generation += 1
+            metrics.track_controller_login(reason=reason, success=True)
+            logger.info(f'Sessão autenticada no UniFi Controller {self.base_url} ({reason})')
+            return response
+
+    def ensure_logged_in(self, deadline: Optional[float] = None) -> None:
+        """Faz login apenas se a sessão ainda não estiver autenticada."""
+        if self.logged_in:
+            return
+        with self._lock:
+            if not self.logged_in:
+                self.login(deadline=deadline)
+
+    def logout(self) -> None:
+        """Encerra a sessão no controlador; o próximo uso fará novo login."""
+        with self._lock:
+            try:
+                self._send('GET', f"{self.base_url}/api/logout")
+            except requests.RequestException:
+                pass
+            self.session.cookies.clear()
+            self.logged_in = False
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Executa uma requisição autenticada, refazendo o login uma vez se necessário.
+
+        Login, tentativas e o novo envio compartilham o mesmo prazo (UNIFI_CALL_DEADLINE).
+        """
+        deadline = call_deadline()
+        with medir('unifi'):
+            self.ensure_logged_in(deadline)
+            generation = self._login_generation
+            response = self._send(method, url, deadline=deadline, **kwargs)
+            if self._login_required(response):
+                # Várias threads podem receber 401 do mesmo cookie expirado: só a primeira faz login
+                with self._lock:
+                    if self._login_generation == generation:
+                        logger.info(f'Sessão do UniFi Controller expirada, refazendo login ({method} {url})')
+                        self.login(reason='expired', deadline=deadline)
+                response = self._send(method, url, deadline=deadline, **kwargs)
+        return response
+
+    def _send(self, method: str, url: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        return send_with_resilience(self.session, self.breaker, method, url, deadline=deadline, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    @staticmethod
+    def _login_required(response: requests.Response) -> bool:
+        if response.status_code == 401:
+            return True
+        if response.status_code in (400, 403) and any(
+            msg in response.text for msg in LOGIN_REQUIRED_MESSAGES
+        ):
+            return True
+        return False
+
+
+_pool: Dict[Tuple[str, str, bool], ControllerSession] = {}
+_pool_lock = threading.Lock()
+_pool_pid: Optional[int] = None
+
+
+def get_controller_session(base_url: str, username: str, password: str,
+                           verify_ssl: bool = False) -> ControllerSession:
+    """
+    Retorna a sessão compartilhada para o controlador/usuário informado.
+
+    Sessões com e sem verificação de certificado são mantidas separadas, para
+    que um chamador com verify_ssl=False não desative a verificação de quem a
+    exige. O pool é por processo: após um fork (gunicorn --preload) as sessões
+    herdadas são descartadas para não compartilhar sockets entre workers.
+    """
+    global _pool_pid
+    key = (base_url.rstrip('/'), username, verify_ssl)
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool.clear()
+            _pool_pid = os.getpid()
+
+        controller_session = _pool.get(key)
+        if controller_session is None or controller_session.password != password:
+            controller_session = ControllerSession(base_url, username, password, verify_ssl)
+            _pool[key] = controller_session
+            metrics.update_session_pool_size(len(_pool))
+        return controller_session
+
+
+def get_default_controller_session() -> ControllerSession:
+    """Sessão compartilhada para o controlador definido em UNIFI_CONTROLLER_CONFIG."""
+    config = settings.UNIFI_CONTROLLER_CONFIG
+    return get_controller_session(
+        base_url=f"https://{config['IP']}:{config['PORT']}",
+        username=config['USERNAME'],
+        password=config['PASSWORD'],
+        verify_ssl=getattr(settings, 'UNIFI_VERIFY_SSL', False),
+    )
+
+
+def reset_session_pool() -> None:
+    """Descarta todas as sessões do processo atual."""
+    with _pool_lock:
+        _pool.clear()
+        metrics.update_session_pool_size(0)
@@ -1,11 +1,12 @@
 import json
 import logging
+from functools import wraps
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
@@ -13,7 +14,12 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Q
 
 from .models import Visitante, VisitanteDispositivo
-from .unifi import UnifiController
+from .unifi_async import AsyncUnifiController
+from .client_ip import get_client_ip
+from .client_snapshot import get_client_snapshot_service
+from .auth_status_cache import visitante_autorizado_por_ip
+from .visitante_expiracao import autorizado_ate
+from .tracing import span, traced
 from .forms import VisitanteDispositivoForm
 
 logger = logging.getLogger('unifi_auth_app')
@@ -28,60 +34,60 @@ def home(request):
     )
 
 
-def get_client_ip(request):
-    """
-    Obtém o endereço IP do cliente a partir do cabeçalho
-    X-Forwarded-For ou REMOTE_ADDR
-    """
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        return x_forwarded_for.split(',')[0]
-    return request.META.get('REMOTE_ADDR')
-
-
 def get_mac_from_ip(ip):
-    """Obtém o endereço MAC a partir do IP usando a API do UniFi"""
+    """Obtém o endereço MAC a partir do IP usando o snapshot de clientes do UniFi"""
     try:
-        controller = UnifiController()
-        if not controller.logged_in and not controller.login():
-            return None
-            
-        url = f"{controller.base_url}/api/s/{controller.site_id}/stat/sta"
-        response = controller.session.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            clients = response.json().get('data', [])
-            for client in clients:
-                if client.get('ip') == ip:
-                    return client.get('mac')
+        return get_client_snapshot_service().mac_for_ip(ip)
     except Exception as e:
         logger.error(f"Erro ao obter MAC do IP {ip}: {str(e)}")
     return None
 
 
-@csrf_exempt
-@require_http_methods(["GET"])
-def check_auth_status(request):
+# O snapshot responde da memória; só a carga inicial bloqueia, fora do event loop
+aget_mac_from_ip = sync_to_async(get_mac_from_ip, thread_sensitive=False)
+
+
+def async_csrf_exempt(view_func):
+    """
+    Equivalente ao csrf_exempt para views assíncronas.
+    O decorator do Django 4.2 envolve a view em uma função síncrona.
+    """
+    view_func.csrf_exempt = True
+    return view_func
+
+
+def async_require_http_methods(request_method_list):
+    """Equivalente ao require_http_methods para views assíncronas."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def inner(request, *args, **kwargs):
+            if request.method not in request_method_list:
+                logger.warning(f"Método não permitido ({request.method}): {request.path}")
+                return HttpResponseNotAllowed(request_method_list)
+            return await view_func(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+@async_csrf_exempt
+@async_require_http_methods(["GET"])
+async def check_auth_status(request):
     """Verifica se o IP atual precisa de autenticação"""
     client_ip = get_client_ip(request)
     if not client_ip:
         return JsonResponse({'error': 'Não foi possível determinar o endereço IP'}, status=400)
     
-    # Verifica se já existe um visitante autorizado com este IP
-    visitante = Visitante.objects.filter(ip_address=client_ip, autorizado=True).first()
+    # Verifica se já existe um visitante autorizado com este IP (cache em memória e compartilhado)
+    visitante = await sync_to_async(visitante_autorizado_por_ip)(client_ip)
     if visitante:
         return JsonResponse({
             'status': 'authorized',
             'message': 'Usuário já autorizado',
-            'data': {
-                'nome': visitante.nome,
-                'email': visitante.email,
-                'data_acesso': visitante.data_acesso.isoformat()
-            }
+            'data': visitante
         })
     
     # Tenta obter o MAC address do cliente
-    mac_address = get_mac_from_ip(client_ip)
+    mac_address = await aget_mac_from_ip(client_ip)
     
     return JsonResponse({
         'status': 'unauthorized',
@@ -91,9 +97,10 @@ def check_auth_status(request):
     })
 
 
-@csrf_exempt
-@require_http_methods(["POST", "OPTIONS"])
-def authorize_visitor(request):
+@async_csrf_exempt
+@async_require_http_methods(["POST", "OPTIONS"])
+@traced('authorize_visitor')
+async def authorize_visitor(request):
     """Endpoint para autorizar um visitante na rede"""
     logger.info(f"Requisição recebida: {request.method} {request.path}")
     logger.info(f"Cabeçalhos: {dict(request.headers)}")
@@ -112,7 +119,8 @@ def authorize_visitor(request):
         
     try:
         logger.info(f"Corpo da requisição: {request.body}")
-        data = json.loads(request.body)
+        with span('parse_json'):
+            data = json.loads(request.body)
         logger.info(f"Dados decodificados: {data}")
         
         # Validação dos dados
@@ -131,7 +139,8 @@ def authorize_visitor(request):
         # Tenta obter o MAC do cliente se não foi fornecido
         mac_address = data.get('mac_address')
         if not mac_address:
-            mac_address = get_mac_from_ip(client_ip)
+            with span('ip_to_mac'):
+                mac_address = await aget_mac_from_ip(client_ip)
             if not mac_address:
                 response = JsonResponse(
                     {'success': False, 'error': 'Não foi possível obter o endereço MAC do dispositivo'}, 
@@ -140,16 +149,20 @@ def authorize_visitor(request):
                 response["Access-Control-Allow-Origin"] = "*"
                 return response
         
+        minutes = int(data.get('minutes', 1440))  # 24h por padrão
+        
         # Cria o registro do visitante
         try:
-            visitante = Visitante.objects.create(
-                nome=data['nome'],
-                email=data['email'],
-                telefone=data['telefone'],
-                mac_address=mac_address,
-                ip_address=client_ip,
-                autorizado=True
-            )
+            with span('create_visitante'):
+                visitante = await Visitante.objects.acreate(
+                    nome=data['nome'],
+                    email=data['email'],
+                    telefone=data['telefone'],
+                    mac_address=mac_address,
+                    ip_address=client_ip,
+                    autorizado=True,
+                    autorizado_ate=autorizado_ate(minutes)
+                )
         except Exception as e:
             logger.error(f"Erro ao criar registro do visitante: {str(e)}")
             response = JsonResponse(
@@ -161,14 +174,17 @@ def authorize_visitor(request):
         
         # Autoriza o dispositivo no UniFi
         try:
-            controller = UnifiController()
-            if controller.login():
+            controller = AsyncUnifiController()
+            with span('controller_login'):
+                logado = await controller.login()
+            if logado:
                 # Tenta obter o AP do cliente
                 ap_mac = data.get('ap_mac')
                 if not ap_mac:
                     # Se o AP não foi fornecido, tenta obter da API do UniFi
                     try:
-                        client_info = controller.get_client_info(mac_address)
+                        with span('get_client_info'):
+                            client_info = await controller.get_client_info(mac_address)
                         if client_info and 'ap_mac' in client_info:
                             ap_mac = client_info['ap_mac']
                     except Exception as e:
@@ -176,8 +192,8 @@ def authorize_visitor(request):
                 
                 # Se tem o AP, tenta autorizar
                 if ap_mac:
-                    minutes = int(data.get('minutes', 1440))  # 24h por padrão
-                    success = controller.authorize_guest(mac_address, ap_mac, minutes=minutes)
+                    with span('authorize_guest'):
+                        success = await controller.authorize_guest(mac_address, ap_mac, minutes=minutes)
                     if not success:
                         logger.error(f"Falha ao autorizar o dispositivo {mac_address} no AP {ap_mac}")
                 else:
@@ -216,8 +232,8 @@ def authorize_visitor(request):
         response["Access-Control-Allow-Origin"] = "*"
         return response
 
-@csrf_exempt
-def authorize_guest_api(request):
+@async_csrf_exempt
+async def authorize_guest_api(request):
     """
     API endpoint para autorizar um convidado no UniFi Controller.
     Espera um POST com os seguintes parâmetros:
@@ -256,9 +272,9 @@ def authorize_guest_api(request):
         # Se o MAC do AP não foi fornecido, tenta obter do cliente conectado
         if not ap_mac:
             try:
-                controller = UnifiController()
-                if controller.login():
-                    client_info = controller.get_client_info(client_mac)
+                controller = AsyncUnifiController()
+                if await controller.login():
+                    client_info = await controller.get_client_info(client_mac)
                     if client_info and 'ap_mac' in client_info:
                         ap_mac = client_info['ap_mac']
             except Exception as e:
@@ -271,19 +287,20 @@ def authorize_guest_api(request):
         
         # Cria o registro do visitante
         try:
-            visitante = Visitante.objects.create(
+            visitante = await Visitante.objects.acreate(
                 nome=name,
                 email=email,
                 telefone=phone,
                 mac_address=client_mac,
                 ip_address=client_ip,
-                autorizado=True
+                autorizado=True,
+                autorizado_ate=autorizado_ate(minutes)
             )
             
             # Autoriza o dispositivo no UniFi
-            controller = UnifiController()
-            if controller.login():
-                success = controller.authorize_guest(client_mac, ap_mac, minutes=minutes)
+            controller = AsyncUnifiController()
+            if await controller.login():
+                success = await controller.authorize_guest(client_mac, ap_mac, minutes=minutes)
                 if not success:
                     logger.error(f"Falha ao autorizar o dispositivo {client_mac} no AP {ap_mac}")
                     return JsonResponse({
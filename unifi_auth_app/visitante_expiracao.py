@@ -0,0 +1,177 @@
+"""
+Expiração das autorizações de visitantes.
+
+As views do portal gravam em Visitante.autorizado_ate o fim do período
+concedido ao visitante (e VisitanteDispositivo.visitante_autorizado_ate pode
+limitar um dispositivo específico). O comando expire_visitors chama
+expirar_autorizacoes() periodicamente, que:
+
+- seleciona os registros vencidos em lotes, pelos índices de expiração, com
+  SELECT ... FOR UPDATE SKIP LOCKED (mais de um processo pode rodar junto);
+- desativa cada lote no banco com um único update(), sem disparar signals;
+- junta os MACs dos dispositivos desativados e o MAC informado no portal
+  (Visitante.mac_address) pelos visitantes expirados, menos os que continuam
+  autorizados por outro cadastro ativo;
+- registra as remoções na WhitelistOutbox (durável, e lida pelo serviço do
+  FreeRADIUS e pelo exportador do snapshot de MACs) com a próxima tentativa
+  adiada, e ao fim da varredura remove todos os MACs com uma única escrita
+  na whitelist. Se essa escrita falhar, o worker da fila assume as remoções.
+  Logo antes da escrita os MACs são conferidos de novo: os que foram
+  autorizados outra vez durante a varredura saem da escrita e da fila.
+
+Registros autorizados antes da existência de autorizado_ate receberam o
+prazo padrão do portal na migração 0024.
+"""
+import logging
+from datetime import timedelta
+from typing import Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .auth_status_cache import invalidar_ip
+from .mac_authorization import (
+    macs_dispositivos_autorizados,
+    macs_visitantes_autorizados,
+    macs_visitantes_portal_autorizados,
+)
+from .mac_utils import normalizar_macs
+from .models import Visitante, VisitanteDispositivo
+from .whitelist_outbox import (
+    ADIAMENTO_EM_LOTE,
+    aplicar_enfileirados,
+    cancelar_enfileirados,
+    enfileirar_em_lote,
+    ultimo_id,
+)
+
+logger = logging.getLogger('unifi_auth_app')
+
+def autorizado_ate(minutos: int):
+    """Momento em que expira uma autorização de `minutos` minutos concedida agora."""
+    return timezone.now() + timedelta(minutes=minutos)
+
+
+def ssid_visitantes() -> str:
+    return settings.UNIFI_SSID_VISITANTES
+
+
+def _normalizados(macs) -> Set[str]:
+    return {mac for mac in normalizar_macs(macs).macs if mac}
+
+
+def _macs_ainda_autorizados(macs: Set[str]) -> Set[str]:
+    """
+    MACs (normalizados) que continuam autorizados por outro cadastro: servidor,
+    dispositivo de visitante ou visitante do portal ativos.
+
+    `macs` deve trazer também a forma gravada no banco, já que o MAC do portal
+    não é normalizado ao ser salvo.
+    """
+    if not macs:
+        return set()
+    encontrados = list(macs_dispositivos_autorizados().filter(mac_address__in=macs))
+    encontrados += macs_visitantes_autorizados().filter(visitante_mac_address__in=macs)
+    encontrados += macs_visitantes_portal_autorizados().filter(mac_address__in=macs)
+    return _normalizados(encontrados)
+
+
+def _expirar_lote(agora, lote: int, ssid: str) -> Tuple[int, int, Set[str], Set[str]]:
+    """
+    Desativa um lote de visitantes e dispositivos vencidos.
+
+    Returns:
+        tuple: (visitantes, dispositivos, MACs normalizados a remover, MACs como gravados no banco)
+    """
+    with transaction.atomic():
+        visitantes = list(
+            Visitante.objects.select_for_update(skip_locked=True)
+            .filter(autorizado=True, autorizado_ate__lte=agora)
+            .order_by('autorizado_ate')
+            .values_list('id', 'ip_address', 'mac_address')[:lote]
+        )
+        visitante_ids = [visitante_id for visitante_id, _, _ in visitantes]
+
+        ativos = VisitanteDispositivo.objects.select_for_update(skip_locked=True).filter(
+            visitante_dispositivo_ativo=True
+        )
+        # Todos os dispositivos dos visitantes expirados e um lote dos que venceram por conta própria
+        dispositivos = list(
+            ativos.filter(visitante_id__in=visitante_ids).values_list('id', 'visitante_mac_address')
+        ) if visitante_ids else []
+        dispositivos += list(
+            ativos.filter(visitante_autorizado_ate__lte=agora)
+            .exclude(visitante_id__in=visitante_ids)
+            .values_list('id', 'visitante_mac_address')[:lote]
+        )
+        if not visitantes and not dispositivos:
+            return 0, 0, set(), set()
+
+        if visitante_ids:
+            Visitante.objects.filter(id__in=visitante_ids).update(autorizado=False)
+        if dispositivos:
+            VisitanteDispositivo.objects.filter(
+                id__in=[dispositivo_id for dispositivo_id, _ in dispositivos]
+            ).update(visitante_dispositivo_ativo=False)
+
+        # Mesmo SSID em que os signals adicionaram os dois tipos de MAC
+        gravados = {mac for _, mac in dispositivos if mac} | {mac for _, _, mac in visitantes if mac}
+        macs = _normalizados(gravados)
+        macs -= _macs_ainda_autorizados(gravados | macs)
+        enfileirar_em_lote(ssid, remover=macs, adiamento=ADIAMENTO_EM_LOTE)
+
+        ips = [ip for _, ip, _ in visitantes]
+        transaction.on_commit(lambda: invalidar_ip(*ips))
+
+    return len(visitantes), len(dispositivos), macs, gravados
+
+
+def expirar_autorizacoes(lote: int = 500, api=None) -> Tuple[int, int, int]:
+    """
+    Revoga as autorizações de visitantes e dispositivos vencidas.
+
+    Args:
+        lote (int): Quantidade máxima de visitantes por transação
+        api (UniFiControllerAPI, optional): API usada para a escrita na
+            whitelist; se não informada, usa a configurada nos signals
+
+    Returns:
+        tuple: (visitantes expirados, dispositivos desativados, MACs removidos da whitelist)
+    """
+    agora = timezone.now()
+    ssid = ssid_visitantes()
+    cursor = ultimo_id()
+
+    total_visitantes = total_dispositivos = 0
+    macs: Set[str] = set()
+    gravados: Set[str] = set()
+    while True:
+        visitantes, dispositivos, macs_lote, gravados_lote = _expirar_lote(agora, lote, ssid)
+        if not visitantes and not dispositivos:
+            break
+        total_visitantes += visitantes
+        total_dispositivos += dispositivos
+        macs |= macs_lote
+        gravados |= gravados_lote
+
+    metrics.track_visitor_expirations(total_visitantes, total_dispositivos)
+
+    # Um visitante pode ter autorizado de novo o mesmo MAC depois do update() do lote
+    reautorizados = _macs_ainda_autorizados(gravados | macs) & macs
+    if reautorizados:
+        cancelar_enfileirados(ssid, cursor, remover=reautorizados)
+        macs -= reautorizados
+    if not macs:
+        return total_visitantes, total_dispositivos, 0
+
+    # Todas as remoções da varredura em uma única escrita na whitelist
+    if not aplicar_enfileirados(ssid, cursor, remover=macs, api=api):
+        return total_visitantes, total_dispositivos, 0
+
+    logger.info(
+        f"[EXPIRAÇÃO] {total_visitantes} visitantes e {total_dispositivos} dispositivos expirados; "
+        f"{len(macs)} MACs removidos da whitelist do SSID '{ssid}'"
+    )
+    return total_visitantes, total_dispositivos, len(macs)
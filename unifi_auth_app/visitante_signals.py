@@ -2,6 +2,8 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import Visitante
 from .unifi_api import UniFiControllerAPI
+from .mac_utils import MacInvalido, normalizar_mac
+from .whitelist_outbox import enfileirar_adicao, enfileirar_remocao
 from django.conf import settings
 import logging
 
@@ -18,39 +20,35 @@ def get_unifi_api() -> UniFiControllerAPI:
         verify_ssl=False
     )
 
+def mac_do_visitante(instance):
+    """MAC informado no portal no formato da whitelist, ou None se vazio ou inválido."""
+    if not instance.mac_address:
+        return None
+    try:
+        return normalizar_mac(instance.mac_address)
+    except MacInvalido:
+        logger.warning(f"[SIGNAL] MAC inválido do visitante {instance.pk} ignorado: {instance.mac_address}")
+        return None
+
 @receiver(post_save, sender=Visitante)
 def autorizar_visitante_no_unifi(sender, instance, created, **kwargs):
     """Signal handler para autorizar um visitante quando ele é criado ou atualizado"""
-    if not instance.mac_address or not instance.autorizado:
+    mac = mac_do_visitante(instance) if instance.autorizado else None
+    if not mac:
         return
 
-    try:
-        logger.info(f"[SIGNAL] Visitante {'criado' if created else 'atualizado'}: {instance.nome} - {instance.mac_address}")
-        
-        # Usa o SSID específico para visitantes, ou o padrão se não estiver configurado
-        ssid_visitantes = getattr(settings, 'UNIFI_SSID_VISITANTES', 'Câmara')
-        
-        api = get_unifi_api()
-        resposta = api.add_mac_to_ssid_whitelist(instance.mac_address, ssid_name=ssid_visitantes)
-        logger.info(f"[UNI-FI] Visitante {instance.nome} - MAC {instance.mac_address} adicionado à whitelist do SSID '{ssid_visitantes}': {resposta}")
-
-    except Exception as e:
-        logger.error(f"[ERRO UNI-FI] Falha ao autorizar visitante {instance.nome} - MAC {instance.mac_address}: {str(e)}")
+    logger.info(f"[SIGNAL] Visitante {'criado' if created else 'atualizado'}: {instance.nome} - {instance.mac_address}")
+
+    # A alteração é aplicada no controlador pelo worker whitelist_outbox_worker
+    enfileirar_adicao(mac, settings.UNIFI_SSID_VISITANTES)
 
 @receiver(post_delete, sender=Visitante)
 def desautorizar_visitante_no_unifi(sender, instance, **kwargs):
     """Signal handler para desautorizar um visitante quando ele é removido"""
-    if not instance.mac_address:
+    mac = mac_do_visitante(instance)
+    if not mac:
         return
-        
-    try:
-        logger.info(f"[SIGNAL] Visitante removido: {instance.nome} - {instance.mac_address}")
-        
-        # Usa o SSID específico para visitantes, ou o padrão se não estiver configurado
-        ssid_visitantes = getattr(settings, 'UNIFI_SSID_VISITANTES', 'Câmara')
-        
-        api = get_unifi_api()
-        resposta = api.remove_mac_from_ssid_whitelist(instance.mac_address, ssid_name=ssid_visitantes)
-        logger.info(f"[UNI-FI] Visitante {instance.nome} - MAC {instance.mac_address} removido da whitelist do SSID '{ssid_visitantes}': {resposta}")
-    except Exception as e:
-        logger.error(f"[ERRO UNI-FI] Falha ao remover visitante {instance.nome} - MAC {instance.mac_address}: {e}")
+
+    logger.info(f"[SIGNAL] Visitante removido: {instance.nome} - {instance.mac_address}")
+
+    enfileirar_remocao(mac, settings.UNIFI_SSID_VISITANTES)
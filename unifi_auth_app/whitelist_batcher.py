@@ -0,0 +1,98 @@
+"""
+Agrupamento de alterações na whitelist dos SSIDs do UniFi.
+
+Cada escrita na whitelist é um PUT da lista completa de MACs do SSID. O
+WhitelistBatcher acumula adições e remoções por SSID durante uma janela curta
+(limitada por tempo e por quantidade), calcula a diferença líquida e aplica
+tudo com um único _update_whitelist por SSID a cada flush.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('unifi_auth_app')
+
+ADICIONAR = 'add'
+REMOVER = 'remove'
+
+
+class WhitelistBatcher:
+    """
+    Acumula alterações de whitelist e as aplica em lote.
+
+    Para um mesmo MAC e SSID, prevalece a última operação registrada.
+    O flush acontece automaticamente quando o lote atinge `max_batch`
+    alterações ou quando a alteração mais antiga passa de `max_wait` segundos;
+    flush() também pode ser chamado explicitamente.
+    """
+
+    def __init__(self, api, max_batch: Optional[int] = None, max_wait: Optional[float] = None):
+        self.api = api
+        self.max_batch = max_batch or getattr(settings, 'WHITELIST_BATCH_MAX_SIZE', 200)
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'WHITELIST_BATCH_MAX_WAIT', 2.0)
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, mac: str, ssid: str) -> None:
+        self._register(mac, ssid, ADICIONAR)
+
+    def remove(self, mac: str, ssid: str) -> None:
+        self._register(mac, ssid, REMOVER)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(changes) for changes in self._pending.values())
+
+    def _register(self, mac: str, ssid: str, operacao: str) -> None:
+        with self._lock:
+            self._pending.setdefault(ssid, {})[mac.upper()] = operacao
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        if self.should_flush():
+            self.flush()
+
+    def should_flush(self) -> bool:
+        with self._lock:
+            if self._oldest is None:
+                return False
+            size = sum(len(changes) for changes in self._pending.values())
+            return size >= self.max_batch or time.monotonic() - self._oldest >= self.max_wait
+
+    def flush(self) -> Dict[str, Optional[Exception]]:
+        """
+        Aplica as alterações acumuladas, um PUT por SSID.
+
+        Returns:
+            dict: SSID -> None em caso de sucesso, ou a exceção levantada.
+            Uma falha em um SSID não impede o processamento dos demais.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._oldest = None
+
+        results: Dict[str, Optional[Exception]] = {}
+        for ssid, changes in pending.items():
+            adicionar = {mac for mac, op in changes.items() if op == ADICIONAR}
+            remover = {mac for mac, op in changes.items() if op == REMOVER}
+
+            start_time = time.perf_counter()
+            try:
+                self.api.apply_whitelist_changes(ssid, add=adicionar, remove=remover)
+                results[ssid] = None
+                logger.info(
+                    f"Whitelist do SSID '{ssid}' atualizada em lote: "
+                    f"+{len(adicionar)} / -{len(remover)} MACs"
+                )
+            except Exception as e:
+                results[ssid] = e
+                logger.error(f"Erro ao aplicar lote na whitelist do SSID '{ssid}': {str(e)}")
+            finally:
+                metrics.track_whitelist_flush(len(changes), time.perf_counter() - start_time)
+
+        return results
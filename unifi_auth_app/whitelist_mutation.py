@@ -0,0 +1,173 @@
+"""
+Escritas na whitelist (mac_filter_list) de um SSID com detecção de conflito.
+
+O controlador UniFi só aceita a lista completa no PUT de rest/wlanconf, então
+dois escritores que partem de leituras diferentes sobrescrevem as alterações
+um do outro. Para evitar isso, WhitelistMutator.apply:
+
+1. bloqueia a linha do SSID em WhitelistLock (SELECT ... FOR UPDATE), o que
+   serializa os escritores de todos os processos que usam o mesmo banco. O
+   lock é pedido com NOWAIT e repetido até WHITELIST_LOCK_WAIT segundos,
+   abaixo do innodb_lock_wait_timeout: como o dono o mantém durante as
+   chamadas ao controlador, quem espera desiste com WhitelistLockTimeout
+   em vez de esgotar o lock wait do banco;
+2. relê a whitelist do controlador imediatamente antes de gravar (nunca usa
+   uma lista em cache) e aplica apenas a diferença pedida;
+3. relê a lista após o PUT e confere se as adições estão presentes e as
+   remoções ausentes. Se não estiverem, outro escritor (por exemplo a
+   interface do controlador) gravou no meio: a perda é contada em
+   unifi_whitelist_lost_updates_total e o ciclo é repetido.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from . import metrics
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Intervalo entre as tentativas de obter o lock do SSID, em segundos
+LOCK_POLL_INTERVAL = 0.1
+
+
+class WhitelistConflictError(Exception):
+    """A whitelist continuou divergente após todas as tentativas de escrita."""
+
+
+class WhitelistLockTimeout(WhitelistConflictError):
+    """Outro escritor manteve o lock do SSID por mais de WHITELIST_LOCK_WAIT segundos."""
+
+
+@contextmanager
+def ssid_lock(ssid_name: str, lock_wait: Optional[float] = None):
+    """
+    Lock exclusivo, entre processos, para escrever na whitelist do SSID.
+
+    Mantém uma transação aberta até o fim do bloco; dentro de uma transação
+    já existente o lock dura até o commit externo.
+
+    Raises:
+        WhitelistLockTimeout: Se o lock não for obtido em `lock_wait`
+            segundos (padrão: WHITELIST_LOCK_WAIT)
+    """
+    from .models import WhitelistLock
+
+    if lock_wait is None:
+        lock_wait = getattr(settings, 'WHITELIST_LOCK_WAIT', 10.0)
+    WhitelistLock.objects.get_or_create(ssid=ssid_name)
+    inicio = time.monotonic()
+    with transaction.atomic():
+        while True:
+            try:
+                # Savepoint: a falha do NOWAIT não invalida a transação externa
+                with transaction.atomic():
+                    WhitelistLock.objects.select_for_update(nowait=True).get(ssid=ssid_name)
+                break
+            except OperationalError:
+                if time.monotonic() - inicio >= lock_wait:
+                    metrics.track_whitelist_lock_wait(time.monotonic() - inicio)
+                    raise WhitelistLockTimeout(
+                        f"Lock da whitelist do SSID '{ssid_name}' ocupado por mais de {lock_wait}s"
+                    )
+                time.sleep(LOCK_POLL_INTERVAL)
+        metrics.track_whitelist_lock_wait(time.monotonic() - inicio)
+        yield
+
+
+def _normalizar(macs: Iterable[str]) -> Set[str]:
+    return {mac.upper() for mac in macs}
+
+
+class WhitelistMutator:
+    """
+    Aplica adições e remoções na whitelist de um SSID com leitura, escrita e verificação.
+    """
+
+    def __init__(self, session, base_url: str, site: str, verify_ssl: bool = False,
+                 max_tentativas: Optional[int] = None):
+        self.session = session
+        self.base_url = base_url
+        self.site = site
+        self.verify_ssl = verify_ssl
+        self.max_tentativas = max_tentativas or getattr(settings, 'WHITELIST_WRITE_MAX_ATTEMPTS', 3)
+
+    def fetch(self, ssid_name: str) -> dict:
+        """Lê a configuração atual do SSID diretamente do controlador."""
+        url = f"{self.base_url}/api/s/{self.site}/rest/wlanconf"
+        response = self.session.get(url, verify=self.verify_ssl)
+        response.raise_for_status()
+        ssids = response.json().get('data', [])
+        ssid_obj = next((s for s in ssids if s.get('name') == ssid_name), None)
+        if not ssid_obj:
+            raise Exception(f"SSID '{ssid_name}' não encontrado")
+        return ssid_obj
+
+    def whitelist(self, ssid_name: str) -> Set[str]:
+        """MACs da whitelist atual do SSID, normalizados como em apply()."""
+        return _normalizar(self.fetch(ssid_name).get('mac_filter_list', []))
+
+    @metrics.track_api_call('update_whitelist')
+    def write(self, ssid_id: str, whitelist: Iterable[str]) -> dict:
+        """Grava a whitelist completa de um SSID (PUT rest/wlanconf/<id>)."""
+        whitelist = sorted(whitelist)
+        update_url = f"{self.base_url}/api/s/{self.site}/rest/wlanconf/{ssid_id}"
+        data = {
+            "mac_filter_list": whitelist,
+            "mac_filter_enabled": True,
+            "mac_filter_policy": "allow"
+        }
+        resp = self.session.put(update_url, json=data, verify=self.verify_ssl)
+        resp.raise_for_status()
+        metrics.update_mac_count(len(whitelist))
+        return resp.json()
+
+    def apply(self, ssid_name: str, add: Iterable[str] = (),
+              remove: Iterable[str] = ()) -> Tuple[dict, dict]:
+        """
+        Aplica as alterações na whitelist do SSID sob o lock do SSID.
+
+        Um MAC presente nos dois conjuntos é removido. Se a whitelist já
+        estiver no estado desejado, nenhuma requisição de escrita é feita.
+
+        Returns:
+            tuple: (resposta do PUT, ou {"msg": ...} se nada precisou ser
+            gravado; configuração do SSID lida por último)
+
+        Raises:
+            WhitelistConflictError: Se a lista continuar divergente após
+                max_tentativas escritas
+        """
+        to_remove = _normalizar(remove)
+        to_add = _normalizar(add) - to_remove
+
+        with ssid_lock(ssid_name):
+            ssid_obj = self.fetch(ssid_name)
+            for tentativa in range(1, self.max_tentativas + 1):
+                current = _normalizar(ssid_obj.get('mac_filter_list', []))
+                whitelist = (current | to_add) - to_remove
+                if whitelist == current:
+                    return {"msg": "Whitelist já está atualizada"}, ssid_obj
+
+                result = self.write(ssid_obj['_id'], whitelist)
+
+                ssid_obj = self.fetch(ssid_name)
+                gravada = _normalizar(ssid_obj.get('mac_filter_list', []))
+                faltando = to_add - gravada
+                sobrando = to_remove & gravada
+                if not faltando and not sobrando:
+                    return result, ssid_obj
+
+                metrics.track_whitelist_lost_update(ssid_name)
+                logger.warning(
+                    f"Whitelist do SSID '{ssid_name}' divergente após a escrita "
+                    f"(tentativa {tentativa}/{self.max_tentativas}): "
+                    f"{len(faltando)} MAC(s) ausentes, {len(sobrando)} não removidos"
+                )
+
+        raise WhitelistConflictError(
+            f"Whitelist do SSID '{ssid_name}' continuou divergente após {self.max_tentativas} tentativas"
+        )
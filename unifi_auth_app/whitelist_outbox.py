@@ -0,0 +1,243 @@
+"""
+Fila de saída (outbox) para alterações na whitelist de SSIDs do UniFi.
+
+Os signals apenas gravam a alteração na tabela WhitelistOutbox, dentro da
+mesma transação que salvou o dispositivo, e a requisição retorna sem falar
+com o controlador. O comando whitelist_outbox_worker consome a fila e repete
+com backoff exponencial as operações que falharem.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import WhitelistOutbox
+from .whitelist_batcher import WhitelistBatcher
+
+logger = logging.getLogger('unifi_auth_app')
+
+# Chave usada para acordar o worker logo após o commit de uma nova alteração
+WAKE_KEY = 'unifi:whitelist_outbox:wake'
+
+# Adiamento usado por quem enfileira em lote e aplica as alterações por conta própria
+ADIAMENTO_EM_LOTE = timedelta(minutes=5)
+
+
+def enfileirar(mac_address, ssid, operacao):
+    """
+    Registra uma alteração na whitelist para processamento em segundo plano.
+
+    Args:
+        mac_address (str): Endereço MAC afetado
+        ssid (str): Nome da rede Wi-Fi
+        operacao (str): WhitelistOutbox.OPERACAO_ADICIONAR ou OPERACAO_REMOVER
+
+    Returns:
+        WhitelistOutbox: O registro criado, ou None se não houver MAC/SSID
+    """
+    if not mac_address or not ssid:
+        logger.warning(f"Alteração de whitelist ignorada: MAC '{mac_address}' / SSID '{ssid}'")
+        return None
+
+    item = WhitelistOutbox.objects.create(
+        mac_address=mac_address.upper(),
+        ssid=ssid,
+        operacao=operacao,
+    )
+    transaction.on_commit(_notificar_worker)
+    logger.info(f"[OUTBOX] {item} enfileirado")
+    return item
+
+
+def enfileirar_adicao(mac_address, ssid):
+    return enfileirar(mac_address, ssid, WhitelistOutbox.OPERACAO_ADICIONAR)
+
+
+def enfileirar_remocao(mac_address, ssid):
+    return enfileirar(mac_address, ssid, WhitelistOutbox.OPERACAO_REMOVER)
+
+
+def ultimo_id() -> int:
+    """Id da alteração mais recente da fila (0 se vazia)."""
+    return WhitelistOutbox.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def enfileirar_em_lote(ssid, adicionar=(), remover=(), adiamento: Optional[timedelta] = None) -> int:
+    """
+    Registra várias alterações de uma vez (um único INSERT em lote).
+
+    Com `adiamento`, o worker só processa as alterações depois desse tempo,
+    dando a quem enfileirou a chance de aplicá-las antes com
+    aplicar_enfileirados().
+
+    Returns:
+        int: Quantidade de alterações registradas
+    """
+    proxima_tentativa = timezone.now() + (adiamento or timedelta(0))
+    itens = [
+        WhitelistOutbox(mac_address=mac.upper(), ssid=ssid, operacao=operacao, proxima_tentativa=proxima_tentativa)
+        for operacao, macs in (
+            (WhitelistOutbox.OPERACAO_ADICIONAR, adicionar),
+            (WhitelistOutbox.OPERACAO_REMOVER, remover),
+        )
+        for mac in sorted(macs)
+    ]
+    WhitelistOutbox.objects.bulk_create(itens)
+    if itens and adiamento is None:
+        transaction.on_commit(_notificar_worker)
+    return len(itens)
+
+
+def aplicar_enfileirados(ssid, cursor: int, adicionar=(), remover=(), api=None) -> bool:
+    """
+    Aplica com uma única escrita na whitelist alterações enfileiradas após `cursor`.
+
+    Em caso de sucesso as alterações são marcadas como concluídas; se a API
+    não estiver disponível ou a escrita falhar, elas ficam para o worker.
+
+    Returns:
+        bool: True se a whitelist foi atualizada
+    """
+    adicionar, remover = set(adicionar), set(remover)
+    if not adicionar and not remover:
+        return True
+
+    if api is None:
+        from .signals import get_unifi_api
+        api = get_unifi_api()
+    if api is None:
+        logger.warning(f"[OUTBOX] API do UniFi indisponível; {len(adicionar) + len(remover)} alterações ficam para o worker")
+        return False
+
+    try:
+        api.apply_whitelist_changes(ssid, add=adicionar, remove=remover)
+    except Exception as e:
+        logger.error(f"[OUTBOX] Erro ao aplicar {len(adicionar) + len(remover)} alterações no SSID '{ssid}'; o worker tentará novamente: {str(e)}")
+        return False
+
+    _concluir_enfileirados(ssid, cursor, adicionar, remover, tentativas=1)
+    return True
+
+
+def cancelar_enfileirados(ssid, cursor: int, adicionar=(), remover=()) -> None:
+    """
+    Marca como concluídas, sem aplicar, alterações enfileiradas após `cursor`.
+
+    Usado quando quem enfileirou descobre, antes de aplicar, que a alteração
+    não deve mais ser feita (por exemplo, o MAC foi autorizado de novo).
+    """
+    _concluir_enfileirados(ssid, cursor, adicionar, remover, tentativas=0)
+
+
+def _concluir_enfileirados(ssid, cursor: int, adicionar, remover, tentativas: int) -> None:
+    for operacao, macs in ((WhitelistOutbox.OPERACAO_ADICIONAR, adicionar), (WhitelistOutbox.OPERACAO_REMOVER, remover)):
+        macs = sorted(mac.upper() for mac in macs)
+        for inicio in range(0, len(macs), 500):
+            WhitelistOutbox.objects.filter(
+                id__gt=cursor,
+                ssid=ssid,
+                operacao=operacao,
+                status=WhitelistOutbox.STATUS_PENDENTE,
+                mac_address__in=macs[inicio:inicio + 500],
+            ).update(status=WhitelistOutbox.STATUS_CONCLUIDO, processado_em=timezone.now(), tentativas=tentativas)
+
+
+def _notificar_worker():
+    try:
+        cache.set(WAKE_KEY, time.time(), timeout=None)
+    except Exception as e:
+        # O worker também consulta a fila periodicamente
+        logger.warning(f"[OUTBOX] Não foi possível notificar o worker: {str(e)}")
+
+
+def ultima_notificacao() -> Optional[float]:
+    """Momento da última alteração enfileirada (usado pelo worker para acordar)."""
+    return cache.get(WAKE_KEY)
+
+
+def _backoff(tentativas: int) -> timedelta:
+    base = getattr(settings, 'WHITELIST_OUTBOX_BACKOFF_BASE', 5)
+    maximo = getattr(settings, 'WHITELIST_OUTBOX_BACKOFF_MAX', 600)
+    return timedelta(seconds=min(base * (2 ** (tentativas - 1)), maximo))
+
+
+def processar_pendentes(api=None, limite: int = 100) -> Tuple[int, int]:
+    """
+    Processa um lote de alterações pendentes cuja próxima tentativa já venceu.
+
+    As alterações são agrupadas por SSID e aplicadas com um único PUT da
+    whitelist para cada SSID (ver WhitelistBatcher).
+
+    As linhas são bloqueadas com SELECT ... FOR UPDATE SKIP LOCKED, permitindo
+    mais de um worker em paralelo sem processar a mesma alteração duas vezes.
+
+    Returns:
+        tuple: (quantidade processada com sucesso, quantidade com falha)
+    """
+    max_tentativas = getattr(settings, 'WHITELIST_OUTBOX_MAX_TENTATIVAS', 10)
+    sucesso = falhas = 0
+
+    with transaction.atomic():
+        itens = list(
+            WhitelistOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=WhitelistOutbox.STATUS_PENDENTE, proxima_tentativa__lte=timezone.now())
+            .order_by('id')[:limite]
+        )
+        if not itens:
+            return 0, 0
+
+        if api is None:
+            from .signals import get_unifi_api
+            api = get_unifi_api()
+
+        # Todas as alterações do lote viram um único PUT por SSID
+        if api is None:
+            erro_api = RuntimeError('API do UniFi não configurada ou indisponível')
+            resultados = {item.ssid: erro_api for item in itens}
+        else:
+            batcher = WhitelistBatcher(api, max_batch=len(itens) + 1, max_wait=float('inf'))
+            for item in itens:
+                if item.operacao == WhitelistOutbox.OPERACAO_ADICIONAR:
+                    batcher.add(item.mac_address, item.ssid)
+                else:
+                    batcher.remove(item.mac_address, item.ssid)
+            resultados = batcher.flush()
+
+        for item in itens:
+            item.tentativas += 1
+            erro = resultados.get(item.ssid)
+            if erro is not None:
+                falhas += 1
+                item.ultimo_erro = str(erro)
+                if item.tentativas >= max_tentativas:
+                    item.status = WhitelistOutbox.STATUS_FALHOU
+                    logger.error(f"[OUTBOX] {item} desistindo após {item.tentativas} tentativas: {erro}")
+                else:
+                    item.proxima_tentativa = timezone.now() + _backoff(item.tentativas)
+                    logger.warning(f"[OUTBOX] Falha ao processar {item} (tentativa {item.tentativas}): {erro}")
+            else:
+                sucesso += 1
+                item.status = WhitelistOutbox.STATUS_CONCLUIDO
+                item.processado_em = timezone.now()
+                item.ultimo_erro = ''
+
+        WhitelistOutbox.objects.bulk_update(
+            itens, ['status', 'tentativas', 'proxima_tentativa', 'ultimo_erro', 'processado_em']
+        )
+
+    return sucesso, falhas
+
+
+def remover_concluidos(dias: int) -> int:
+    """Apaga alterações concluídas há mais de `dias` dias. Retorna a quantidade apagada."""
+    limite = timezone.now() - timedelta(days=dias)
+    apagados, _ = WhitelistOutbox.objects.filter(
+        status=WhitelistOutbox.STATUS_CONCLUIDO,
+        processado_em__lt=limite,
+    ).delete()
+    return apagados
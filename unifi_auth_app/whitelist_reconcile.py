@@ -0,0 +1,169 @@
+"""
+Reconciliação da whitelist dos SSIDs com os MACs autorizados no banco.
+
+Os signals e a fila WhitelistOutbox mantêm a whitelist atualizada alteração
+por alteração; se uma delas se perder (falha definitiva na fila, alteração
+feita direto no controlador, restauração de backup), a diferença ficaria
+permanente. reconciliar() compara o estado inteiro de uma vez:
+
+- a whitelist de cada SSID lida com WhitelistMutator.whitelist(), a mesma
+  leitura e normalização usadas pelas escritas;
+- os MACs esperados em cada SSID lidos em streaming (values_list(...).iterator())
+  para um set por SSID, com o mesmo roteamento dos signals: dispositivos de
+  servidores em UNIFI_SSID; dispositivos de visitantes e MACs de visitantes
+  autorizados pelo portal em UNIFI_SSID_VISITANTES;
+- diferenças calculadas com operações de conjunto e aplicadas com uma única
+  escrita por SSID (UniFiControllerAPI.apply_whitelist_changes).
+
+Com aplicar=True a leitura, a diferença e a escrita de cada SSID acontecem
+sob ssid_lock(ssid): nenhum outro escritor altera a whitelist entre a
+leitura e a escrita, e os MACs pendentes na fila são lidos já com o lock.
+
+MACs com alterações ainda pendentes na fila são deixados para o worker.
+SSIDs que não recebem MACs do banco não são reconciliados (todos os MACs
+deles seriam removidos). Por padrão apenas as diferenças são calculadas;
+a escrita no controlador precisa ser pedida (aplicar=True).
+"""
+import logging
+import time
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import metrics
+from .mac_authorization import (
+    macs_dispositivos_autorizados,
+    macs_visitantes_autorizados,
+    macs_visitantes_portal_autorizados,
+)
+from .mac_utils import normalizar_macs
+from .models import WhitelistOutbox
+from .whitelist_mutation import ssid_lock
+
+logger = logging.getLogger('unifi_auth_app')
+
+
+class ResultadoReconciliacao:
+    """Diferenças encontradas (e aplicadas, se não for simulação) em um SSID."""
+
+    def __init__(self, ssid: str, no_banco: int = 0):
+        self.ssid = ssid
+        self.no_controlador = 0
+        self.no_banco = no_banco
+        self.adicionar: Set[str] = set()
+        self.remover: Set[str] = set()
+        self.aplicado = False
+        self.erro: Optional[str] = None
+        self.tempos: Dict[str, float] = {}
+
+
+def macs_autorizados_no_banco() -> Dict[str, Set[str]]:
+    """
+    MACs que devem estar na whitelist de cada SSID.
+
+    Servidores vão para UNIFI_SSID; dispositivos de visitantes e MACs de
+    visitantes autorizados pelo portal, para UNIFI_SSID_VISITANTES. Se os dois
+    apontarem para a mesma rede, os conjuntos são unidos.
+    """
+    rotas = (
+        (settings.UNIFI_SSID, macs_dispositivos_autorizados()),
+        (settings.UNIFI_SSID_VISITANTES, macs_visitantes_autorizados()),
+        (settings.UNIFI_SSID_VISITANTES, macs_visitantes_portal_autorizados()),
+    )
+    esperados: Dict[str, Set[str]] = {}
+    for ssid, queryset in rotas:
+        # O MAC do portal vem do cliente sem normalização; inválidos são ignorados
+        esperados.setdefault(ssid, set()).update(mac for mac in normalizar_macs(queryset.iterator()).macs if mac)
+    return esperados
+
+
+def macs_pendentes_na_fila(cursor: int) -> Set[str]:
+    """MACs com alteração pendente ou enfileirada após `cursor` na WhitelistOutbox."""
+    return set(
+        WhitelistOutbox.objects.filter(
+            Q(status=WhitelistOutbox.STATUS_PENDENTE) | Q(id__gt=cursor)
+        ).values_list('mac_address', flat=True).iterator()
+    )
+
+
+def _reconciliar_ssid(api, resultado: ResultadoReconciliacao, esperados: Set[str],
+                      cursor: int, aplicar: bool, remover: bool):
+    """Lê a whitelist do SSID, calcula as diferenças e, se pedido, as aplica."""
+    ssid = resultado.ssid
+
+    inicio = time.monotonic()
+    atual = api.mutator.whitelist(ssid)
+    resultado.tempos['controlador'] = time.monotonic() - inicio
+
+    inicio = time.monotonic()
+    pendentes = macs_pendentes_na_fila(cursor)
+    resultado.tempos['fila'] = time.monotonic() - inicio
+
+    inicio = time.monotonic()
+    resultado.no_controlador = len(atual)
+    resultado.adicionar = (esperados - atual) - pendentes
+    if remover:
+        resultado.remover = (atual - esperados) - pendentes
+    resultado.tempos['diferenca'] = time.monotonic() - inicio
+
+    metrics.update_whitelist_drift(ssid, len(resultado.adicionar), len(resultado.remover))
+    if not resultado.adicionar and not resultado.remover:
+        return
+
+    logger.warning(
+        f"[RECONCILIAÇÃO] Whitelist do SSID '{ssid}' divergente do banco: "
+        f"{len(resultado.adicionar)} MAC(s) ausentes, {len(resultado.remover)} sobrando"
+    )
+    if not aplicar:
+        return
+
+    inicio = time.monotonic()
+    api.apply_whitelist_changes(ssid, add=resultado.adicionar, remove=resultado.remover)
+    resultado.aplicado = True
+    resultado.tempos['aplicacao'] = time.monotonic() - inicio
+
+
+def reconciliar(api, ssids: Iterable[str], aplicar: bool = False,
+                remover: bool = True) -> List[ResultadoReconciliacao]:
+    """
+    Compara a whitelist dos SSIDs com o banco e aplica as diferenças.
+
+    Args:
+        api (UniFiControllerAPI): API do controlador
+        ssids: Nomes das redes a reconciliar
+        aplicar (bool): True para escrever as diferenças no controlador (padrão: simulação)
+        remover (bool): False para apenas adicionar os MACs ausentes
+
+    Returns:
+        list: Um ResultadoReconciliacao por SSID
+    """
+    # O cursor é lido antes de tudo para não desfazer alterações concorrentes
+    cursor = WhitelistOutbox.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    inicio = time.monotonic()
+    esperados_por_ssid = macs_autorizados_no_banco()
+    tempo_banco = time.monotonic() - inicio
+
+    resultados = []
+    for ssid in ssids:
+        esperados = esperados_por_ssid.get(ssid)
+        resultado = ResultadoReconciliacao(ssid=ssid, no_banco=len(esperados or ()))
+        resultado.tempos = {'banco': tempo_banco}
+        resultados.append(resultado)
+
+        if esperados is None:
+            resultado.erro = f"SSID '{ssid}' não recebe MACs do banco (UNIFI_SSID / UNIFI_SSID_VISITANTES)"
+            logger.error(f"[RECONCILIAÇÃO] {resultado.erro}")
+            continue
+
+        try:
+            # A simulação não escreve, então não precisa bloquear os demais escritores
+            with ssid_lock(ssid) if aplicar else nullcontext():
+                _reconciliar_ssid(api, resultado, esperados, cursor, aplicar, remover)
+        except Exception as e:
+            resultado.erro = str(e)
+            logger.error(f"[RECONCILIAÇÃO] Erro ao reconciliar o SSID '{ssid}': {str(e)}")
+
+    return resultados
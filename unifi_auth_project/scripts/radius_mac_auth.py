@@ -1,29 +1,115 @@
-import sys
+import http.client
+import json
 import os
+import socket
+import sys
+from urllib.parse import urlencode
+
+# Socket do serviço residente de autorização (manage.py radius_auth_server --socket ...)
+RADIUS_AUTH_SOCKET = os.getenv('RADIUS_AUTH_SOCKET', '/run/unifi_auth/radius.sock')
+# Snapshot dos MACs autorizados (manage.py export_mac_snapshot --loop)
+MAC_SNAPSHOT_PATH = os.getenv('MAC_SNAPSHOT_PATH', '/dev/shm/unifi_auth_macs.snap')
+# Snapshot gravado há mais tempo que isso (segundos) é ignorado: o exportador parou
+MAC_SNAPSHOT_MAX_AGE = float(os.getenv('MAC_SNAPSHOT_MAX_AGE', '180'))
 
-# Ajuste para importar o Django do seu projeto
 sys.path.append('/opt/auth_project')  # caminho do seu projeto Django
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unifi_auth_project.settings')
 
-import django
-django.setup()
 
-from unifi_auth_app.models import Dispositivo
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """Conexão HTTP sobre socket Unix"""
+
+    def __init__(self, path, timeout=2):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def consultar_snapshot(mac):
+    """
+    Retorna True se o MAC estiver no snapshot em mmap (False se for inválido), ou
+    None para seguir para o serviço e o banco: snapshot indisponível, antigo
+    demais ou MAC ausente (pode ter sido autorizado depois da última exportação)
+    """
+    try:
+        from unifi_auth_app.mac_snapshot import MacSnapshotReader
+        snapshot = MacSnapshotReader(MAC_SNAPSHOT_PATH)
+    except (ImportError, OSError, ValueError):
+        return None
+
+    if snapshot.idade() > MAC_SNAPSHOT_MAX_AGE:
+        return None
+
+    try:
+        registro = snapshot.consultar(mac)
+    except ValueError:
+        print(f"MAC inválido: {mac}")
+        return False
+    if registro:
+        print(f"MAC {mac} autorizado ({registro.tipo})")
+        return True
+    return None
 
-def authorize(passed_mac):
-    # Garante formato maiúsculo e padrão com ':'
-    mac = passed_mac.upper()
-    if len(mac) == 12 and ':' not in mac:
-        mac = ':'.join(mac[i:i+2] for i in range(0, 12, 2))
+
+def consultar_servico(mac):
+    """Retorna True/False conforme o serviço residente, ou None se ele estiver indisponível"""
+    try:
+        conn = UnixHTTPConnection(RADIUS_AUTH_SOCKET)
+        conn.request('GET', '/authorize?' + urlencode({'mac': mac}))
+        response = conn.getresponse()
+        dados = json.loads(response.read() or b'{}')
+        conn.close()
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+
+    if response.status in (200, 400, 401):
+        print(dados.get('Reply-Message', ''))
+        return response.status == 200
+    return None
+
+
+def consultar_banco(mac):
+    """Consulta direta ao banco, usada apenas se o serviço residente estiver fora do ar"""
+    # Ajuste para importar o Django do seu projeto
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unifi_auth_project.settings')
+
+    import django
+    django.setup()
+
+    from unifi_auth_app.mac_authorization import macs_visitantes_todos_autorizados
+    from unifi_auth_app.models import Dispositivo
 
     try:
         # Consulta MAC no banco
-        device = Dispositivo.objects.get(mac_address=mac)
+        device = Dispositivo.objects.get(mac_address=mac, usuario__ativo=True)
         print(f"MAC {mac} autorizado: dispositivo {device.nome_dispositivo}")
         return True
     except Dispositivo.DoesNotExist:
-        print(f"MAC {mac} não encontrado no banco")
-        return False
+        pass
+
+    # Dispositivos de visitantes ativos e visitantes autorizados pelo portal
+    if any(macs_visitantes_todos_autorizados({mac})):
+        print(f"MAC {mac} autorizado: visitante")
+        return True
+    print(f"MAC {mac} não encontrado no banco")
+    return False
+
+
+def authorize(passed_mac):
+    # Garante formato maiúsculo e padrão com ':'
+    mac = passed_mac.upper()
+    if len(mac) == 12 and ':' not in mac:
+        mac = ':'.join(mac[i:i+2] for i in range(0, 12, 2))
+
+    autorizado = consultar_snapshot(mac)
+    if autorizado is None:
+        autorizado = consultar_servico(mac)
+    if autorizado is None:
+        autorizado = consultar_banco(mac)
+    return autorizado
 
 if __name__ == '__main__':
     # O FreeRADIUS normalmente passa username no argv[1]
@@ -104,6 +104,82 @@ UNIFI_CONTROLLER_CONFIG = {
     'PASSWORD': os.getenv('UNIFI_PASSWORD', ''),
 }
 
+# Redes Wi-Fi cujas whitelists recebem os MACs: servidores em UNIFI_SSID,
+# visitantes (dispositivos e MAC do portal) em UNIFI_SSID_VISITANTES
+UNIFI_SSID = os.getenv('UNIFI_SSID', 'Câmara')
+UNIFI_SSID_VISITANTES = os.getenv('UNIFI_SSID_VISITANTES', 'Câmara')
+
+# Cache compartilhado entre os workers do gunicorn (snapshot de clientes, etc.)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_DIR', '/dev/shm/unifi_auth_cache'),
+    }
+}
+
+# Snapshot de clientes do UniFi (stat/sta), em segundos
+UNIFI_CLIENT_SNAPSHOT_TTL = int(os.getenv('UNIFI_CLIENT_SNAPSHOT_TTL', '15'))
+UNIFI_CLIENT_SNAPSHOT_STALE_TTL = int(os.getenv('UNIFI_CLIENT_SNAPSHOT_STALE_TTL', '60'))
+# IP/MAC não encontrado no snapshot não força outra atualização durante este tempo
+UNIFI_CLIENT_SNAPSHOT_NEGATIVE_TTL = int(os.getenv('UNIFI_CLIENT_SNAPSHOT_NEGATIVE_TTL', '10'))
+
+# Resiliência das chamadas ao UniFi Controller
+# Timeouts (conexão, leitura) em segundos por trecho da URL
+UNIFI_TIMEOUTS = {
+    'default': (3.05, 10),
+    '/api/login': (3.05, 10),
+    '/stat/sta': (3.05, 15),
+    '/rest/wlanconf': (3.05, 10),
+    '/cmd/stamgr': (3.05, 10),
+}
+UNIFI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('UNIFI_BREAKER_FAILURE_THRESHOLD', '5'))
+UNIFI_BREAKER_RECOVERY_TIMEOUT = float(os.getenv('UNIFI_BREAKER_RECOVERY_TIMEOUT', '30'))
+UNIFI_RETRY_ATTEMPTS = int(os.getenv('UNIFI_RETRY_ATTEMPTS', '2'))  # apenas GET/HEAD/OPTIONS
+# Prazo total de uma chamada (login, tentativas e backoff); abaixo do --timeout de 30s do gunicorn
+UNIFI_CALL_DEADLINE = float(os.getenv('UNIFI_CALL_DEADLINE', '25'))
+
+# Escritas na whitelist: tentativas quando a releitura diverge do que foi gravado
+WHITELIST_WRITE_MAX_ATTEMPTS = int(os.getenv('WHITELIST_WRITE_MAX_ATTEMPTS', '3'))
+# Espera máxima pelo lock de escrita do SSID (abaixo do innodb_lock_wait_timeout de 50s)
+WHITELIST_LOCK_WAIT = float(os.getenv('WHITELIST_LOCK_WAIT', '10'))
+
+# Importação de servidores: fração máxima de linhas ignoradas para ainda desativar ausentes
+IMPORTACAO_MAX_IGNORADOS = float(os.getenv('IMPORTACAO_MAX_IGNORADOS', '0.05'))
+
+# Cliente assíncrono do UniFi usado pelas views do portal sob ASGI
+UNIFI_ASYNC_TIMEOUT = float(os.getenv('UNIFI_ASYNC_TIMEOUT', '10'))
+UNIFI_ASYNC_MAX_CONNECTIONS = int(os.getenv('UNIFI_ASYNC_MAX_CONNECTIONS', '100'))
+
+# Auditoria das APIs: fila limitada por processo, gravada em lote por uma thread
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))  # registros além disso são descartados
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0'))  # segundos
+AUDIT_LOG_PATH = os.getenv('AUDIT_LOG_PATH', '/opt/auth_project/logs/audit.jsonl')
+AUDIT_LOG_MAX_BYTES = 1024 * 1024 * 10  # 10 MB
+AUDIT_LOG_BACKUP_COUNT = 10
+AUDIT_DB_ENABLED = os.getenv('AUDIT_DB_ENABLED', 'True').lower() in ('true', '1', 'yes')  # tabela AuditEvent
+AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', '90'))  # usado por purge_audit_events
+
+# Cache de visitantes autorizados por IP (check_auth_status), em segundos
+AUTH_STATUS_CACHE_TTL = int(os.getenv('AUTH_STATUS_CACHE_TTL', '300'))
+AUTH_STATUS_NEGATIVE_TTL = int(os.getenv('AUTH_STATUS_NEGATIVE_TTL', '5'))
+AUTH_STATUS_LOCAL_TTL = float(os.getenv('AUTH_STATUS_LOCAL_TTL', '1'))
+
+# Snapshot dos MACs autorizados lido via mmap (comando export_mac_snapshot)
+MAC_SNAPSHOT_PATH = os.getenv('MAC_SNAPSHOT_PATH', '/dev/shm/unifi_auth_macs.snap')
+
+# Proxies reversos cujo X-Forwarded-For é aceito para obter o IP do cliente
+# (o nginx da instalação padrão roda na mesma máquina)
+TRUSTED_PROXIES = [ip.strip() for ip in os.getenv('TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# Limites de requisições das APIs públicas do portal
+# {prefixo da URL: {escopo ('ip' ou 'mac'): (requisições, janela em segundos)}}
+PORTAL_RATE_LIMITS = {
+    '/api/authorize-visitor/': {'ip': (10, 60), 'mac': (5, 60)},
+    '/api/authorize-guest/': {'ip': (10, 60), 'mac': (5, 60)},
+    '/api/check-auth/': {'ip': (60, 60)},
+}
+
 # Configurações do Portal de Visitantes
 PORTAL_CONFIG = {
     'AUTH_DURATION_MINUTES': 1440,  # 24 horas
@@ -163,6 +239,7 @@ MIDDLEWARE = [
     'unifi_auth_app.security_headers.SecurityHeadersMiddleware',  # Middleware para cabeçalhos de segurança
     'unifi_auth_app.request_timing.RequestTimingMiddleware',     # Middleware para medição de tempo
     'unifi_auth_app.middleware.ErrorHandlingMiddleware',         # Middleware para tratamento de erros
+    'unifi_auth_app.rate_limit.RateLimitMiddleware',              # Middleware para limitação de taxa das APIs públicas
     'unifi_auth_app.audit_logger.APIAuditMiddleware',             # Middleware para auditoria de APIs
     'unifi_auth_app.middleware.PortalMiddleware',                 # Middleware para controle de acesso
     'django_prometheus.middleware.PrometheusAfterMiddleware',
@@ -171,6 +248,13 @@ MIDDLEWARE = [
 # Configurações de desempenho
 SLOW_REQUEST_THRESHOLD = 1.0  # segundos
 SHOW_REQUEST_TIME_HEADER = DEBUG  # Mostrar cabeçalho X-Request-Time apenas em DEBUG
+SERVER_TIMING_HEADER = DEBUG  # Cabeçalho Server-Timing (total, db e unifi) para o DevTools do navegador
+
+# Fases dos fluxos rastreados (tracing.py)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))  # fração dos traces gravados em TRACE_LOG_PATH
+TRACE_LOG_PATH = os.getenv('TRACE_LOG_PATH', '/opt/auth_project/logs/traces.jsonl')
+TRACE_PROFILE_TOKEN = os.getenv('TRACE_PROFILE_TOKEN', '')  # vazio desativa o cProfile via cabeçalho X-Profile
+TRACE_PROFILE_DIR = os.getenv('TRACE_PROFILE_DIR', '/opt/auth_project/logs/profiles')
 
 # Configurações de CSP (Content Security Policy)
 CSP_DIRECTIVES = {
@@ -260,13 +344,10 @@ LOGGING = {
             'backupCount': 5,
             'formatter': 'verbose',
         },
-        'audit_file': {
+        'audit_queue': {
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': '/opt/auth_project/logs/audit.log',
-            'maxBytes': 1024 * 1024 * 10,  # 10 MB
-            'backupCount': 10,
-            'formatter': 'json',
+            'class': 'unifi_auth_app.audit_pipeline.AuditQueueHandler',
+            'maxsize': AUDIT_QUEUE_SIZE,
         },
     },
     'loggers': {
@@ -286,7 +367,7 @@ LOGGING = {
             'propagate': False,
         },
         'audit': {
-            'handlers': ['audit_file'],
+            'handlers': ['audit_queue'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -398,6 +479,11 @@ LOGGING = {
             'filename': '/opt/auth_project/logs/django.log',
             'formatter': 'verbose',
         },
+        'audit_queue': {
+            'level': 'INFO',
+            'class': 'unifi_auth_app.audit_pipeline.AuditQueueHandler',
+            'maxsize': AUDIT_QUEUE_SIZE,
+        },
     },
     'loggers': {
         'django': {
@@ -410,6 +496,11 @@ LOGGING = {
             'level': 'WARNING',  # Apenas WARNING e acima
             'propagate': True,
         },
+        'audit': {
+            'handlers': ['audit_queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
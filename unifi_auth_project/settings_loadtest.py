@@ -0,0 +1,95 @@
+"""
+Configurações para testes de carga locais (scripts/loadtest_portal.py).
+
+Mesmas configurações de produção, exceto:
+
+- banco SQLite e cache em arquivo em LOADTEST_DIR (compartilhados entre os
+  workers, como o cache de produção);
+- controlador UniFi simulado (scripts/fake_unifi_controller.py) em
+  127.0.0.1:8443;
+- logs apenas no console, a partir de WARNING;
+- limitação de taxa desativada, salvo LOADTEST_RATE_LIMITS=1, já que todas as
+  requisições saem da mesma máquina.
+
+O SQLite serializa as escritas: os números de autorização de visitantes são
+um limite inferior do que o MariaDB de produção suporta.
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import UNIFI_CONTROLLER_CONFIG
+
+LOADTEST_DIR = os.getenv('LOADTEST_DIR', os.path.join(tempfile.gettempdir(), 'unifi_auth_loadtest'))
+os.makedirs(LOADTEST_DIR, exist_ok=True)
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(LOADTEST_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 30,  # espera pelo lock de escrita em vez de falhar com "database is locked"
+        },
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(LOADTEST_DIR, 'cache'),
+    }
+}
+
+UNIFI_CONTROLLER_CONFIG = {
+    **UNIFI_CONTROLLER_CONFIG,
+    'IP': os.getenv('UNIFI_CONTROLLER_IP', '127.0.0.1'),
+    'PORT': os.getenv('UNIFI_CONTROLLER_PORT', '8443'),
+    'USERNAME': os.getenv('UNIFI_USERNAME', 'loadtest'),
+    'PASSWORD': os.getenv('UNIFI_PASSWORD', 'loadtest'),
+}
+UNIFI_VERIFY_SSL = False
+
+if os.getenv('LOADTEST_RATE_LIMITS', '0') != '1':
+    PORTAL_RATE_LIMITS = {}
+
+AUDIT_LOG_PATH = os.path.join(LOADTEST_DIR, 'audit.jsonl')
+TRACE_LOG_PATH = os.path.join(LOADTEST_DIR, 'traces.jsonl')
+TRACE_PROFILE_DIR = os.path.join(LOADTEST_DIR, 'profiles')
+MAC_SNAPSHOT_PATH = os.path.join(LOADTEST_DIR, 'macs.snap')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{levelname} {asctime} {module} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'level': 'WARNING',
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+        'audit_queue': {
+            'level': 'INFO',
+            'class': 'unifi_auth_app.audit_pipeline.AuditQueueHandler',
+            'maxsize': AUDIT_QUEUE_SIZE,  # noqa: F405
+        },
+    },
+    'loggers': {
+        'audit': {
+            'handlers': ['audit_queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        '': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}